@@ -56,6 +56,26 @@ interface ProcessedDataItem {
   }[];
 }
 
+type ProcessedEntry = ProcessedDataItem['files'][number];
+
+// Large results are stored out of line in the bucket and read back a page at
+// a time through the results API, so the browser never holds a bucket URL
+const fetchProcessedEntries = async (uniqueId: string, filename: string): Promise<ProcessedEntry[]> => {
+  const entries: ProcessedEntry[] = [];
+  let cursor: string | null = '';
+  while (cursor !== null) {
+    const params = new URLSearchParams({ uniqueId, file: filename, cursor });
+    const response = await fetch(`/api/results?${params}`);
+    if (!response.ok) {
+      throw new Error(`Results request failed with status: ${response.status}`);
+    }
+    const page = await response.json();
+    entries.push(...page.entries);
+    cursor = page.nextCursor;
+  }
+  return entries;
+};
+
 
 const UploadInterface: React.FC = () => {
   const [files, setFiles] = useState<File[]>([]);
@@ -264,42 +284,42 @@ const UploadInterface: React.FC = () => {
           const uploadedFilesData: UploadedFilePath[] = [];
           const groupedSentencePagePairs: Record<string, SentencePagePair[]> = {};
   
-          querySnapshot.forEach(doc => {
+          for (const doc of querySnapshot.docs) {
             const data = doc.data();
             // logToFile('Processing document: ' + JSON.stringify(data));
   
-            if (data && data.pdfFileUrl && data.processedData) {
+            if (data && data.pdfFileUrl && (data.processedData || data.processedDataRef)) {
               uploadedFilesData.push({
                 id: data.id,
                 filename: data.filename,
                 pdfFileUrl: data.pdfFileUrl
               });
   
-              const processedData: ProcessedDataItem[] = JSON.parse(data.processedData);
-              processedData.forEach((item: ProcessedDataItem) => {
-                item.files.forEach(file => {
-                  if (!groupedSentencePagePairs[file.filename]) {
-                    groupedSentencePagePairs[file.filename] = [];
-                  }
-  
-                  if (selectedScript === 'timelines.py') {
-                    groupedSentencePagePairs[file.filename].push({
-                      filename: file.filename,
-                      sentence: file.sentence,
-                      page_numbers: file.page_numbers
-                    });
-                  } else {
-                    groupedSentencePagePairs[file.filename].push({
-                      filename: file.filename,
-                      sentence: file.sentence,
-                      start_page: file.start_page,
-                      end_page: file.end_page
-                    });
-                  }
-                });
+              const entries: ProcessedEntry[] = data.processedData
+                ? (JSON.parse(data.processedData) as ProcessedDataItem[]).flatMap(item => item.files)
+                : await fetchProcessedEntries(uniqueId, data.filename);
+              entries.forEach(file => {
+                if (!groupedSentencePagePairs[file.filename]) {
+                  groupedSentencePagePairs[file.filename] = [];
+                }
+
+                if (selectedScript === 'timelines.py') {
+                  groupedSentencePagePairs[file.filename].push({
+                    filename: file.filename,
+                    sentence: file.sentence,
+                    page_numbers: file.page_numbers
+                  });
+                } else {
+                  groupedSentencePagePairs[file.filename].push({
+                    filename: file.filename,
+                    sentence: file.sentence,
+                    start_page: file.start_page,
+                    end_page: file.end_page
+                  });
+                }
               });
             }
-          });
+          }
   
           clearInterval(interval);
           setUploadedFiles(uploadedFilesData);
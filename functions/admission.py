@@ -0,0 +1,112 @@
+import os
+import time
+import math
+import logging
+import threading
+from flask import jsonify
+from estimator import estimate_pages
+
+# Admission control for uploadEmail. Each request is costed in pages
+# (PyMuPDF page_count, which only reads the xref, not the page content) and
+# admitted only while the pages in flight on this instance stay under
+# ADMISSION_MAX_PAGES. Rejected requests get a 429 whose Retry-After is the
+# time the current backlog needs to drain at the observed page throughput.
+
+
+class Ticket:
+    def __init__(self, pages):
+        self.pages = pages
+        self.started = time.monotonic()
+        self.released = False
+
+
+class AdmissionController:
+    def __init__(self, max_pages, pages_per_second):
+        self.max_pages = max_pages
+        self.pages_per_second = pages_per_second
+        self.pages_in_flight = 0
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def try_admit(self, pages):
+        with self._lock:
+            # A single oversized request is still let in on an idle instance,
+            # otherwise it could never run anywhere
+            if self.pages_in_flight and self.pages_in_flight + pages > self.max_pages:
+                self.rejected += 1
+                return None
+            self.pages_in_flight += pages
+            self.active += 1
+            self.admitted += 1
+            return Ticket(pages)
+
+    def release(self, ticket):
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            concurrent = self.active
+            self.pages_in_flight -= ticket.pages
+            self.active -= 1
+
+            # Exponentially weighted instance throughput; requests share the
+            # instance, so scale this request's rate by how many were running
+            elapsed = time.monotonic() - ticket.started
+            if elapsed > 0:
+                observed = ticket.pages / elapsed * concurrent
+                self.pages_per_second = 0.8 * self.pages_per_second + 0.2 * observed
+
+    def retry_after(self, pages):
+        with self._lock:
+            # Pages that must finish before this request fits (all of them
+            # for an oversized request, which only runs on an idle instance)
+            backlog = min(self.pages_in_flight + pages - self.max_pages, self.pages_in_flight)
+            seconds = backlog / max(self.pages_per_second, 0.01)
+        return max(int(math.ceil(seconds)), 1)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'pagesInFlight': self.pages_in_flight,
+                'maxPages': self.max_pages,
+                'pagesPerSecond': round(self.pages_per_second, 3),
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+            }
+
+
+def create_admission_controller():
+    max_pages = int(os.getenv('ADMISSION_MAX_PAGES', '0'))
+    if max_pages <= 0:
+        logging.info("Admission control disabled")
+        return None
+    pages_per_second = float(os.getenv('ADMISSION_PAGES_PER_SECOND', '0.5'))
+    logging.info(f"Admission control: {max_pages} pages in flight, {pages_per_second} pages/s initial estimate")
+    return AdmissionController(max_pages, pages_per_second)
+
+
+def admit(controller, files, headers):
+    # Returns (ticket, None) when admitted or (None, 429 response tuple)
+    if controller is None:
+        return None, None
+
+    pages = sum(estimate_pages(file) for file in files)
+    ticket = controller.try_admit(pages)
+    if ticket is not None:
+        logging.info(f"Admitted {pages} page(s); {controller.pages_in_flight} in flight")
+        return ticket, None
+
+    retry_after = controller.retry_after(pages)
+    logging.warning(f"Rejected {pages} page(s); {controller.pages_in_flight} in flight, retry after {retry_after}s")
+    return None, (
+        jsonify({"error": "Instance busy", "pages": pages, "retryAfter": retry_after}),
+        429,
+        dict(headers, **{'Retry-After': str(retry_after), 'Access-Control-Expose-Headers': 'Retry-After'}),
+    )
+
+
+def release(controller, ticket):
+    if controller is not None and ticket is not None:
+        controller.release(ticket)
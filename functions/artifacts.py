@@ -0,0 +1,100 @@
+import os
+import hashlib
+import logging
+
+# Per-file pipeline artifacts (original upload, OCR JSON, processed JSON,
+# summary PDF). On disk each artifact is a file in the request's temp
+# directory, as before. In memory mode the bytes are held on the object and
+# only written to disk when something genuinely needs a path (the subprocess
+# fallback), since /tmp on Cloud Functions is RAM-backed anyway.
+
+CONTENT_TYPES = {
+    '.pdf': 'application/pdf',
+    '.json': 'application/json',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+}
+
+
+def in_memory_enabled():
+    return os.getenv('IN_MEMORY_PIPELINE', 'false').lower() == 'true'
+
+
+def read_upload(file):
+    # FileStorage, SpooledUpload and ObjectUpload all expose read()
+    return file.read()
+
+
+class Artifact:
+    def __init__(self, path, in_memory=False):
+        self.path = path
+        self.in_memory = in_memory
+        self.data = None
+
+    @property
+    def name(self):
+        return os.path.basename(self.path)
+
+    @property
+    def content_type(self):
+        return CONTENT_TYPES.get(os.path.splitext(self.path)[1].lower(), 'application/octet-stream')
+
+    def exists(self):
+        if self.in_memory:
+            return self.data is not None or os.path.exists(self.path)
+        return os.path.exists(self.path)
+
+    def read_bytes(self):
+        if self.data is not None:
+            return self.data
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def write_bytes(self, data):
+        if self.in_memory:
+            self.data = data
+        else:
+            with open(self.path, 'wb') as f:
+                f.write(data)
+
+    def size(self):
+        if self.data is not None:
+            return len(self.data)
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def discard(self):
+        # Drop the bytes once nothing needs them; the temp directory may
+        # live on for a while after this artifact is done
+        self.data = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def materialize(self):
+        # Ensure a file exists at self.path and return it
+        if self.data is not None and not os.path.exists(self.path):
+            logging.info(f"Writing in-memory artifact to disk: {self.path}")
+            with open(self.path, 'wb') as f:
+                f.write(self.data)
+        return self.path
+
+    def sha256(self):
+        digest = hashlib.sha256()
+        if self.data is not None:
+            digest.update(self.data)
+        else:
+            with open(self.path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    def upload(self, blob):
+        if self.data is not None:
+            blob.upload_from_string(self.data, content_type=self.content_type)
+        else:
+            blob.upload_from_filename(self.path)
@@ -0,0 +1,65 @@
+import os
+import sys
+import subprocess
+
+# Import-time budget check for cold starts. Imports a module in a fresh
+# interpreter a few times and fails (exit 1) when the fastest run exceeds the
+# budget, printing the slowest imports from `python -X importtime` so the
+# regression is easy to find. tests/test_import_time.py runs it with the
+# suite; it can also be run on its own, e.g. as a pre-deploy step:
+#
+#   python3 check_import_time.py                 # main, 1.0s budget
+#   python3 check_import_time.py main 0.8 5      # module, budget, runs
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+TIMER = (
+    "import time; started = time.perf_counter(); "
+    "import {module}; print(time.perf_counter() - started)"
+)
+
+
+def measure(module):
+    result = subprocess.run(
+        [sys.executable, '-c', TIMER.format(module=module)],
+        cwd=SCRIPT_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(module, limit=15):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=SCRIPT_DIR, capture_output=True, text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = [part.strip() for part in line[len('import time:'):].split('|')]
+        if cumulative.isdigit():
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main():
+    module = sys.argv[1] if len(sys.argv) > 1 else 'main'
+    budget = float(sys.argv[2]) if len(sys.argv) > 2 else float(os.getenv('IMPORT_BUDGET_SECONDS', '1.0'))
+    runs = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    # Best of several runs, to keep disk cache noise out of the result
+    seconds = min(measure(module) for _ in range(runs))
+    print(f"import {module}: {seconds:.3f}s (budget {budget:.3f}s)")
+    if seconds <= budget:
+        return 0
+
+    print("Slowest imports (cumulative microseconds):")
+    for cumulative, name in slowest_imports(module):
+        print(f"  {cumulative:>10}  {name}")
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,295 @@
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+import result_cache
+import storage_budget
+import standin
+from firebase_clients import get_bucket
+
+# Stage checkpoints for retried invocations. A checkpoint is a small JSON
+# document stored under <key>/<stage>.json, where the key is the client's
+# job id (or the file's result cache key when there is none). Stages write
+# as they finish: the OCR JSON, the memory log, each generate_summaries
+# batch and each combine_final_summaries chunk, so a retry after a crash
+# only pays for the stages that had not completed. Summarizer checkpoints
+# are further keyed by a hash of the script source, pages and template, so
+# a retry with different inputs never picks up stale results.
+#
+# Checkpoints live in the app bucket whenever there is one, since a retry
+# usually lands on a different instance than the one that crashed;
+# CHECKPOINT_BACKEND=local keeps them under CHECKPOINT_DIR instead, capped
+# at CHECKPOINT_MAX_BYTES with the oldest evicted first (a retry then redoes
+# that stage).
+#
+# A file's checkpoints are cleared when it is stored or fails for good. Those
+# of an invocation that crashed and was never retried are swept once they are
+# older than CHECKPOINT_TTL_SECONDS (a week by default): each instance lists
+# the checkpoints at most once per CHECKPOINT_SWEEP_SECONDS, in the
+# background. With a GCS lifecycle rule on the prefix instead, e.g.
+#
+#   {"action": {"type": "Delete"}, "condition": {"age": 7, "matchesPrefix": ["checkpoints/"]}}
+#
+# set CHECKPOINT_TTL_SECONDS=0 to turn the sweep off.
+
+CHECKPOINT_VERSION = os.getenv('CHECKPOINT_VERSION', '1')
+TTL_SECONDS = float(os.getenv('CHECKPOINT_TTL_SECONDS', str(7 * 24 * 3600)))
+SWEEP_SECONDS = float(os.getenv('CHECKPOINT_SWEEP_SECONDS', '3600'))
+
+
+class LocalCheckpointBackend:
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.index = result_cache.SizeIndex(max_bytes)
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        storage_budget.budget.charge('checkpoints', max_bytes)
+
+    def _path(self, name):
+        return os.path.join(self.root, name)
+
+    def get(self, name):
+        try:
+            with open(self._path(name), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, name, data):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.tmp.{threading.get_ident()}'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        if self.index.added(len(data)):
+            self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for dirpath, _, filenames in os.walk(self.root):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes * result_cache.LOW_WATER:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    logging.info(f"Evicted checkpoint: {path}")
+                except FileNotFoundError:
+                    pass
+            self.index.scanned(total)
+
+    def delete_prefix(self, prefix):
+        shutil.rmtree(self._path(prefix), ignore_errors=True)
+
+    def sweep(self, max_age):
+        cutoff = time.time() - max_age
+        removed = 0
+        for dirpath, _, filenames in os.walk(self.root, topdown=False):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    if os.stat(path).st_mtime < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+            if dirpath != self.root:
+                try:
+                    os.rmdir(dirpath)
+                except OSError:
+                    pass
+        return removed
+
+
+class BucketCheckpointBackend:
+    def __init__(self, get_bucket, prefix, bucket_name=None):
+        self.get_bucket = get_bucket
+        self.prefix = prefix.rstrip('/') + '/'
+        self.bucket_name = bucket_name
+
+    @property
+    def bucket(self):
+        bucket = self.get_bucket()
+        if self.bucket_name and self.bucket_name != bucket.name:
+            return bucket.client.bucket(self.bucket_name)
+        return bucket
+
+    def get(self, name):
+        blob = self.bucket.get_blob(self.prefix + name)
+        if blob is None:
+            return None
+        return blob.download_as_bytes()
+
+    def put(self, name, data):
+        self.bucket.blob(self.prefix + name).upload_from_string(data, content_type='application/json')
+
+    def delete_prefix(self, prefix):
+        for blob in self.bucket.list_blobs(prefix=self.prefix + prefix.rstrip('/') + '/'):
+            blob.delete()
+
+    def sweep(self, max_age):
+        cutoff = time.time() - max_age
+        removed = 0
+        for blob in self.bucket.list_blobs(prefix=self.prefix):
+            if blob.updated is not None and blob.updated.timestamp() < cutoff:
+                blob.delete()
+                removed += 1
+        return removed
+
+
+class Checkpoint:
+    def __init__(self, backend, key):
+        self.backend = backend
+        self.key = key
+
+    @property
+    def enabled(self):
+        return self.backend is not None and bool(self.key)
+
+    def child(self, *parts):
+        return Checkpoint(self.backend, '/'.join([self.key or ''] + [str(part) for part in parts]))
+
+    def load(self, stage):
+        if not self.enabled:
+            return None
+        try:
+            data = self.backend.get(f'{self.key}/{stage}.json')
+            if data is None:
+                return None
+            payload = json.loads(data)
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable checkpoint {self.key}/{stage}: {str(e)}")
+            return None
+
+        if payload.get('version') != CHECKPOINT_VERSION or payload.get('stage') != stage:
+            logging.warning(f"Ignoring stale checkpoint {self.key}/{stage}")
+            return None
+        logging.info(f"Resuming from checkpoint {self.key}/{stage}")
+        return payload['value']
+
+    def save(self, stage, value):
+        if not self.enabled:
+            return
+        try:
+            payload = {'version': CHECKPOINT_VERSION, 'stage': stage, 'value': value}
+            self.backend.put(f'{self.key}/{stage}.json', json.dumps(payload).encode('utf-8'))
+        except Exception as e:
+            logging.warning(f"Could not write checkpoint {self.key}/{stage}: {str(e)}")
+
+    def cached(self, stage, fn, complete=None):
+        # `complete` says whether a freshly computed value is whole; a stage
+        # that was cut short is returned but never saved for a retry to reuse
+        value = self.load(stage)
+        if value is None:
+            value = fn()
+            if complete is None or complete():
+                self.save(stage, value)
+        return value
+
+    def clear(self):
+        if not self.enabled:
+            return
+        try:
+            self.backend.delete_prefix(self.key)
+        except Exception as e:
+            logging.warning(f"Could not clear checkpoints for {self.key}: {str(e)}")
+
+
+NO_CHECKPOINT = Checkpoint(None, None)
+
+_backend = None
+_backend_lock = threading.Lock()
+_swept_at = None
+
+
+def checkpoint_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            has_bucket = bool(os.getenv('CHECKPOINT_BUCKET') or os.getenv('FIREBASE_STORAGE_BUCKET')) or standin.enabled('bucket')
+            backend_name = os.getenv('CHECKPOINT_BACKEND', 'bucket' if has_bucket else 'local').lower()
+            if backend_name == 'off':
+                return None
+            if backend_name == 'bucket':
+                _backend = BucketCheckpointBackend(
+                    get_bucket, os.getenv('CHECKPOINT_PREFIX', 'checkpoints'), os.getenv('CHECKPOINT_BUCKET')
+                )
+            else:
+                _backend = LocalCheckpointBackend(
+                    os.getenv('CHECKPOINT_DIR', '/tmp/checkpoints'), int(os.getenv('CHECKPOINT_MAX_BYTES', str(64 * 1024 * 1024)))
+                )
+            logging.info(f"Using {backend_name} checkpoints")
+    return _backend
+
+
+def sweep_expired(backend):
+    try:
+        removed = backend.sweep(TTL_SECONDS)
+        if removed:
+            logging.info(f"Swept {removed} expired checkpoint(s)")
+    except Exception as e:
+        logging.warning(f"Could not sweep expired checkpoints: {str(e)}")
+
+
+def maybe_sweep(backend):
+    global _swept_at
+    if backend is None or TTL_SECONDS <= 0:
+        return
+    with _backend_lock:
+        now = time.monotonic()
+        if _swept_at is not None and now - _swept_at < SWEEP_SECONDS:
+            return
+        _swept_at = now
+    threading.Thread(target=sweep_expired, args=(backend,), name='checkpoint-sweep', daemon=True).start()
+
+
+def open_checkpoint(key):
+    if not key:
+        return NO_CHECKPOINT
+    backend = checkpoint_backend()
+    maybe_sweep(backend)
+    return Checkpoint(backend, key)
+
+
+def file_checkpoint_key(job_id, content_hash, result_key):
+    # Client-supplied job ids end up in paths, so keep them to a safe alphabet
+    if job_id:
+        return f"{re.sub(r'[^A-Za-z0-9_-]', '_', job_id)[:128]}/{content_hash}"
+    return result_key
+
+
+def checkpoint_from_env():
+    # Subprocess fallback: the parent passes the key in the environment
+    return open_checkpoint(os.getenv('CHECKPOINT_KEY'))
+
+
+def for_document(checkpoint, script_name, docs, custom_template):
+    # Namespace a summarizer's checkpoints by what it is summarizing
+    if checkpoint is None or not checkpoint.enabled:
+        return NO_CHECKPOINT
+    digest = hashlib.sha256()
+    digest.update(script_name.encode('utf-8'))
+    digest.update(result_cache.source_hash(script_name).encode('utf-8'))
+    digest.update(str(custom_template).encode('utf-8'))
+    # Streamed docs are still arriving; the key already carries the file's
+    # content hash, so there is nothing to add by waiting for them
+    if not getattr(docs, 'streaming', False):
+        for doc in docs:
+            digest.update(doc.page_content.encode('utf-8'))
+    return checkpoint.child(script_name, digest.hexdigest()[:16])
@@ -0,0 +1,96 @@
+import os
+import time
+import logging
+import threading
+
+# Request-level deadlines. A Deadline is an absolute wall-clock time, so it
+# can be handed to subprocesses through PIPELINE_DEADLINE and mean the same
+# thing there. Stages check `low()` before fanning out more work: once less
+# than DEADLINE_RESERVE_SECONDS remain (enough for one more LLM round plus
+# rendering, upload and the Firestore write) they stop and return what they
+# have, and the output is flagged `partial` instead of being lost.
+
+RESERVE_SECONDS = float(os.getenv('DEADLINE_RESERVE_SECONDS', '60'))
+
+# Time kept back from subprocess timeouts for the stages that follow them
+TAIL_SECONDS = float(os.getenv('DEADLINE_TAIL_SECONDS', '15'))
+
+
+class Deadline:
+    def __init__(self, expires_at=None, reserve_seconds=RESERVE_SECONDS):
+        self.expires_at = expires_at
+        self.reserve_seconds = reserve_seconds
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def scope(self):
+        # Same deadline, own skip count; one per document so concurrent
+        # documents and scripts each know whether they were cut short
+        return Deadline(self.expires_at, self.reserve_seconds)
+
+    @property
+    def partial(self):
+        return self.skipped > 0
+
+    def mark_skipped(self):
+        with self._lock:
+            self.skipped += 1
+
+    def call(self, fn, *args):
+        # Run one unit of fanned-out work, or skip it (None) when time is low
+        if self.low():
+            self.mark_skipped()
+            return None
+        return fn(*args)
+
+    def remaining(self):
+        if self.expires_at is None:
+            return float('inf')
+        return self.expires_at - time.time()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def low(self):
+        return self.remaining() < self.reserve_seconds
+
+    def timeout(self):
+        # For subprocess.run; None means no limit
+        if self.expires_at is None:
+            return None
+        return max(self.remaining() - TAIL_SECONDS, 1)
+
+    def env(self):
+        return {'PIPELINE_DEADLINE': str(self.expires_at)} if self.expires_at is not None else {}
+
+
+NO_DEADLINE = Deadline()
+
+
+def from_seconds(seconds):
+    return Deadline(time.time() + seconds) if seconds else NO_DEADLINE
+
+
+def from_request_params(params, background=False):
+    # The function's own limit (REQUEST_DEADLINE_SECONDS) caps whatever the
+    # client asks for. Background jobs are not bound by the request timeout:
+    # they get JOB_DEADLINE_SECONDS, which is unlimited unless set
+    if background:
+        limit = float(os.getenv('JOB_DEADLINE_SECONDS', '0'))
+    else:
+        limit = float(os.getenv('REQUEST_DEADLINE_SECONDS', '540'))
+    requested = params.get('deadline_seconds')
+    try:
+        if requested:
+            seconds = min(float(requested), limit) if limit else float(requested)
+        else:
+            seconds = limit
+    except ValueError:
+        logging.warning(f"Ignoring invalid deadline_seconds: {requested}")
+        seconds = limit
+    return from_seconds(seconds)
+
+
+def from_env():
+    expires_at = os.getenv('PIPELINE_DEADLINE')
+    return Deadline(float(expires_at)) if expires_at else NO_DEADLINE
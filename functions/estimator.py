@@ -0,0 +1,214 @@
+import os
+import math
+import logging
+from governor import governor
+import events
+
+# Pre-flight quotes. The number of LLM calls a script makes follows from the
+# page count and its loop structure (create_memory_log, generate_summaries and
+# process_batch, combine_final_summaries), so a quote counts pages, walks the
+# same loops without calling anything, and prices the calls. Wall-clock time
+# uses the calls on the critical path (what runs one after another, given the
+# llm pool size) times the seconds per call. Seconds per call and OCR seconds
+# per page are calibrated from this instance's recorded event timings once
+# there are enough samples, and come from ESTIMATE_* defaults before that.
+
+TOKENS_PER_PAGE = int(os.getenv('ESTIMATE_TOKENS_PER_PAGE', '700'))
+PROMPT_TOKENS = int(os.getenv('ESTIMATE_PROMPT_TOKENS', '600'))
+OUTPUT_TOKENS = int(os.getenv('ESTIMATE_OUTPUT_TOKENS', '350'))
+LLM_SECONDS_PER_CALL = float(os.getenv('ESTIMATE_LLM_SECONDS_PER_CALL', '4'))
+OCR_SECONDS_PER_PAGE = float(os.getenv('ESTIMATE_OCR_SECONDS_PER_PAGE', '3'))
+# Distinct dates per page, for timelines' per-date deduplication calls
+DATES_PER_PAGE = float(os.getenv('ESTIMATE_DATES_PER_PAGE', '0.5'))
+INPUT_USD_PER_MTOK = float(os.getenv('ESTIMATE_INPUT_USD_PER_MTOK', '0.25'))
+OUTPUT_USD_PER_MTOK = float(os.getenv('ESTIMATE_OUTPUT_USD_PER_MTOK', '1.25'))
+
+# Recorded samples needed before calibrated figures replace the defaults
+MIN_SAMPLES = 20
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.tif')
+
+# Used when a file cannot be opened cheaply (e.g. a remote object)
+BYTES_PER_PAGE_ESTIMATE = int(os.getenv('ADMISSION_BYTES_PER_PAGE', str(100 * 1024)))
+
+
+def estimate_pages(file):
+    # Remembered on the upload; admission, file ordering, the storage budget
+    # and quotes all ask
+    cached = getattr(file, 'estimated_pages', None)
+    if cached is not None:
+        return cached
+    pages = _estimate_pages(file)
+    try:
+        file.estimated_pages = pages
+    except AttributeError:
+        pass
+    return pages
+
+
+def _estimate_pages(file):
+    filename = (file.filename or '').lower()
+    if filename.endswith(IMAGE_EXTENSIONS):
+        return 1
+
+    try:
+        import fitz
+
+        local_path = getattr(file, 'local_path', None) or getattr(file, 'path', None)
+        if local_path:
+            with fitz.open(local_path) as doc:
+                return max(doc.page_count, 1)
+
+        stream = getattr(file, 'stream', None)
+        if stream is not None:
+            data = stream.read()
+            stream.seek(0)
+            with fitz.open(stream=data, filetype='pdf') as doc:
+                return max(doc.page_count, 1)
+    except Exception as e:
+        logging.warning(f"Could not count pages for {file.filename}, estimating from size: {str(e)}")
+
+    blob = getattr(file, 'blob', None)
+    size = getattr(blob, 'size', None) if blob is not None else getattr(file, 'content_length', None)
+    if size:
+        return max(math.ceil(size / BYTES_PER_PAGE_ESTIMATE), 1)
+    return 1
+
+
+class Tally:
+    def __init__(self):
+        self.calls = 0
+        self.sequential = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def add(self, calls, pages=0, context=0, sequential=None):
+        # `pages` of document text and `context` earlier outputs (memory log,
+        # summaries) go into each call on top of the prompt itself
+        self.calls += calls
+        self.sequential += calls if sequential is None else sequential
+        self.input_tokens += calls * (PROMPT_TOKENS + pages * TOKENS_PER_PAGE + context * OUTPUT_TOKENS)
+        self.output_tokens += calls * OUTPUT_TOKENS
+        return self
+
+
+def memory_log(num_pages, pages_to_concatenate=2):
+    steps = len(range(0, min(10, num_pages), pages_to_concatenate))
+    steps += len(range(max(10, num_pages - 10), num_pages, pages_to_concatenate))
+    # One summary plus update and verification of the log, in sequence
+    return Tally().add(steps, pages=pages_to_concatenate, context=1).add(2 * steps, context=2)
+
+
+def batch_summaries(num_pages, batch_size, pages_per_chunk, pool):
+    tally = Tally()
+    batch_sizes = [min(batch_size, num_pages - start) for start in range(0, num_pages, batch_size)]
+    longest = 0
+    for size in batch_sizes:
+        chunks = math.ceil(size / pages_per_chunk)
+        # process_page per chunk, combine + verify per extra chunk, then
+        # format_and_improve_summary; all sequential within the batch
+        tally.add(chunks, pages=pages_per_chunk, context=1, sequential=0)
+        tally.add(2 * (chunks - 1), context=2, sequential=0)
+        tally.add(4, context=2, sequential=0)
+        longest = max(longest, 3 * chunks + 2)
+    tally.sequential = math.ceil(len(batch_sizes) / pool) * longest
+    return tally, len(batch_sizes)
+
+
+def final_combination(num_summaries, num_workers=4):
+    tally = Tally()
+    if not num_summaries:
+        return tally
+    chunk_size = max(1, num_summaries // num_workers)
+    num_chunks = math.ceil(num_summaries / chunk_size)
+    # Three combiners, aggregation and verification per summary, the chunks
+    # in parallel and then folded together
+    tally.add(5 * num_summaries, context=2, sequential=5 * chunk_size)
+    tally.add(5 * (num_chunks - 1), context=2)
+    # Condensed summaries, aggregation, improvement and integration
+    tally.add(5, context=2)
+    tally.add(1, context=num_summaries)
+    return tally
+
+
+def per_page(num_pages, calls_per_page, pool):
+    return Tally().add(calls_per_page * num_pages, pages=1, sequential=calls_per_page * math.ceil(num_pages / pool))
+
+
+def script_stages(script, num_pages, pool):
+    if script == 'process-brief.py':
+        summaries, num_batches = batch_summaries(num_pages, 4, 2, pool)
+        return {'memory_log': memory_log(num_pages), 'summaries': summaries, 'combine': final_combination(num_batches)}
+    if script == 'process-detailed.py':
+        summaries, _ = batch_summaries(num_pages, 12, 2, pool)
+        return {'memory_log': memory_log(num_pages), 'summaries': summaries}
+    if script == 'process-comprehensive.py':
+        return {'summaries': per_page(num_pages, 2, pool)}
+    if script == 'timelines.py':
+        dates = math.ceil(num_pages * DATES_PER_PAGE)
+        return {'summaries': per_page(num_pages, 1, pool), 'timeline': Tally().add(dates, context=2)}
+    raise ValueError(f"Unsupported process script: {script}")
+
+
+def calibration():
+    metrics = events.counters.metrics()
+    llm_calls = metrics['llm_calls']
+    ocr_pages = metrics['pages_done'].get('ocr', 0)
+    ocr_seconds = metrics['stage_seconds'].get('ocr')
+    calibrated_llm = llm_calls >= MIN_SAMPLES
+    calibrated_ocr = ocr_pages >= MIN_SAMPLES and ocr_seconds is not None
+    return {
+        'llm_seconds_per_call': metrics['llm_seconds'] / llm_calls if calibrated_llm else LLM_SECONDS_PER_CALL,
+        # Per-file OCR wall time per page, with the ocr pool already in it
+        'ocr_seconds_per_page': ocr_seconds / ocr_pages if calibrated_ocr else OCR_SECONDS_PER_PAGE / governor.pool_size('ocr'),
+        'llm_samples': llm_calls,
+        'ocr_samples': ocr_pages,
+        'calibrated': calibrated_llm and calibrated_ocr,
+    }
+
+
+def cost(input_tokens, output_tokens):
+    return round(input_tokens / 1e6 * INPUT_USD_PER_MTOK + output_tokens / 1e6 * OUTPUT_USD_PER_MTOK, 4)
+
+
+def estimate_file(num_pages, scripts, rates):
+    pool = governor.pool_size('llm')
+    quote = {'pages': num_pages, 'scripts': {}}
+    llm_seconds = 0.0
+    for script in scripts:
+        stages = script_stages(script, num_pages, pool)
+        calls = sum(tally.calls for tally in stages.values())
+        input_tokens = sum(tally.input_tokens for tally in stages.values())
+        output_tokens = sum(tally.output_tokens for tally in stages.values())
+        seconds = sum(tally.sequential for tally in stages.values()) * rates['llm_seconds_per_call']
+        quote['scripts'][script] = {
+            'llm_calls': calls,
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'seconds': round(seconds, 1),
+            'usd': cost(input_tokens, output_tokens),
+            'stages': {name: tally.calls for name, tally in stages.items()},
+        }
+        # Scripts for the same file run side by side after one OCR pass
+        llm_seconds = max(llm_seconds, seconds)
+
+    quote['ocr_seconds'] = round(num_pages * rates['ocr_seconds_per_page'], 1)
+    quote['seconds'] = round(quote['ocr_seconds'] + llm_seconds, 1)
+    quote['llm_calls'] = sum(script['llm_calls'] for script in quote['scripts'].values())
+    quote['usd'] = round(sum(script['usd'] for script in quote['scripts'].values()), 4)
+    return quote
+
+
+def estimate(page_counts, scripts, workers=None):
+    # page_counts: [(filename, pages)]; files run `workers` at a time
+    rates = calibration()
+    files = [dict(estimate_file(pages, scripts, rates), filename=filename) for filename, pages in page_counts]
+    workers = workers or int(os.getenv('SCHEDULER_WORKERS', '4'))
+    longest = max((quote['seconds'] for quote in files), default=0)
+    return {
+        'files': files,
+        'llm_calls': sum(quote['llm_calls'] for quote in files),
+        'usd': round(sum(quote['usd'] for quote in files), 4),
+        'seconds': round(max(longest, sum(quote['seconds'] for quote in files) / workers), 1),
+        'calibration': {name: round(value, 3) if isinstance(value, float) else value for name, value in rates.items()},
+    }
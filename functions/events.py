@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+import subprocess
+import contextvars
+from contextlib import contextmanager
+
+# Progress events from the OCR and process scripts. Instead of printing
+# documents and intermediate summaries to stdout (which the parent buffered in
+# full and then discarded), scripts emit small JSON lines:
+#
+#   {"event": "stage_start", "stage": "memory_log", "ts": ...}
+#   {"event": "pages_done", "stage": "summaries", "pages": 4, "ts": ...}
+#   {"event": "llm_call", "seconds": 1.8, "ts": ...}
+#   {"event": "error", "stage": "summaries", "message": "...", "ts": ...}
+#
+# In a subprocess they go to the file descriptor named by PIPELINE_EVENT_FD,
+# which run_subprocess() reads line by line while the script runs. In-process
+# they go to the handler set with listening() around the call, which worker
+# pools carry over with bind(). Either way they are tallied in `counters`,
+# which main.py exposes on /metrics.
+
+EVENT_FD_ENV = 'PIPELINE_EVENT_FD'
+
+# How much of a failed subprocess's stderr to keep for the log
+STDERR_TAIL_BYTES = 8 * 1024
+
+STAGE_START = 'stage_start'
+STAGE_FINISH = 'stage_finish'
+PAGES_DONE = 'pages_done'
+LLM_CALL = 'llm_call'
+ERROR = 'error'
+
+
+class EventCounters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.events = {}
+        self.pages = {}
+        self.stage_seconds = {}
+        self.llm_seconds = 0.0
+
+    def record(self, event):
+        with self._lock:
+            name = event.get('event')
+            self.events[name] = self.events.get(name, 0) + 1
+            if name == PAGES_DONE:
+                stage = event.get('stage', 'unknown')
+                self.pages[stage] = self.pages.get(stage, 0) + event.get('pages', 0)
+            elif name == LLM_CALL:
+                self.llm_seconds += event.get('seconds', 0.0)
+            elif name == STAGE_FINISH:
+                stage = event.get('stage', 'unknown')
+                self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + event.get('seconds', 0.0)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'events': dict(self.events),
+                'pages_done': dict(self.pages),
+                'stage_seconds': {stage: round(seconds, 3) for stage, seconds in self.stage_seconds.items()},
+                'llm_calls': self.events.get(LLM_CALL, 0),
+                'llm_seconds': round(self.llm_seconds, 3),
+                'errors': self.events.get(ERROR, 0),
+            }
+
+
+counters = EventCounters()
+
+_listener = contextvars.ContextVar('event_listener', default=None)
+
+_out = None
+_out_lock = threading.Lock()
+
+
+def _event_stream():
+    global _out
+    if _out is None:
+        fd = os.getenv(EVENT_FD_ENV)
+        if fd:
+            _out = os.fdopen(int(fd), 'w', buffering=1, encoding='utf-8')
+    return _out
+
+
+@contextmanager
+def listening(on_event):
+    # Events emitted in this context (this thread, and pools using bind())
+    # also go to on_event
+    token = _listener.set(on_event)
+    try:
+        yield
+    finally:
+        _listener.reset(token)
+
+
+def bind(fn):
+    # Executor threads do not inherit context; carry the current handler over
+    on_event = _listener.get()
+    if on_event is None:
+        return fn
+
+    def run(*args, **kwargs):
+        with listening(on_event):
+            return fn(*args, **kwargs)
+
+    return run
+
+
+def _deliver(on_event, record):
+    try:
+        on_event(record)
+    except Exception as e:
+        logging.warning(f"Event handler failed: {str(e)}")
+
+
+def emit(event, **fields):
+    record = dict(fields, event=event, ts=time.time())
+    counters.record(record)
+    on_event = _listener.get()
+    if on_event is not None:
+        _deliver(on_event, record)
+    with _out_lock:
+        out = _event_stream()
+        if out is not None:
+            try:
+                out.write(json.dumps(record, default=str) + '\n')
+            except (OSError, ValueError):
+                # Parent went away; events are best effort
+                pass
+
+
+@contextmanager
+def stage(name, **fields):
+    started = time.time()
+    emit(STAGE_START, stage=name, **fields)
+    try:
+        yield
+    except Exception as e:
+        emit(ERROR, stage=name, message=str(e))
+        raise
+    emit(STAGE_FINISH, stage=name, seconds=round(time.time() - started, 3), **fields)
+
+
+def _consume(read_fd, on_event):
+    with os.fdopen(read_fd, 'r', encoding='utf-8') as stream:
+        for line in stream:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            counters.record(record)
+            if on_event:
+                _deliver(on_event, record)
+
+
+def run_subprocess(args, env=None, timeout=None, on_event=None):
+    # Like subprocess.run, but stdout is discarded, only the tail of stderr is
+    # kept, and events are handed to on_event as they arrive. Returns
+    # (returncode, stderr tail); raises subprocess.TimeoutExpired.
+    read_fd, write_fd = os.pipe()
+    env = dict(env if env is not None else os.environ, **{EVENT_FD_ENV: str(write_fd)})
+    with tempfile.TemporaryFile() as stderr:
+        try:
+            process = subprocess.Popen(
+                args, stdout=subprocess.DEVNULL, stderr=stderr, env=env, pass_fds=(write_fd,)
+            )
+        except Exception:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+
+        reader = threading.Thread(target=_consume, args=(read_fd, on_event), daemon=True)
+        reader.start()
+        try:
+            returncode = process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            raise
+        finally:
+            reader.join()
+
+        stderr.seek(0, os.SEEK_END)
+        stderr.seek(max(stderr.tell() - STDERR_TAIL_BYTES, 0))
+        return returncode, stderr.read().decode('utf-8', errors='replace')
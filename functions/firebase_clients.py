@@ -0,0 +1,54 @@
+import os
+import logging
+import threading
+import standin
+
+# Firebase Admin, Firestore and Storage are set up on first use instead of at
+# import time. Importing google.cloud.firestore (gRPC) and reading the service
+# account dominate cold start, and an instance that only answers OPTIONS or
+# job status from the local store never needs them.
+
+_lock = threading.Lock()
+_firestore_client = None
+_bucket = None
+
+
+def init_app():
+    import firebase_admin
+    from firebase_admin import credentials
+
+    # Initialize Firebase Admin SDK if not already initialized
+    if not firebase_admin._apps:
+        cred = credentials.Certificate('FirebaseConfig.json')
+        firebase_admin.initialize_app(cred, {
+            'storageBucket': os.getenv('FIREBASE_STORAGE_BUCKET')
+        })
+
+
+def get_firestore_client():
+    global _firestore_client
+    with _lock:
+        if _firestore_client is None:
+            if standin.enabled('firestore'):
+                _firestore_client = standin.MemoryFirestore()
+            else:
+                from firebase_admin import firestore
+
+                init_app()
+                _firestore_client = firestore.client()
+    return _firestore_client
+
+
+def get_bucket():
+    global _bucket
+    with _lock:
+        if _bucket is None:
+            if standin.enabled('bucket'):
+                _bucket = standin.bucket()
+            else:
+                from firebase_admin import storage
+
+                init_app()
+                _bucket = storage.bucket()
+            logging.info(f"Using Firebase storage bucket: {_bucket.name}")
+    return _bucket
@@ -0,0 +1,98 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+import events
+
+# Process-wide concurrency governor. Work is split into three kinds, each
+# with its own limit: "cpu" (page rendering, OpenCV, EasyOCR, PDF
+# rendering), "ocr" (Azure Read requests, held while polling) and "llm"
+# (Anthropic calls). Every thread pool in main.py, ocr.py and the process
+# scripts takes a slot before doing that kind of work, so nested pools can
+# no longer multiply into hundreds of simultaneous requests. In warm mode
+# the whole pipeline shares one governor; subprocesses get their own copy
+# with the same limits from the environment.
+
+DEFAULT_LIMITS = {
+    'cpu': os.cpu_count() or 1,
+    'ocr': 8,
+    'llm': 8,
+}
+
+
+def limits_from_env():
+    return {
+        kind: int(os.getenv(f'GOVERNOR_{kind.upper()}_LIMIT', str(default)))
+        for kind, default in DEFAULT_LIMITS.items()
+    }
+
+
+class Governor:
+    def __init__(self, limits):
+        self.limits = dict(limits)
+        self._semaphores = {kind: threading.Semaphore(limit) for kind, limit in self.limits.items()}
+        self._lock = threading.Lock()
+        self._stats = {
+            kind: {'active': 0, 'waiting': 0, 'max_waiting': 0, 'acquired': 0, 'wait_seconds': 0.0}
+            for kind in self.limits
+        }
+
+    @contextmanager
+    def slot(self, kind):
+        stats = self._stats[kind]
+        with self._lock:
+            stats['waiting'] += 1
+            stats['max_waiting'] = max(stats['max_waiting'], stats['waiting'])
+
+        started = time.monotonic()
+        self._semaphores[kind].acquire()
+        waited = time.monotonic() - started
+
+        with self._lock:
+            stats['waiting'] -= 1
+            stats['active'] += 1
+            stats['acquired'] += 1
+            stats['wait_seconds'] += waited
+        try:
+            yield
+        finally:
+            with self._lock:
+                stats['active'] -= 1
+            self._semaphores[kind].release()
+
+    def pool_size(self, kind):
+        # No point running more threads for a kind of work than it has slots
+        return self.limits[kind]
+
+    def metrics(self):
+        with self._lock:
+            return {
+                kind: dict(stats, limit=self.limits[kind], wait_seconds=round(stats['wait_seconds'], 3))
+                for kind, stats in self._stats.items()
+            }
+
+
+governor = Governor(limits_from_env())
+logging.info(f"Concurrency governor limits: {governor.limits}")
+
+
+# Every model wrapped by govern_llm, so warm-up can open their connections
+governed_models = []
+
+
+def govern_llm(llm):
+    # Wraps a chat model so every call through a chain takes an "llm" slot
+    from langchain_core.runnables import RunnableLambda
+
+    governed_models.append(llm)
+
+    def invoke(value):
+        with governor.slot('llm'):
+            started = time.time()
+            try:
+                return llm.invoke(value)
+            finally:
+                events.emit(events.LLM_CALL, seconds=round(time.time() - started, 3))
+
+    return RunnableLambda(invoke)
@@ -0,0 +1,115 @@
+import os
+import shutil
+import logging
+from datetime import timedelta
+
+# Object references for files the client has already put in storage. These
+# stand in for werkzeug FileStorage objects (same `filename` / `save()` shape)
+# so handle_file can stream them straight into the OCR temp path instead of
+# having the bytes pass through Next.js and the request body.
+#
+# Only objects under INGEST_PREFIX ("incoming/" by default) can be referenced,
+# so everything else in the bucket (outputs, cached results, checkpoints) is
+# never readable through this path, and objects larger than INGEST_MAX_BYTES
+# are refused. Requests are not authenticated, so this does not check who
+# uploaded an object: any caller who knows an object's name under the prefix
+# can have it processed. Per-user ownership needs the caller's Firebase ID
+# token verified here first.
+
+INGEST_PREFIX = os.getenv('INGEST_PREFIX', 'incoming/')
+INGEST_MAX_BYTES = int(os.getenv('INGEST_MAX_BYTES', str(256 * 1024 * 1024)))
+
+
+class ObjectUpload:
+    is_remote = True
+
+    def __init__(self, object_path, bucket):
+        self.object_path = object_path
+        self.blob = None
+        self.local_path = None
+
+        if object_path.startswith('gs://'):
+            bucket_name, _, blob_name = object_path[len('gs://'):].partition('/')
+            if bucket_name != bucket.name and bucket_name not in allowed_buckets():
+                raise ValueError(f"Bucket not allowed for ingestion: {bucket_name}")
+            if not blob_name:
+                raise ValueError(f"Missing object name: {object_path}")
+            check_ingest_object(blob_name)
+            if bucket_name != bucket.name:
+                bucket = bucket.client.bucket(bucket_name)
+            # get_blob loads the object's metadata, so blob.size is known for
+            # admission, file ordering and the storage budget
+            self.blob = bucket.get_blob(blob_name)
+            if self.blob is None:
+                raise ValueError(f"Object not found: {object_path}")
+            check_ingest_size(object_path, self.blob.size)
+            self.filename = os.path.basename(blob_name)
+        else:
+            local_root = os.getenv('INGEST_LOCAL_ROOT')
+            if not local_root:
+                raise ValueError("Local object paths are disabled")
+            path = os.path.realpath(object_path)
+            if os.path.commonpath([path, os.path.realpath(local_root)]) != os.path.realpath(local_root):
+                raise ValueError(f"Path outside INGEST_LOCAL_ROOT: {object_path}")
+            if not os.path.isfile(path):
+                raise ValueError(f"File not found: {object_path}")
+            check_ingest_size(object_path, os.path.getsize(path))
+            self.local_path = path
+            self.filename = os.path.basename(path)
+
+    def save(self, destination):
+        if self.blob is not None:
+            logging.info(f"Streaming {self.object_path} to {destination}")
+            self.blob.download_to_filename(destination)
+        else:
+            # Local stand-in: link rather than copy where the filesystem allows it
+            try:
+                os.symlink(self.local_path, destination)
+            except OSError:
+                shutil.copyfile(self.local_path, destination)
+
+    def read(self):
+        if self.blob is not None:
+            logging.info(f"Reading {self.object_path} into memory")
+            return self.blob.download_as_bytes()
+        with open(self.local_path, 'rb') as f:
+            return f.read()
+
+    def signed_url(self):
+        if self.blob is None:
+            return None
+        return self.blob.generate_signed_url(expiration=timedelta(days=1))
+
+
+def check_ingest_object(blob_name):
+    # Nothing outside the prefix and no empty or relative parts
+    if not blob_name.startswith(INGEST_PREFIX):
+        raise ValueError(f"Objects must be under {INGEST_PREFIX}: {blob_name}")
+    parts = blob_name[len(INGEST_PREFIX):].split('/')
+    if not all(parts) or any(part in ('.', '..') for part in parts):
+        raise ValueError(f"Invalid ingestion object name: {blob_name}")
+
+
+def check_ingest_size(object_path, size):
+    if size is not None and size > INGEST_MAX_BYTES:
+        raise ValueError(f"Object too large ({size} bytes, limit {INGEST_MAX_BYTES}): {object_path}")
+
+
+def allowed_buckets():
+    return [name.strip() for name in os.getenv('INGEST_BUCKETS', '').split(',') if name.strip()]
+
+
+def object_paths_from_request(request):
+    paths = request.form.getlist('object_paths')
+    if not paths and request.is_json:
+        paths = (request.get_json(silent=True) or {}).get('object_paths', [])
+    return [path for path in paths if path]
+
+
+def parse_object_uploads(request, get_bucket):
+    # The bucket client is only created when the request references objects
+    paths = object_paths_from_request(request)
+    if not paths:
+        return []
+    bucket = get_bucket()
+    return [ObjectUpload(path, bucket) for path in paths]
@@ -0,0 +1,218 @@
+import os
+import time
+import shutil
+import logging
+import tempfile
+import threading
+from uuid import uuid4
+from flask import jsonify
+from concurrent.futures import ThreadPoolExecutor
+import admission
+import storage_budget
+
+# Submit/status/result job API. A submitted request is spooled to local disk,
+# queued on a background pool and tracked in a job store (the Firestore
+# `uploads` collection, or an in-memory stand-in) so clients can poll for
+# stage progress instead of holding the HTTP request open.
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+
+def _merge(target, fields):
+    for key, value in fields.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+
+
+class LocalJobStore:
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id, fields):
+        with self._lock:
+            self._jobs[job_id] = dict(fields)
+
+    def update(self, job_id, fields):
+        with self._lock:
+            _merge(self._jobs.setdefault(job_id, {}), fields)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+
+class FirestoreJobStore:
+    def __init__(self, get_firestore_client, collection='uploads'):
+        # Takes a getter so the Firestore client is only built on first use
+        self.get_firestore_client = get_firestore_client
+        self.collection_name = collection
+
+    @property
+    def collection(self):
+        return self.get_firestore_client().collection(self.collection_name)
+
+    def create(self, job_id, fields):
+        self.collection.document(job_id).set(fields)
+
+    def update(self, job_id, fields):
+        self.collection.document(job_id).set(fields, merge=True)
+
+    def get(self, job_id):
+        snapshot = self.collection.document(job_id).get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+
+def create_job_store(get_firestore_client):
+    if os.getenv('JOB_STORE', 'firestore').lower() == 'local':
+        return LocalJobStore()
+    return FirestoreJobStore(get_firestore_client)
+
+
+class SpooledUpload:
+    # Keeps a copy of an uploaded file on local disk so it outlives the request.
+    def __init__(self, file, spool_dir):
+        self.filename = file.filename
+        fd, self.path = tempfile.mkstemp(dir=spool_dir)
+        os.close(fd)
+        file.save(self.path)
+
+    def save(self, destination):
+        shutil.copyfile(self.path, destination)
+
+    def read(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+
+class JobProgress:
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+
+    def __call__(self, filename, stage, detail=None):
+        # detail carries counters from the scripts' progress events, e.g. pagesDone
+        if detail is None:
+            logging.info(f"Job {self.job_id}: {filename} -> {stage}")
+        try:
+            self.store.update(self.job_id, {
+                'stage': stage,
+                'files': {filename: dict(detail or {}, stage=stage, updatedAt=time.time())},
+            })
+        except Exception as e:
+            logging.warning(f"Could not record progress for job {self.job_id}: {str(e)}")
+
+
+class JobQueue:
+    def __init__(self, store, max_workers=None):
+        self.store = store
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or int(os.getenv('JOB_WORKERS', '2')),
+            thread_name_prefix='job'
+        )
+
+    def submit(self, job_id, files, run, **fields):
+        spool_dir = tempfile.mkdtemp(prefix=f'job_{job_id}_')
+        spooled = [file if getattr(file, 'is_remote', False) else SpooledUpload(file, spool_dir) for file in files]
+
+        self.store.create(job_id, dict(fields, **{
+            'jobId': job_id,
+            'status': JOB_QUEUED,
+            'stage': JOB_QUEUED,
+            'filenames': [file.filename for file in spooled],
+            'submittedAt': time.time(),
+        }))
+        # Whole uploads wait here in /tmp until the job runs
+        storage_budget.budget.charge('spool', storage_budget.directory_bytes(spool_dir))
+        self.executor.submit(self._run, job_id, spooled, spool_dir, run)
+        logging.info(f"Queued job {job_id} with {len(spooled)} file(s)")
+
+    def _run(self, job_id, files, spool_dir, run):
+        self.store.update(job_id, {'status': JOB_RUNNING, 'startedAt': time.time()})
+        try:
+            results = run(files, JobProgress(self.store, job_id))
+            self.store.update(job_id, {
+                'status': JOB_DONE,
+                'stage': JOB_DONE,
+                'results': results,
+                'finishedAt': time.time(),
+            })
+        except Exception as e:
+            logging.exception(f"Job {job_id} failed")
+            self.store.update(job_id, {
+                'status': JOB_FAILED,
+                'error': str(e),
+                'finishedAt': time.time(),
+            })
+        finally:
+            spooled_bytes = storage_budget.directory_bytes(spool_dir)
+            shutil.rmtree(spool_dir, ignore_errors=True)
+            storage_budget.budget.credit('spool', spooled_bytes)
+
+
+def parse_job_path(path):
+    # "/jobs" -> (None, None), "/jobs/<id>" -> (id, None), "/jobs/<id>/result" -> (id, "result")
+    parts = [part for part in path.split('/') if part]
+    if 'jobs' not in parts:
+        return None
+    parts = parts[parts.index('jobs') + 1:]
+    job_id = parts[0] if parts else None
+    action = parts[1] if len(parts) > 1 else None
+    return job_id, action
+
+
+def job_status(job):
+    return {
+        'jobId': job.get('jobId'),
+        'status': job.get('status'),
+        'stage': job.get('stage'),
+        'files': job.get('files', {}),
+        'filenames': job.get('filenames', []),
+        'error': job.get('error'),
+    }
+
+
+def handle_job_request(request, headers, store, queue, params, files, run_uploads, admission_controller=None):
+    job_id, action = parse_job_path(request.path)
+
+    if request.method == 'GET' and job_id:
+        job = store.get(job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404, headers
+        if action == 'result':
+            if job.get('status') != JOB_DONE:
+                return jsonify(job_status(job)), 202, headers
+            return jsonify({"uniqueId": job_id, "results": job.get('results', [])}), 200, headers
+        return jsonify(job_status(job)), 200, headers
+
+    if request.method != 'POST' or job_id:
+        return jsonify({"error": "Unsupported job route"}), 405, headers
+
+    if not files or not params['script'] or not params['model'] or not params['custom_template']:
+        logging.error(f"Missing job parameters. Files: {files}, Params: {params}")
+        return jsonify({"error": "Missing parameters"}), 400, headers
+
+    ticket, rejected = admission.admit(admission_controller, files, headers)
+    if rejected:
+        return rejected
+
+    def run(spooled, progress):
+        try:
+            return run_uploads(spooled, params, unique_id, progress, background=True)
+        finally:
+            admission.release(admission_controller, ticket)
+
+    unique_id = str(uuid4())
+    try:
+        queue.submit(unique_id, files, run, script=params['script'], model=params['model'])
+    except Exception:
+        # run never starts, so the ticket would never be released
+        admission.release(admission_controller, ticket)
+        raise
+    return jsonify({"jobId": unique_id, "uniqueId": unique_id, "status": JOB_QUEUED}), 202, headers
@@ -0,0 +1,14 @@
+import standin
+
+# Builds the chat models the process scripts use. With the "llm" stand-in
+# selected (STANDIN=llm or STANDIN=all) every model is a FakeChatModel, so
+# the scripts run offline without an Anthropic key being used.
+
+
+def chat_model(model_name, api_key, temperature=0):
+    if standin.enabled('llm'):
+        return standin.FakeChatModel()
+
+    from langchain_anthropic import ChatAnthropic
+
+    return ChatAnthropic(model_name=model_name, api_key=api_key, temperature=temperature)
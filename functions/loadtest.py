@@ -0,0 +1,257 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import threading
+import subprocess
+import urllib.request
+from uuid import uuid4
+from concurrent.futures import ThreadPoolExecutor
+
+# Load generator for uploadEmail. Replays a mix of document sizes and scripts
+# at a target request rate and reports end-to-end and per-stage latency
+# percentiles, pages per minute, error rate and peak RSS as JSON, so
+# concurrency settings and code changes can be compared before they ship.
+#
+# By default requests go to main.uploadEmail in this process through a Flask
+# test client; run it with the stand-ins for a box with no network:
+#
+#   STANDIN=all API_KEY=x JOB_STORE=local python3 loadtest.py \
+#       --rate 2 --duration 60 --mix 1:6,10:3,80:1 --output run.json
+#
+# Every request carries its own document (seeded by request index), so the
+# result cache and single-flight, which key on the file's bytes, never answer
+# one request from another's work. --repeat-documents sends one document per
+# size instead, to measure the cache hit path.
+#
+# With --url requests go over HTTP to a running instance instead (e.g.
+# `functions-framework --target uploadEmail`), and --server-pid lets the
+# report include that process's peak RSS.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Settings worth recording next to the numbers
+CONFIG_ENV = [
+    'STANDIN', 'STANDIN_OCR_LATENCY', 'STANDIN_LLM_LATENCY', 'PIPELINE_MODE', 'PIPELINE_STREAMING',
+    'IN_MEMORY_PIPELINE', 'REQUEST_DEADLINE_SECONDS', 'GOVERNOR_CPU_LIMIT', 'GOVERNOR_OCR_LIMIT', 'GOVERNOR_LLM_LIMIT',
+    'SCHEDULER_WORKERS', 'FILE_ORDER_POLICY', 'ADMISSION_MAX_PAGES', 'RESULT_CACHE', 'CHECKPOINT_BACKEND', 'STORAGE_BUDGET_BYTES',
+]
+
+
+def parse_mix(value):
+    # "1:6,10:3,80:1" -> [(pages, weight)]
+    mix = []
+    for item in value.split(','):
+        pages, _, weight = item.partition(':')
+        mix.append((int(pages), float(weight or 1)))
+    return mix
+
+
+def make_pdf(pages, seed):
+    import fitz
+
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        lines = [f"Load test document {seed}, page {page_num + 1}"]
+        lines += [f"On 2023-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} officer {rng.randint(1, 99)} filed report line {i}" for i in range(30)]
+        page.insert_text((50, 60), "\n".join(lines), fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def percentiles(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def at(q):
+        return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)], 3)
+
+    return {'count': len(ordered), 'p50': at(0.50), 'p95': at(0.95), 'p99': at(0.99), 'max': round(ordered[-1], 3)}
+
+
+def multipart(fields, files):
+    boundary = uuid4().hex
+    body = b''
+    for name, value in fields.items():
+        body += f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode('utf-8')
+    for filename, data in files:
+        body += (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="files"; filename="{filename}"\r\n'
+            f'Content-Type: application/pdf\r\n\r\n'
+        ).encode('utf-8') + data + b'\r\n'
+    body += f'--{boundary}--\r\n'.encode('utf-8')
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+class LocalTarget:
+    def __init__(self):
+        from flask import Flask, request
+        sys.path.insert(0, SCRIPT_DIR)
+        import main
+
+        app = Flask('loadtest')
+        app.add_url_rule(
+            '/', 'upload', lambda: main.uploadEmail(request), methods=['GET', 'POST', 'OPTIONS']
+        )
+        self.client = app.test_client()
+
+    def post(self, body, content_type):
+        response = self.client.post('/', data=body, content_type=content_type)
+        return response.status_code, response.get_data()
+
+
+class HttpTarget:
+    def __init__(self, url):
+        self.url = url
+
+    def post(self, body, content_type):
+        req = urllib.request.Request(self.url, data=body, headers={'Content-Type': content_type}, method='POST')
+        try:
+            with urllib.request.urlopen(req, timeout=3600) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+def peak_rss_mb(server_pid=None):
+    if server_pid:
+        try:
+            with open(f'/proc/{server_pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        return round(int(line.split()[1]) / 1024, 1)
+        except OSError:
+            return None
+    # ru_maxrss is in KiB on Linux; children covers the subprocess pipeline
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / 1024, 1)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(args):
+    target = HttpTarget(args.url) if args.url else LocalTarget()
+    mix = parse_mix(args.mix)
+    scripts = args.scripts.split(';')
+    rng = random.Random(args.seed)
+    total = args.requests or max(int(args.duration * args.rate), 1)
+    plan = [
+        (index, rng.choices([pages for pages, _ in mix], weights=[weight for _, weight in mix])[0], scripts[index % len(scripts)])
+        for index in range(total)
+    ]
+    # Built before the clock starts so rendering PDFs doesn't delay the schedule
+    if args.repeat_documents:
+        by_pages = {pages: make_pdf(pages, pages) for pages, _ in mix}
+        documents = [by_pages[pages] for _, pages, _ in plan]
+    else:
+        documents = [make_pdf(pages, f'{args.seed}-{index}') for index, pages, _ in plan]
+
+    samples = []
+    samples_lock = threading.Lock()
+
+    def send(index, pages, script):
+        fields = {
+            'script': script, 'model': args.model, 'custom_template': args.template, 'send_email': 'false',
+            'user_email': f'user{index % args.users}@loadtest.local',
+        }
+        if args.deadline:
+            fields['deadline_seconds'] = args.deadline
+        body, content_type = multipart(fields, [(f'doc_{index}_{pages}p.pdf', documents[index])])
+        started = time.time()
+        try:
+            status, data = target.post(body, content_type)
+            error = None if status == 200 else f'HTTP {status}'
+        except Exception as e:
+            status, data, error = None, b'', str(e)
+        elapsed = time.time() - started
+
+        stages = {}
+        if error is None:
+            try:
+                for result in json.loads(data).get('results', []):
+                    for stage, timing in (result.get('stageTimings') or {}).items():
+                        stages[stage] = timing['end'] - timing['start']
+            except (ValueError, AttributeError):
+                error = 'Unreadable response'
+        with samples_lock:
+            samples.append({'pages': pages, 'script': script, 'seconds': elapsed, 'status': status, 'error': error, 'stages': stages})
+
+    # Open loop: requests start on schedule whether or not earlier ones finished
+    interval = 1.0 / args.rate
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix='load') as executor:
+        for index, pages, script in plan:
+            delay = started + index * interval - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, index, pages, script)
+    elapsed = time.time() - started
+
+    succeeded = [sample for sample in samples if sample['error'] is None]
+    stage_names = sorted({stage for sample in succeeded for stage in sample['stages']})
+    errors = {}
+    for sample in samples:
+        if sample['error']:
+            errors[sample['error']] = errors.get(sample['error'], 0) + 1
+
+    return {
+        'revision': git_revision(),
+        'config': dict(vars(args), env={name: os.getenv(name) for name in CONFIG_ENV if os.getenv(name) is not None}),
+        'elapsed_seconds': round(elapsed, 3),
+        'requests': len(samples),
+        'succeeded': len(succeeded),
+        'error_rate': round(1 - len(succeeded) / len(samples), 4) if samples else 0.0,
+        'errors': errors,
+        'pages_per_minute': round(sum(sample['pages'] for sample in succeeded) / elapsed * 60, 2) if elapsed else 0.0,
+        'latency': {
+            'end_to_end': percentiles([sample['seconds'] for sample in succeeded]),
+            'by_pages': {pages: percentiles([s['seconds'] for s in succeeded if s['pages'] == pages]) for pages, _ in mix},
+            'stages': {stage: percentiles([s['stages'][stage] for s in succeeded if stage in s['stages']]) for stage in stage_names},
+        },
+        'peak_rss_mb': peak_rss_mb(args.server_pid),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test uploadEmail')
+    parser.add_argument('--url', help='POST to this URL instead of calling main.uploadEmail in-process')
+    parser.add_argument('--server-pid', type=int, help='report peak RSS of this process (with --url)')
+    parser.add_argument('--rate', type=float, default=1.0, help='requests per second')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds of traffic')
+    parser.add_argument('--requests', type=int, help='send exactly this many requests instead')
+    parser.add_argument('--concurrency', type=int, default=32, help='most requests in flight')
+    parser.add_argument('--mix', default='1:6,10:3,80:1', help='pages:weight,... document sizes')
+    parser.add_argument('--scripts', default='process-brief.py;timelines.py', help='script values to rotate through, ;-separated')
+    parser.add_argument('--users', type=int, default=4, help='distinct user_email values')
+    parser.add_argument('--model', default='claude-3-haiku-20240307')
+    parser.add_argument('--template', default='Summarize the police report.')
+    parser.add_argument('--deadline', default='', help='deadline_seconds to send')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat-documents', action='store_true', help='send one identical document per size, so the result cache and single-flight can answer repeats')
+    parser.add_argument('--output', help='write the JSON report here as well as to stdout')
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    return 0 if report['succeeded'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
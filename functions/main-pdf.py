@@ -14,6 +14,7 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 import smtplib
 from create_pdf_and_email import create_pdf
+import jobs
 
 
 # Initialize Firebase Admin SDK if not already initialized
@@ -28,6 +29,9 @@ bucket = storage.bucket()
 
 logging.info(f"Using Firebase storage bucket: {bucket.name}")
 
+job_store = jobs.create_job_store(lambda: firestore_client)
+job_queue = jobs.JobQueue(job_store)
+
 def process_file(file, temp_dir, batch_directory, unique_file_id, selected_script, selected_model, custom_template):
     logging.info(f"Processing file: {file.filename}")
 
@@ -123,7 +127,9 @@ def store_in_firestore(unique_id, file, pdf_file_url, json_file_url, processed_f
         'uploadedAt': firestore.SERVER_TIMESTAMP
     })
 
-def handle_file(file, selected_script, selected_model, custom_template, send_email_flag, user_email):
+def handle_file(file, selected_script, selected_model, custom_template, send_email_flag, user_email, progress=None):
+    report = progress or (lambda filename, stage: None)
+
     with tempfile.TemporaryDirectory() as temp_dir:
         logging.info(f"Created temporary directory: {temp_dir}")
 
@@ -132,14 +138,17 @@ def handle_file(file, selected_script, selected_model, custom_template, send_ema
         os.makedirs(batch_directory, exist_ok=True)
         logging.info(f"Created batch directory: {batch_directory}")
 
+        report(file.filename, 'processing')
         temp_file_path, temp_output_path, process_output_path = process_file(
             file, temp_dir, batch_directory, unique_file_id, selected_script, selected_model, custom_template
         )
 
         if temp_file_path and temp_output_path and process_output_path:
+            report(file.filename, 'rendering')
             pdf_summary_path = os.path.join(temp_dir, f'{unique_file_id}_summary.pdf')
             create_pdf(process_output_path, pdf_summary_path)
 
+            report(file.filename, 'uploading')
             pdf_file_url, json_file_url, processed_file_url, pdf_summary_url = upload_files(
                 file, unique_file_id, temp_file_path, temp_output_path, process_output_path, pdf_summary_path
             )
@@ -158,6 +167,7 @@ def handle_file(file, selected_script, selected_model, custom_template, send_ema
                 except Exception as e:
                     logging.error(f"Error sending email: {str(e)}")
 
+            report(file.filename, 'complete')
             return {
                 'filename': file.filename,
                 'pdfFileUrl': pdf_file_url,
@@ -168,8 +178,38 @@ def handle_file(file, selected_script, selected_model, custom_template, send_ema
             }
         else:
             logging.error(f"Error processing file: {file.filename}")
+            report(file.filename, 'failed')
             return None
 
+def process_uploads(files, params, unique_id, progress=None, background=False):
+    # `background` is passed by the job runner; this entry point has no request deadline
+    uploaded_files = []
+
+    with ThreadPoolExecutor() as executor:
+        futures = [
+            executor.submit(
+                handle_file, file, params['script'], params['model'], params['custom_template'],
+                params['send_email'], params['user_email'], progress
+            )
+            for file in files
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            if result:
+                uploaded_files.append(result)
+
+    logging.info(f"Uploaded files: {uploaded_files}")
+    return uploaded_files
+
+def parse_upload_params(request):
+    return {
+        'script': request.form.get('script'),
+        'model': request.form.get('model'),
+        'custom_template': request.form.get('custom_template'),
+        'send_email': request.form.get('send_email'),
+        'user_email': request.form.get('user_email'),
+    }
+
 @functions_framework.http
 def uploadFunction(request):
     logging.info(f"Received request: {request}")
@@ -184,30 +224,21 @@ def uploadFunction(request):
         return '', 204, headers
 
     headers = {'Access-Control-Allow-Origin': '*'}
+    if jobs.parse_job_path(request.path) is not None:
+        return jobs.handle_job_request(request, headers, job_store, job_queue, parse_upload_params(request), request.files.getlist('files'), process_uploads)
+
     if 'files' not in request.files:
         logging.error("No files uploaded")
         return jsonify({"error": "No files uploaded"}), 400, headers
 
     files = request.files.getlist('files')
-    selected_script = request.form.get('script')
-    selected_model = request.form.get('model')
-    custom_template = request.form.get('custom_template')
-    send_email_flag = request.form.get('send_email')
-    user_email = request.form.get('user_email')
-
-    if not files or not selected_script or not selected_model or not custom_template:
-        logging.error(f"Missing parameters. Files: {files}, Script: {selected_script}, Model: {selected_model}, Custom Template: {custom_template}")
+    params = parse_upload_params(request)
+
+    if not files or not params['script'] or not params['model'] or not params['custom_template']:
+        logging.error(f"Missing parameters. Files: {files}, Script: {params['script']}, Model: {params['model']}, Custom Template: {params['custom_template']}")
         return jsonify({"error": "Missing parameters"}), 400, headers
 
-    uploaded_files = []
     unique_id = str(uuid4())
+    uploaded_files = process_uploads(files, params, unique_id)
 
-    with ThreadPoolExecutor() as executor:
-        futures = [executor.submit(handle_file, file, selected_script, selected_model, custom_template, send_email_flag, user_email) for file in files]
-        for future in as_completed(futures):
-            result = future.result()
-            if result:
-                uploaded_files.append(result)
-
-    logging.info(f"Uploaded files: {uploaded_files}")
     return jsonify({"uniqueId": unique_id, "results": uploaded_files}), 200, headers
\ No newline at end of file
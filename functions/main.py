@@ -1,77 +1,106 @@
 import os
 import json
 import logging
-import subprocess
 import tempfile
 from uuid import uuid4
 from flask import request, jsonify
-import firebase_admin
-from firebase_admin import credentials, storage, firestore
 import functions_framework
 from datetime import timedelta
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from email.mime.text import MIMEText
-import smtplib
-from create_pdf_and_email import create_pdf
-
-from email import encoders
-from email.mime.base import MIMEBase
-from email.mime.multipart import MIMEMultipart
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import pipeline_workers
+import artifacts
+import jobs
+import ingest
+import result_cache
+import admission
+import checkpoints
+import outbox
+import records
+import scheduler
+import estimator
+import results
+import warmup
+import deadline as deadlines
+import events
+import storage_budget
+from firebase_clients import get_firestore_client, get_bucket
+from singleflight import SingleFlight
+from stage_graph import StageGraph
+from governor import governor
+
 import sys
 import io
-from email.header import Header
-from email.utils import formataddr
 
 
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
-# Initialize Firebase Admin SDK if not already initialized
-if not firebase_admin._apps:
-    cred = credentials.Certificate('FirebaseConfig.json')
-    firebase_admin.initialize_app(cred, {
-        'storageBucket': os.getenv('FIREBASE_STORAGE_BUCKET')
-    })
-
-firestore_client = firestore.client()
-bucket = storage.bucket()
-
-logging.info(f"Using Firebase storage bucket: {bucket.name}")
+job_store = jobs.create_job_store(get_firestore_client)
+job_queue = jobs.JobQueue(job_store)
+result_cache_store = result_cache.create_result_cache(get_bucket)
+inflight_pipelines = SingleFlight()
+admission_controller = admission.create_admission_controller()
+email_outbox = outbox.create_outbox(get_bucket)
+file_scheduler = scheduler.create_scheduler()
+temp_storage = storage_budget.budget
+artifact_executor = ThreadPoolExecutor(max_workers=int(os.getenv('ARTIFACT_WORKERS', '8')), thread_name_prefix='artifact')
+warmup.warm_on_start()
+
+def artifact_paths(file, temp_dir, batch_directory, unique_file_id):
+    temp_file_path = os.path.join(temp_dir, f'{unique_file_id}_{file.filename}')
+    temp_output_path = os.path.join(batch_directory, f'{unique_file_id}_{file.filename}.json')
+    process_output_path = os.path.join(temp_dir, f'{unique_file_id}_processed_output.json')
+    return temp_file_path, temp_output_path, process_output_path
 
-def process_file(file, temp_dir, batch_directory, unique_file_id, selected_script, selected_model, custom_template):
+def event_progress(report, filename, stage=None, interval=2.0):
+    # Turns a script's progress events into job progress for this file,
+    # at most once every `interval` seconds so Firestore is not written per page.
+    # Without a stage, OCR and summarizing are told apart by the events' own stage
+    state = {'pages': {}, 'reported': 0.0}
+
+    def on_event(event):
+        if event.get('event') == events.PAGES_DONE:
+            label = stage or ('ocr' if event.get('stage') == 'ocr' else 'summarizing')
+            state['pages'][label] = state['pages'].get(label, 0) + event.get('pages', 0)
+            if event['ts'] - state['reported'] >= interval:
+                state['reported'] = event['ts']
+                report(filename, label, {'pagesDone': state['pages'][label]})
+        elif event.get('event') == events.ERROR:
+            logging.warning(f"{filename}: {event.get('stage')} reported an error: {event.get('message')}")
+
+    return on_event
+
+def process_file(file, temp_dir, batch_directory, unique_file_id, selected_script, selected_model, custom_template, report=None, on_ocr_complete=None, checkpoint_key=None, deadline=deadlines.NO_DEADLINE):
+    report = report or (lambda filename, stage, detail=None: None)
     logging.info(f"Processing file: {file.filename}")
 
-    temp_file_path = os.path.join(temp_dir, f'{unique_file_id}_{file.filename}')
-    file.save(temp_file_path)
+    temp_file_path, temp_output_path, process_output_path = artifact_paths(file, temp_dir, batch_directory, unique_file_id)
+    if not os.path.exists(temp_file_path):
+        file.save(temp_file_path)
     logging.info(f"Saved uploaded file to temporary path: {temp_file_path}")
-
-    temp_output_path = os.path.join(batch_directory, f'{unique_file_id}_{file.filename}.json')
     logging.info(f"OCR output will be stored at: {temp_output_path}")
 
-    ocr_script_path = os.path.join(os.getcwd(), 'ocr.py')
-    logging.info(f"Running OCR script: {ocr_script_path} with args: {temp_file_path}, {temp_output_path}")
-    ocr_result = subprocess.run(['python3', ocr_script_path, temp_file_path, temp_output_path], capture_output=True)
+    if os.path.exists(temp_output_path):
+        logging.info(f"Using cached OCR output: {temp_output_path}")
+    else:
+        report(file.filename, 'ocr')
+        if not pipeline_workers.run_ocr(temp_file_path, temp_output_path, deadline, event_progress(report, file.filename, 'ocr')):
+            return None, None, None
 
-    if ocr_result.returncode != 0:
-        logging.error(f"OCR script error: {ocr_result.stderr.decode('utf-8')}")
-        return None, None, None
+        logging.info(f"OCR script completed successfully")
+        logging.info(f"OCR output stored at: {temp_output_path}")
 
-    logging.info(f"OCR script completed successfully")
-    logging.info(f"OCR output stored at: {temp_output_path}")
+    if on_ocr_complete:
+        on_ocr_complete()
 
-    process_output_path = os.path.join(temp_dir, f'{unique_file_id}_processed_output.json')
     logging.info(f"Processed output will be stored at: {process_output_path}")
 
-    if selected_script in ['process-detailed.py', 'process-brief.py', 'process-comprehensive.py', 'timelines.py']:
-        process_script_path = os.path.join(os.getcwd(), selected_script)
-        logging.info(f"Running process script: {process_script_path} with args: {batch_directory}, {selected_model}, {custom_template}, {process_output_path}")
-        process_result = subprocess.run(
-            ['python3', process_script_path, batch_directory, selected_model, custom_template, process_output_path],
-            capture_output=True
-        )
-
-        if process_result.returncode != 0:
-            logging.error(f"Process script error: {process_result.stderr.decode('utf-8')}")
+    if pipeline_workers.supports_scripts(selected_script):
+        report(file.filename, 'summarizing')
+        if not pipeline_workers.run_process_scripts(
+            selected_script, batch_directory, selected_model, custom_template, process_output_path, checkpoint_key, deadline,
+            event_progress(report, file.filename, 'summarizing')
+        ):
             return None, None, None
 
         logging.info(f"Process script completed successfully")
@@ -79,142 +108,353 @@ def process_file(file, temp_dir, batch_directory, unique_file_id, selected_scrip
 
     return temp_file_path, temp_output_path, process_output_path
 
-def upload_files(file, unique_file_id, temp_file_path, temp_output_path, process_output_path, pdf_summary_path):
-    pdf_blob = bucket.blob(f'uploads/{unique_file_id}_{file.filename}.pdf')
-    json_blob = bucket.blob(f'ocr_output/{unique_file_id}_{file.filename}.json')
-    processed_blob = bucket.blob(f'processed_output/{unique_file_id}_{file.filename}.json')
-    pdf_summary_blob = bucket.blob(f'pdf_summaries/{unique_file_id}_summary.pdf')
-
-    logging.info(f"Uploading PDF file to: {pdf_blob.name}")
-    pdf_blob.upload_from_filename(temp_file_path)
-    logging.info(f"Uploading JSON file to: {json_blob.name}")
-    json_blob.upload_from_filename(temp_output_path)
-    logging.info(f"Uploading processed file to: {processed_blob.name}")
-    processed_blob.upload_from_filename(process_output_path)
-    logging.info(f"Uploading PDF summary to: {pdf_summary_blob.name}")
-    pdf_summary_blob.upload_from_filename(pdf_summary_path)
-
-    expiration_time = timedelta(days=1)
-    pdf_file_url = pdf_blob.generate_signed_url(expiration=expiration_time)
-    json_file_url = json_blob.generate_signed_url(expiration=expiration_time)
-    processed_file_url = processed_blob.generate_signed_url(expiration=expiration_time)
-    pdf_summary_url = pdf_summary_blob.generate_signed_url(expiration=expiration_time)
-
-    return pdf_file_url, json_file_url, processed_file_url, pdf_summary_url
-
-def send_email(recipient_email, pdf_summary_path):
-    sender_email = os.environ.get('SENDER_EMAIL')
-    sender_password = os.environ.get('SENDER_PASSWORD')
-
-    logging.info(f"Attempting to send email to: {recipient_email}")
-    logging.info(f"PDF summary path: {pdf_summary_path}")
+def file_artifacts(file, temp_dir, batch_directory, unique_file_id, in_memory=False):
+    temp_file_path, temp_output_path, process_output_path = artifact_paths(file, temp_dir, batch_directory, unique_file_id)
+    return {
+        'source': artifacts.Artifact(temp_file_path, in_memory),
+        'ocr': artifacts.Artifact(temp_output_path, in_memory),
+        'processed': artifacts.Artifact(process_output_path, in_memory),
+        'summary': artifacts.Artifact(os.path.join(temp_dir, f'{unique_file_id}_summary.pdf'), in_memory),
+    }
+
+def run_pipeline(file, artifact_set, temp_dir, batch_directory, unique_file_id, selected_script, selected_model, custom_template, report=None, on_ocr_complete=None, checkpoint_key=None, deadline=deadlines.NO_DEADLINE):
+    # process_file works on paths, so make sure any in-memory inputs are on disk
+    artifact_set['source'].materialize()
+    if artifact_set['ocr'].exists():
+        artifact_set['ocr'].materialize()
 
     try:
-        msg = MIMEMultipart()
-        msg['From'] = formataddr(("Sender Name", sender_email))
-        msg['To'] = formataddr(("Recipient Name", recipient_email))
-        subject = "Your Processed Document Summary"
-        msg['Subject'] = Header(subject, 'utf-8')
-        logging.info(f"Email headers set: From={msg['From']}, To={msg['To']}, Subject={subject}")
-
-        body = "Please find your document summary attached to this email."
-        msg.attach(MIMEText(body, 'plain', 'utf-8'))
-        logging.info(f"Email body attached: {body}")
-
-        # Attach PDF file
-        with open(pdf_summary_path, 'rb') as attachment:
-            part = MIMEBase('application', 'octet-stream')
-            part.set_payload(attachment.read())
-        
-        encoders.encode_base64(part)
-        filename = os.path.basename(pdf_summary_path)
-        encoded_filename = Header(filename).encode()
-        part.add_header(
-            'Content-Disposition',
-            f'attachment; filename*=UTF-8\'\'{encoded_filename}'
+        temp_file_path, temp_output_path, process_output_path = process_file(
+            file, temp_dir, batch_directory, unique_file_id, selected_script, selected_model, custom_template, report, on_ocr_complete, checkpoint_key, deadline
         )
-        msg.attach(part)
-        logging.info(f"PDF attached: {filename}")
-        logging.info(f"Encoded filename: {encoded_filename}")
-
-        with smtplib.SMTP('smtp.gmail.com', 587) as server:
-            server.set_debuglevel(1)  # Add this line to enable SMTP debug output
-            logging.info("Connecting to SMTP server...")
-            server.starttls()
-            logging.info("STARTTLS initiated")
-            server.login(sender_email, sender_password)
-            logging.info("Logged in to SMTP server")
-            server.send_message(msg)
-            logging.info("Message sent successfully")
-
     except Exception as e:
-        logging.error(f"Error in send_email function: {str(e)}")
-        logging.exception("Exception traceback:")
-        raise
-
-    logging.info("Email sending process completed")
-
-
+        logging.error(f"Pipeline failed for {file.filename}: {str(e)}")
+        return None
+    if not (temp_file_path and temp_output_path and process_output_path) or not os.path.exists(process_output_path):
+        return None
+
+    # Returned by value so requests attached to this run can copy the outputs
+    # into their own temp directories after this one is cleaned up.
+    return {'ocr': artifact_set['ocr'].read_bytes(), 'processed': artifact_set['processed'].read_bytes()}
+
+def run_pipeline_in_memory(file, artifact_set, temp_dir, batch_directory, unique_file_id, selected_script, selected_model, custom_template, report=None, on_ocr_complete=None, checkpoint_key=None, deadline=deadlines.NO_DEADLINE):
+    report = report or (lambda filename, stage, detail=None: None)
+    ocr_results = json.loads(artifact_set['ocr'].read_bytes()) if artifact_set['ocr'].exists() else None
+
+    def ocr_done(results):
+        artifact_set['ocr'].write_bytes(json.dumps(results, indent=4).encode('utf-8'))
+        if on_ocr_complete:
+            on_ocr_complete()
+        report(file.filename, 'summarizing')
+
+    if ocr_results is None:
+        report(file.filename, 'ocr')
+    else:
+        logging.info(f"Using cached OCR output for {file.filename}")
+        ocr_done(ocr_results)
 
-
-def store_in_firestore(unique_id, file, pdf_file_url, json_file_url, processed_file_url, pdf_summary_url, processed_data):
-    logging.info(f"Adding entry to Firestore for file: {file.filename}")
-    firestore_client.collection('uploads').add({
-        'id': unique_id,
-        'filename': file.filename,
-        'pdfFileUrl': pdf_file_url,
-        'jsonFileUrl': json_file_url,
-        'processedFileUrl': processed_file_url,
-        'pdfSummaryUrl': pdf_summary_url,  # Add this line
-        'processedData': processed_data,
-        'uploadedAt': firestore.SERVER_TIMESTAMP
-    })
-
-def handle_file(file, selected_script, selected_model, custom_template, send_email_flag, user_email, unique_id):
-    with tempfile.TemporaryDirectory() as temp_dir:
+    try:
+        _, output_data = pipeline_workers.process_in_memory(
+            file.filename, artifact_set['source'].read_bytes(), artifact_set['ocr'].name,
+            selected_script, selected_model, custom_template, ocr_results, ocr_done, checkpoint_key, deadline,
+            event_progress(report, file.filename)
+        )
+    except pipeline_workers.InMemoryUnavailable as e:
+        logging.warning(f"In-memory pipeline unavailable for {file.filename}, falling back to disk: {str(e)}")
+        return run_pipeline(
+            file, artifact_set, temp_dir, batch_directory, unique_file_id, selected_script, selected_model, custom_template, report, on_ocr_complete, checkpoint_key, deadline
+        )
+    except Exception as e:
+        # OCR and the LLM already ran (or failed) once; don't pay for them again
+        logging.error(f"In-memory pipeline failed for {file.filename}: {str(e)}")
+        return None
+
+    artifact_set['processed'].write_bytes(json.dumps(output_data, indent=4).encode('utf-8'))
+    return {'ocr': artifact_set['ocr'].read_bytes(), 'processed': artifact_set['processed'].read_bytes()}
+
+def artifact_blob_paths(file, unique_file_id):
+    return {
+        'pdf': f'uploads/{unique_file_id}_{file.filename}.pdf',
+        'ocr': f'ocr_output/{unique_file_id}_{file.filename}.json',
+        'processed': f'processed_output/{unique_file_id}_{file.filename}.json',
+        'summary': f'pdf_summaries/{unique_file_id}_summary.pdf',
+        'processed_data': f'processed_data/{unique_file_id}_{file.filename}.json.gz',
+    }
+
+def upload_artifact(blob_path, artifact):
+    blob = get_bucket().blob(blob_path)
+    logging.info(f"Uploading {artifact.name} to: {blob.name}")
+    artifact.upload(blob)
+    return blob.generate_signed_url(expiration=timedelta(days=1))
+
+def handle_file(file, selected_script, selected_model, custom_template, send_email_flag, user_email, unique_id, progress=None, job_id=None, deadline=deadlines.NO_DEADLINE):
+    report = progress or (lambda filename, stage, detail=None: None)
+    in_memory = artifacts.in_memory_enabled()
+
+    # Wait for room in the temp storage budget before taking any of it
+    reservation = storage_budget.estimate_bytes(estimator.estimate_pages(file))
+    with temp_storage.acquire(reservation, deadline.timeout()) as lease, tempfile.TemporaryDirectory() as temp_dir:
         logging.info(f"Created temporary directory: {temp_dir}")
 
         batch_directory = os.path.join(temp_dir, f'batch_{unique_id}')
         os.makedirs(batch_directory, exist_ok=True)
         logging.info(f"Created batch directory: {batch_directory}")
 
-        temp_file_path, temp_output_path, process_output_path = process_file(
-            file, temp_dir, batch_directory, unique_id, selected_script, selected_model, custom_template
+        artifact_set = file_artifacts(file, temp_dir, batch_directory, unique_id, in_memory)
+        blob_paths = artifact_blob_paths(file, unique_id)
+        if in_memory:
+            artifact_set['source'].write_bytes(artifacts.read_upload(file))
+        else:
+            file.save(artifact_set['source'].path)
+        lease.track(artifact_set['source'])
+
+        content_hash = artifact_set['source'].sha256()
+        ocr_key = result_cache.ocr_key(content_hash)
+        result_key = result_cache.result_key(content_hash, selected_script, selected_model, custom_template)
+
+        # Each artifact is rendered/uploaded as soon as the file it needs exists:
+        # the original PDF right away, the OCR JSON once OCR finishes (while the
+        # LLM stage is still running), and the rest once processing is done.
+        graph = StageGraph(artifact_executor)
+        graph.event('ocr')
+        graph.event('processed')
+        if getattr(file, 'blob', None) is not None:
+            # Already in the bucket; no need to upload it again
+            graph.add('upload_pdf', file.signed_url)
+        else:
+            graph.add('upload_pdf', lambda: upload_artifact(blob_paths['pdf'], artifact_set['source']))
+        graph.add('upload_ocr', lambda _: upload_artifact(blob_paths['ocr'], artifact_set['ocr']), ['ocr'])
+
+        cached = ocr_cached = shared = False
+        if result_cache_store:
+            cached = result_cache_store.fetch(result_key, [
+                ('processed.json', artifact_set['processed']), ('summary.pdf', artifact_set['summary'])
+            ]) and result_cache_store.fetch(ocr_key, [('ocr.json', artifact_set['ocr'])])
+            if cached:
+                logging.info(f"Result cache hit for {file.filename} ({content_hash})")
+            else:
+                ocr_cached = result_cache_store.fetch(ocr_key, [('ocr.json', artifact_set['ocr'])])
+
+        # Resume a retried file from whatever stages finished last time
+        checkpoint = checkpoints.open_checkpoint(checkpoints.file_checkpoint_key(job_id, content_hash, result_key))
+        ocr_checkpoint = None
+        if not cached and not ocr_cached:
+            ocr_checkpoint = checkpoint.load('ocr')
+            if ocr_checkpoint is not None:
+                artifact_set['ocr'].write_bytes(json.dumps(ocr_checkpoint, indent=4).encode('utf-8'))
+
+        def ocr_complete():
+            if checkpoint.enabled and not ocr_cached and ocr_checkpoint is None:
+                ocr_results = json.loads(artifact_set['ocr'].read_bytes())
+                if not ocr_results.get('partial'):
+                    checkpoint.save('ocr', ocr_results)
+            graph.complete('ocr')
+
+        if not cached:
+            # Streaming hands OCR pages to the summarizers in-process, so it needs the in-memory pipeline
+            pipeline = run_pipeline_in_memory if in_memory or pipeline_workers.streaming_enabled() else run_pipeline
+            outputs, shared = inflight_pipelines.do(result_key, lambda: pipeline(
+                file, artifact_set, temp_dir, batch_directory, unique_id, selected_script, selected_model, custom_template, report,
+                on_ocr_complete=ocr_complete, checkpoint_key=checkpoint.key, deadline=deadline
+            ))
+            if outputs is None:
+                logging.error(f"Error processing file: {file.filename}")
+                graph.fail('ocr', RuntimeError(f"Processing failed for {file.filename}"))
+                graph.fail('processed', RuntimeError(f"Processing failed for {file.filename}"))
+                graph.wait()
+                # Drop artifacts that were uploaded early for a file that ended up failing
+                for stage, artifact in (('upload_pdf', 'pdf'), ('upload_ocr', 'ocr')):
+                    if stage == 'upload_pdf' and getattr(file, 'blob', None) is not None:
+                        continue
+                    if graph.futures[stage].exception() is None:
+                        try:
+                            get_bucket().blob(blob_paths[artifact]).delete()
+                        except Exception as e:
+                            logging.warning(f"Could not delete {blob_paths[artifact]}: {str(e)}")
+                # The pipeline gave up on this file; nothing will resume from its stages
+                checkpoint.clear()
+                report(file.filename, 'failed')
+                return None
+            if shared:
+                logging.info(f"Reusing in-flight pipeline result for {file.filename} ({content_hash})")
+                artifact_set['ocr'].write_bytes(outputs['ocr'])
+                artifact_set['processed'].write_bytes(outputs['processed'])
+
+        graph.complete('ocr')
+        graph.complete('processed')
+        for name in ('ocr', 'processed', 'summary'):
+            lease.track(artifact_set[name])
+
+        # Cut short by the deadline: keep the output, but flag it and keep it
+        # out of the cache so a later request with more time does the full run
+        partial = bool(json.loads(artifact_set['ocr'].read_bytes()).get('partial')) or any(
+            item.get('partial') for item in json.loads(artifact_set['processed'].read_bytes())
         )
-
-        if temp_file_path and temp_output_path and process_output_path:
-            pdf_summary_path = os.path.join(temp_dir, f'{unique_id}_summary.pdf')
-            create_pdf(process_output_path, pdf_summary_path)
-
-            pdf_file_url, json_file_url, processed_file_url, pdf_summary_url = upload_files(
-                file, unique_id, temp_file_path, temp_output_path, process_output_path, pdf_summary_path
-            )
-
-            with open(process_output_path, 'r') as f:
-                processed_data = f.read()
-            processed_results = json.loads(processed_data)
-            logging.info(f'Processed Results: {processed_results}')
-
-            store_in_firestore(unique_id, file, pdf_file_url, json_file_url, processed_file_url, pdf_summary_url, processed_data)
-
-            if send_email_flag == 'true' and user_email:
-                try:
-                    send_email(user_email,pdf_summary_path)
-                    logging.info(f"Email sent to {user_email} with PDF attachment")
-                except Exception as e:
-                    logging.error(f"Error sending email: {str(e)}")
-
-            return {
+        if partial:
+            logging.warning(f"Partial result for {file.filename}")
+
+        def render_summary(_):
+            if not cached:
+                report(file.filename, 'rendering')
+                from create_pdf_and_email import render_pdf
+
+                processed_results = json.loads(artifact_set['processed'].read_bytes())
+                with governor.slot('cpu'):
+                    artifact_set['summary'].write_bytes(render_pdf(processed_results))
+                lease.track(artifact_set['summary'])
+
+        def store_cache_entries(_):
+            if not ocr_cached:
+                result_cache_store.store(ocr_key, [('ocr.json', artifact_set['ocr'])])
+            result_cache_store.store(result_key, [
+                ('processed.json', artifact_set['processed']), ('summary.pdf', artifact_set['summary'])
+            ])
+
+        def store_record(pdf_file_url, json_file_url, processed_file_url, pdf_summary_url):
+            # The Firestore write itself happens once per request in process_uploads
+            processed_data = artifact_set['processed'].read_bytes().decode('utf-8')
+
+            report(file.filename, 'storing')
+            return dict({
                 'filename': file.filename,
                 'pdfFileUrl': pdf_file_url,
                 'jsonFileUrl': json_file_url,
                 'processedFileUrl': processed_file_url,
-                'processedData': processed_data,
                 'pdfSummaryUrl': pdf_summary_url
-            }
+            }, **records.processed_fields(get_bucket(), blob_paths['processed_data'], processed_data))
+
+        def email_summary(_):
+            # Delivered with the rest of the request's summaries once it finishes
+            report(file.filename, 'emailing')
+            try:
+                summary_filename = f"{os.path.splitext(file.filename)[0]}_summary.pdf"
+                email_outbox.add(unique_id, user_email, summary_filename, artifact_set['summary'].read_bytes())
+            except Exception as e:
+                logging.error(f"Error queueing email: {str(e)}")
+
+        graph.add('upload_processed', lambda _: upload_artifact(blob_paths['processed'], artifact_set['processed']), ['processed'])
+        graph.add('create_pdf', render_summary, ['processed'])
+        graph.add('upload_summary', lambda _: upload_artifact(blob_paths['summary'], artifact_set['summary']), ['create_pdf'])
+        graph.add('store', store_record, ['upload_pdf', 'upload_ocr', 'upload_processed', 'upload_summary'])
+        if result_cache_store and not cached and not shared and not partial:
+            graph.add('cache', store_cache_entries, ['create_pdf'])
+        if send_email_flag == 'true' and user_email:
+            graph.add('email', email_summary, ['create_pdf'])
+
+        # Hand each artifact's bytes back as soon as everything that reads it
+        # is done, instead of when the temp directory goes away
+        readers = {
+            'source': ['upload_pdf', 'processed'],
+            'ocr': ['upload_ocr', 'processed', 'cache'],
+            'processed': ['store', 'cache'],
+            'summary': ['upload_summary', 'cache', 'email'],
+        }
+        for name, stages in readers.items():
+            graph.add(f'release_{name}', lambda *_, name=name: lease.discard(artifact_set[name]), [stage for stage in stages if stage in graph.futures])
+
+        # Keep the temp directory alive until every stage has finished with it
+        timings = graph.wait()
+        result = graph.result('store')
+        if partial:
+            # Keep the finished stages so a retry with more time resumes from them
+            result['partial'] = True
         else:
-            logging.error(f"Error processing file: {file.filename}")
-            return None
+            # Everything is stored; a retry would now be served from the record
+            checkpoint.clear()
+
+        tail_seconds = round(timings['store']['end'] - timings['processed']['end'], 3)
+        logging.info(f"Stage timings for {file.filename}: {timings} (tail after processing: {tail_seconds}s)")
+
+        report(file.filename, 'complete')
+        result['stageTimings'] = timings
+        return result
+
+def process_uploads(files, params, unique_id, progress=None, background=False):
+    uploaded_files = []
+    deadline = deadlines.from_request_params(params, background)
+
+    # Files wait in their user's queue so one large upload cannot starve
+    # everyone else's work on this instance
+    user = params.get('client_id') or params['user_email']
+
+    pending = set()
+    try:
+        pending = {
+            file_scheduler.submit(
+                user, handle_file, file, params['script'], params['model'], params['custom_template'],
+                params['send_email'], params['user_email'], unique_id, progress, params.get('job_id'), deadline
+            )
+            for file in scheduler.order_files(files)
+        }
+        # Store results as they finish rather than after the slowest file;
+        # files that finish together still share one batched write
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            finished = [result for result in (future.result() for future in done) if result]
+            if finished:
+                records.commit_records(get_firestore_client(), [records.record_from_result(unique_id, result) for result in finished])
+                # The entries themselves are served by the results endpoint
+                uploaded_files.extend(results.manifest_entry(result) for result in finished)
+    finally:
+        # One email per request with every summary that made it; when a file
+        # failed, the others are still running and may yet add theirs
+        wait(pending)
+        email_outbox.seal(unique_id)
+
+    logging.info(f"Uploaded files: {uploaded_files}")
+    return uploaded_files
+
+def parse_scripts_param(request, source):
+    # `script` may repeat, be comma-separated, or (in JSON) be a list
+    if request.form:
+        values = request.form.getlist('script')
+    else:
+        values = source.get('script') or []
+        values = [values] if isinstance(values, str) else values
+
+    scripts = []
+    for value in values:
+        for script in pipeline_workers.parse_scripts(value):
+            if script not in scripts:
+                scripts.append(script)
+    return ','.join(scripts) or None
+
+def parse_upload_params(request):
+    source = request.form if request.form else (request.get_json(silent=True) or {})
+    return {
+        'script': parse_scripts_param(request, source),
+        'model': source.get('model'),
+        'custom_template': source.get('custom_template'),
+        'send_email': source.get('send_email'),
+        'user_email': source.get('user_email'),
+        'client_id': source.get('client_id'),
+        'job_id': source.get('job_id'),
+        'deadline_seconds': source.get('deadline_seconds'),
+    }
+
+def parse_upload_files(request):
+    # Multipart uploads plus any gs:// (or stand-in local) object references
+    return request.files.getlist('files') + ingest.parse_object_uploads(request, get_bucket)
+
+def estimate_uploads(request, files, headers):
+    # Quote pages, LLM calls, tokens, cost and time before submitting. Files
+    # are counted from their PDF headers; `pages` quotes a document that has
+    # not been uploaded yet.
+    params = parse_upload_params(request)
+    if not pipeline_workers.supports_scripts(params['script']):
+        return jsonify({"error": f"Unsupported process script: {params['script']}"}), 400, headers
+
+    page_counts = [(file.filename, estimator.estimate_pages(file)) for file in files]
+    source = request.form if request.form else (request.get_json(silent=True) or {})
+    if source.get('pages'):
+        try:
+            page_counts.append((None, max(int(source.get('pages')), 1)))
+        except ValueError:
+            return jsonify({"error": f"Invalid pages: {source.get('pages')}"}), 400, headers
+    if not page_counts:
+        return jsonify({"error": "No files uploaded"}), 400, headers
+
+    return jsonify(estimator.estimate(page_counts, pipeline_workers.parse_scripts(params['script']))), 200, headers
 
 @functions_framework.http
 def uploadEmail(request):
@@ -230,30 +470,60 @@ def uploadEmail(request):
         return '', 204, headers
 
     headers = {'Access-Control-Allow-Origin': '*'}
-    if 'files' not in request.files:
+    if request.method == 'GET' and request.path.rstrip('/').endswith('/metrics'):
+        return jsonify({
+            "governor": governor.metrics(),
+            "admission": admission_controller.metrics() if admission_controller else None,
+            "events": events.counters.metrics(),
+            "scheduler": file_scheduler.metrics(),
+            "storage": temp_storage.metrics(),
+        }), 200, headers
+
+    if request.method == 'GET' and request.path.rstrip('/').endswith('/warmup'):
+        status = warmup.warmer.run()
+        return jsonify(status), 200 if status['ready'] else 503, headers
+
+    if request.method == 'GET' and request.path.rstrip('/').endswith('/ready'):
+        warmup.warmer.start()
+        status = warmup.warmer.status()
+        return jsonify(status), 200 if status['ready'] else 503, headers
+
+    if results.parse_results_path(request.path) is not None:
+        return results.handle_results_request(request, headers, get_firestore_client, get_bucket)
+
+    try:
+        files = parse_upload_files(request)
+    except ValueError as e:
+        logging.error(f"Invalid object reference: {str(e)}")
+        return jsonify({"error": str(e)}), 400, headers
+
+    if request.path.rstrip('/').endswith('/estimate'):
+        return estimate_uploads(request, files, headers)
+
+    if jobs.parse_job_path(request.path) is not None:
+        return jobs.handle_job_request(
+            request, headers, job_store, job_queue, parse_upload_params(request), files, process_uploads,
+            admission_controller=admission_controller
+        )
+
+    if not files:
         logging.error("No files uploaded")
         return jsonify({"error": "No files uploaded"}), 400, headers
 
-    files = request.files.getlist('files')
-    selected_script = request.form.get('script')
-    selected_model = request.form.get('model')
-    custom_template = request.form.get('custom_template')
-    send_email_flag = request.form.get('send_email')
-    user_email = request.form.get('user_email')
+    params = parse_upload_params(request)
 
-    if not files or not selected_script or not selected_model or not custom_template:
-        logging.error(f"Missing parameters. Files: {files}, Script: {selected_script}, Model: {selected_model}, Custom Template: {custom_template}")
+    if not files or not params['script'] or not params['model'] or not params['custom_template']:
+        logging.error(f"Missing parameters. Files: {files}, Script: {params['script']}, Model: {params['model']}, Custom Template: {params['custom_template']}")
         return jsonify({"error": "Missing parameters"}), 400, headers
 
-    uploaded_files = []
-    unique_id = str(uuid4())
+    ticket, rejected = admission.admit(admission_controller, files, headers)
+    if rejected:
+        return rejected
 
-    with ThreadPoolExecutor() as executor:
-        futures = [executor.submit(handle_file, file, selected_script, selected_model, custom_template, send_email_flag, user_email, unique_id) for file in files]
-        for future in as_completed(futures):
-            result = future.result()
-            if result:
-                uploaded_files.append(result)
+    unique_id = str(uuid4())
+    try:
+        uploaded_files = process_uploads(files, params, unique_id)
+    finally:
+        admission.release(admission_controller, ticket)
 
-    logging.info(f"Uploaded files: {uploaded_files}")
-    return jsonify({"uniqueId": unique_id, "results": uploaded_files}), 200, headers
\ No newline at end of file
+    return jsonify({"uniqueId": unique_id, "results": uploaded_files}), 200, headers
@@ -8,12 +8,18 @@ from io import BytesIO
 import time
 import logging
 import sys
-import easyocr
+import threading
 import numpy as np
-import cv2
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from governor import governor
+import deadline as deadlines
+import events
+import standin
+from page_stream import page_order
 
 def getcreds():
+    if standin.enabled('ocr'):
+        return 'https://standin/', 'standin'
     user = os.getenv('CREDS_USER')
     password = os.getenv('CREDS_PASSWORD')
     
@@ -24,8 +30,23 @@ def getcreds():
 
 class DocClient:
     def __init__(self, endpoint, key):
-        self.client = ComputerVisionClient(endpoint, CognitiveServicesCredentials(key))
-        self.easyocr_reader = easyocr.Reader(['en'], gpu=False, detect_network='craft', recog_network='english_g2')
+        if standin.enabled('ocr'):
+            self.client = standin.FakeReadClient()
+        else:
+            self.client = ComputerVisionClient(endpoint, CognitiveServicesCredentials(key))
+        self._easyocr_reader = None
+        self._easyocr_lock = threading.Lock()
+
+    @property
+    def easyocr_reader(self):
+        # easyocr pulls in torch and loads its models; only pay for that when
+        # Azure actually fails and the fallback is needed
+        with self._easyocr_lock:
+            if self._easyocr_reader is None:
+                import easyocr
+
+                self._easyocr_reader = easyocr.Reader(['en'], gpu=False, detect_network='craft', recog_network='english_g2')
+        return self._easyocr_reader
 
     def close(self):
         self.client.close()
@@ -42,6 +63,8 @@ class DocClient:
         return contents
 
     def advanced_preprocess_image(self, img):
+        import cv2
+
         if len(img.shape) == 3:
             gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         else:
@@ -68,58 +91,78 @@ class DocClient:
 
     def process_page(self, page, page_num):
         try:
-            pix = page.get_pixmap(dpi=300)
-            img_byte_arr = BytesIO(pix.tobytes(output="png"))
+            with governor.slot('cpu'):
+                pix = page.get_pixmap(dpi=300)
+                img_byte_arr = BytesIO(pix.tobytes(output="png"))
             
             # Try Azure OCR first
             try:
-                ocr_result = self.client.read_in_stream(img_byte_arr, raw=True)
-                operation_id = ocr_result.headers["Operation-Location"].split("/")[-1]
-                while True:
-                    result = self.client.get_read_result(operation_id)
-                    if result.status.lower() not in ["notstarted", "running"]:
-                        break
-                    time.sleep(1)
+                with governor.slot('ocr'):
+                    ocr_result = self.client.read_in_stream(img_byte_arr, raw=True)
+                    operation_id = ocr_result.headers["Operation-Location"].split("/")[-1]
+                    while True:
+                        result = self.client.get_read_result(operation_id)
+                        if result.status.lower() not in ["notstarted", "running"]:
+                            break
+                        time.sleep(1)
                 if result.status.lower() == "failed":
                     raise azure.core.exceptions.HttpResponseError("Azure OCR failed")
                 page_results = self.extract_content_azure(result)
             except azure.core.exceptions.HttpResponseError as e:
                 logging.warning(f"Azure OCR failed for page {page_num}, falling back to EasyOCR: {str(e)}")
                 # Fallback to EasyOCR
-                img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
-                processed_img = self.advanced_preprocess_image(img)
-                page_content = self.process_with_easyocr(processed_img)
+                with governor.slot('cpu'):
+                    img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+                    processed_img = self.advanced_preprocess_image(img)
+                    page_content = self.process_with_easyocr(processed_img)
                 page_results = {f"page_{page_num}": page_content}
             
             return page_results
         except Exception as e:
             logging.error(f"Error processing page {page_num}: {str(e)}")
+            events.emit(events.ERROR, stage='ocr', page=page_num, message=str(e))
             return {f"page_{page_num}": ""}
 
-    def pdf2df(self, pdf_path):
-        doc = fitz.open(pdf_path)
-        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
-            future_to_page = {executor.submit(self.process_page, page, i+1): i+1 for i, page in enumerate(doc)}
+    def pdf2df(self, pdf_path, stream=None, deadline=deadlines.NO_DEADLINE, page_stream=None):
+        doc = fitz.open(stream=stream, filetype="pdf") if stream is not None else fitz.open(pdf_path)
+        # When streaming, read the pages the summarizer needs first first
+        order = page_order(len(doc)) if page_stream is not None else range(len(doc))
+        if page_stream is not None:
+            page_stream.start(len(doc))
+        with ThreadPoolExecutor(max_workers=governor.pool_size('ocr')) as executor:
+            future_to_page = {executor.submit(events.bind(deadline.call), self.process_page, doc[i], i+1): i+1 for i in order}
             all_pages_content = []
             for future in as_completed(future_to_page):
                 page_num = future_to_page[future]
                 try:
                     page_results = future.result()
-                    all_pages_content.append(page_results)
+                    if page_results is None:
+                        # Skipped: out of time
+                        page_results = {f"page_{page_num}": ""}
                 except Exception as e:
                     logging.error(f"Error processing page {page_num} of file {pdf_path}: {str(e)}")
+                    events.emit(events.ERROR, stage='ocr', page=page_num, message=str(e))
+                    page_results = {f"page_{page_num}": ""}
+                all_pages_content.append((page_num, page_results))
+                events.emit(events.PAGES_DONE, stage='ocr', pages=1, page=page_num)
+                if page_stream is not None:
+                    page_stream.put(page_num, "\n".join(page_results.values()))
         
-        all_pages_content.sort(key=lambda x: int(list(x.keys())[0].split('_')[1]))
-        return all_pages_content
+        # Sort on our own page number; Azure numbers every single-page image as page 1
+        all_pages_content.sort(key=lambda x: x[0])
+        return [page_results for _, page_results in all_pages_content]
 
-    def image2df(self, image_path):
+    def image2df(self, image_path, stream=None):
         all_pages_content = []
         try:
-            with open(image_path, "rb") as img_file:
-                img_byte_arr = img_file.read()
-                
-                # Try Azure OCR first
-                try:
+            if stream is None:
+                with open(image_path, "rb") as img_file:
+                    stream = img_file.read()
+            img_byte_arr = stream
+
+            # Try Azure OCR first
+            try:
+                with governor.slot('ocr'):
                     ocr_result = self.client.read_in_stream(BytesIO(img_byte_arr), raw=True)
                     operation_id = ocr_result.headers["Operation-Location"].split("/")[-1]
                     while True:
@@ -127,27 +170,34 @@ class DocClient:
                         if result.status.lower() not in ["notstarted", "running"]:
                             break
                         time.sleep(1)
-                    if result.status.lower() == "failed":
-                        raise azure.core.exceptions.HttpResponseError("Azure OCR failed")
-                    page_results = self.extract_content_azure(result)
-                except azure.core.exceptions.HttpResponseError as e:
-                    logging.warning(f"Azure OCR failed for image, falling back to EasyOCR: {str(e)}")
-                    # Fallback to EasyOCR
+                if result.status.lower() == "failed":
+                    raise azure.core.exceptions.HttpResponseError("Azure OCR failed")
+                page_results = self.extract_content_azure(result)
+            except azure.core.exceptions.HttpResponseError as e:
+                logging.warning(f"Azure OCR failed for image, falling back to EasyOCR: {str(e)}")
+                # Fallback to EasyOCR
+                with governor.slot('cpu'):
+                    import cv2
+
                     img = cv2.imdecode(np.frombuffer(img_byte_arr, np.uint8), cv2.IMREAD_COLOR)
                     processed_img = self.advanced_preprocess_image(img)
                     page_content = self.process_with_easyocr(processed_img)
-                    page_results = {"page_1": page_content}
-                
-                all_pages_content.append(page_results)
+                page_results = {"page_1": page_content}
+            
+            all_pages_content.append(page_results)
         except Exception as e:
             logging.error(f"Error processing image file {image_path}: {str(e)}")
         return all_pages_content
 
-    def process(self, file_path):
+    def process(self, file_path, stream=None, deadline=deadlines.NO_DEADLINE, page_stream=None):
         if file_path.lower().endswith('.pdf'):
-            return self.pdf2df(file_path)
+            return self.pdf2df(file_path, stream, deadline, page_stream)
         elif file_path.lower().endswith(('.jpeg', '.jpg', '.png')):
-            return self.image2df(file_path)
+            results = self.image2df(file_path, stream)
+            if page_stream is not None:
+                page_stream.start(1)
+                page_stream.put(1, "\n".join(content for page in results for content in page.values()))
+            return results
         else:
             raise ValueError(f"Unsupported file format: {file_path}")
 
@@ -167,6 +217,43 @@ def update_page_numbers(data):
         message["page_number"] = i
     return data
 
+def mark_partial(data, deadline):
+    if deadline.partial:
+        logging.warning(f"OCR ran out of time; {deadline.skipped} page(s) left blank")
+        data["partial"] = True
+    return data
+
+def process_bytes(client, filename, data, deadline=None):
+    deadline = (deadline or deadlines.NO_DEADLINE).scope()
+    with events.stage('ocr'):
+        results = client.process(filename, stream=data, deadline=deadline)
+    formatted_results = reformat_json_structure(results)
+    return mark_partial(update_page_numbers(formatted_results), deadline)
+
+def stream_bytes(client, filename, data, page_stream, deadline=None):
+    # process_bytes, but each page is also put on page_stream as it is read
+    try:
+        deadline = (deadline or deadlines.NO_DEADLINE).scope()
+        with events.stage('ocr'):
+            results = client.process(filename, stream=data, deadline=deadline, page_stream=page_stream)
+        formatted_results = reformat_json_structure(results)
+        return mark_partial(update_page_numbers(formatted_results), deadline)
+    except Exception as e:
+        page_stream.fail(e)
+        raise
+
+def run(client, file_path, output_path, deadline=None):
+    deadline = (deadline or deadlines.NO_DEADLINE).scope()
+    with events.stage('ocr'):
+        results = client.process(file_path, deadline=deadline)
+    formatted_results = reformat_json_structure(results)
+    updated_results = mark_partial(update_page_numbers(formatted_results), deadline)
+
+    with open(output_path, "w") as output_file:
+        json.dump(updated_results, output_file, indent=4)
+
+    return updated_results
+
 if __name__ == "__main__":
     logger = logging.getLogger()
     azurelogger = logging.getLogger("azure")
@@ -187,11 +274,6 @@ if __name__ == "__main__":
     endpoint, key = getcreds()
     client = DocClient(endpoint, key)
 
-    results = client.process(file_path)
-    formatted_results = reformat_json_structure(results)
-    updated_results = update_page_numbers(formatted_results)
-
-    with open(output_path, "w") as output_file:
-        json.dump(updated_results, output_file, indent=4)
+    run(client, file_path, output_path, deadlines.from_env())
 
     client.close()
\ No newline at end of file
@@ -0,0 +1,309 @@
+import os
+import json
+import time
+import shutil
+import logging
+import smtplib
+import threading
+from uuid import uuid4
+from email import encoders
+from email.header import Header
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formataddr
+import standin
+import storage_budget
+
+# Background email outbox. Summary PDFs are spooled under a digest id (the
+# request's uniqueId) while the request runs; when the request finishes the
+# digest is sealed and a sender thread delivers all of its attachments as one
+# email over a long-lived SMTP session. The HTTP response no longer waits for
+# TLS, login or delivery, and a 10-file request sends one email.
+#
+# Layout: <digest>/manifest.json plus one <uuid>.bin per attachment, in the
+# app bucket under OUTBOX_PREFIX (or OUTBOX_DIR with OUTBOX_BACKEND=local).
+# The manifest's state goes pending -> ready when sealed, and the digest is
+# deleted once sent, or logged and deleted after OUTBOX_MAX_ATTEMPTS failed
+# sends so undeliverable mail does not pile up in the bucket. The bucket
+# outlives the instance, which may be recycled (or have its CPU throttled
+# after the response) before the sender gets to a digest: an instance sends
+# what it sealed itself, and also claims ready digests that nobody has
+# touched for OUTBOX_STALE_SECONDS.
+# SMTP_HOST/SMTP_PORT/SMTP_STARTTLS point the sender at another server, e.g.
+# `python -m aiosmtpd -n -l localhost:8025` with SMTP_STARTTLS=false.
+
+MANIFEST = 'manifest.json'
+
+
+def smtp_settings():
+    if standin.enabled('smtp'):
+        return standin.smtp_settings()
+    return {
+        'host': os.getenv('SMTP_HOST', 'smtp.gmail.com'),
+        'port': int(os.getenv('SMTP_PORT', '587')),
+        'starttls': os.getenv('SMTP_STARTTLS', 'true').lower() == 'true',
+        'user': os.getenv('SMTP_USER') or os.getenv('SENDER_EMAIL'),
+        'password': os.getenv('SMTP_PASSWORD') or os.getenv('SENDER_PASSWORD'),
+        'debug': os.getenv('SMTP_DEBUG', 'false').lower() == 'true',
+    }
+
+
+class SmtpSession:
+    # One connection, opened on first use and kept for later messages. The
+    # server may drop an idle connection, so it is checked with NOOP before
+    # reuse and reopened when that fails.
+    def __init__(self, settings):
+        self.settings = settings
+        self.server = None
+
+    def _connect(self):
+        settings = self.settings
+        logging.info(f"Connecting to SMTP server {settings['host']}:{settings['port']}")
+        server = smtplib.SMTP(settings['host'], settings['port'], timeout=30)
+        if settings['debug']:
+            server.set_debuglevel(1)
+        if settings['starttls']:
+            server.starttls()
+        if settings['user'] and settings['password']:
+            server.login(settings['user'], settings['password'])
+        self.server = server
+
+    def send(self, msg):
+        if self.server is not None:
+            try:
+                self.server.noop()
+            except smtplib.SMTPException:
+                self.close()
+        if self.server is None:
+            self._connect()
+        try:
+            self.server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # Dropped between NOOP and send; one retry on a fresh connection
+            self.close()
+            self._connect()
+            self.server.send_message(msg)
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except smtplib.SMTPException:
+                pass
+            except OSError:
+                pass
+            self.server = None
+
+
+def build_message(sender_email, recipient_email, attachments):
+    msg = MIMEMultipart()
+    msg['From'] = formataddr(("Sender Name", sender_email))
+    msg['To'] = formataddr(("Recipient Name", recipient_email))
+    msg['Subject'] = Header("Your Processed Document Summary", 'utf-8')
+
+    if len(attachments) == 1:
+        body = "Please find your document summary attached to this email."
+    else:
+        body = f"Please find your {len(attachments)} document summaries attached to this email."
+    msg.attach(MIMEText(body, 'plain', 'utf-8'))
+
+    for filename, data in attachments:
+        part = MIMEBase('application', 'octet-stream')
+        part.set_payload(data)
+        encoders.encode_base64(part)
+        encoded_filename = Header(filename).encode()
+        part.add_header(
+            'Content-Disposition',
+            f'attachment; filename*=UTF-8\'\'{encoded_filename}'
+        )
+        msg.attach(part)
+    return msg
+
+
+class LocalOutboxStore:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def get(self, name):
+        try:
+            with open(os.path.join(self.root, name), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, name, data):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.tmp.{threading.get_ident()}'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        replaced = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp_path, path)
+        storage_budget.budget.charge('outbox', len(data) - replaced)
+
+    def delete_prefix(self, prefix):
+        path = os.path.join(self.root, prefix)
+        freed = storage_budget.directory_bytes(path)
+        shutil.rmtree(path, ignore_errors=True)
+        storage_budget.budget.credit('outbox', freed)
+
+    def digest_ids(self):
+        return [name for name in os.listdir(self.root) if os.path.isfile(os.path.join(self.root, name, MANIFEST))]
+
+
+class BucketOutboxStore:
+    def __init__(self, get_bucket, prefix):
+        self.get_bucket = get_bucket
+        self.prefix = prefix.rstrip('/') + '/'
+
+    def get(self, name):
+        blob = self.get_bucket().get_blob(self.prefix + name)
+        return blob.download_as_bytes() if blob is not None else None
+
+    def put(self, name, data):
+        self.get_bucket().blob(self.prefix + name).upload_from_string(data)
+
+    def delete_prefix(self, prefix):
+        for blob in self.get_bucket().list_blobs(prefix=self.prefix + prefix.rstrip('/') + '/'):
+            blob.delete()
+
+    def digest_ids(self):
+        names = (blob.name[len(self.prefix):] for blob in self.get_bucket().list_blobs(prefix=self.prefix))
+        return [name[:-len(MANIFEST) - 1] for name in names if name.endswith('/' + MANIFEST)]
+
+
+class Outbox:
+    def __init__(self, store, session, max_attempts=5, poll_seconds=30, stale_seconds=900):
+        self.store = store
+        self.session = session
+        self.max_attempts = max_attempts
+        self.poll_seconds = poll_seconds
+        self.stale_seconds = stale_seconds
+        self._sealed = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def _read_manifest(self, digest_id):
+        data = self.store.get(f'{digest_id}/{MANIFEST}')
+        return json.loads(data) if data is not None else None
+
+    def _write_manifest(self, digest_id, manifest):
+        self.store.put(f'{digest_id}/{MANIFEST}', json.dumps(manifest).encode('utf-8'))
+
+    def add(self, digest_id, recipient_email, filename, data):
+        stored_name = f'{uuid4().hex}.bin'
+        self.store.put(f'{digest_id}/{stored_name}', data)
+        with self._lock:
+            manifest = self._read_manifest(digest_id) or {
+                'state': 'pending', 'recipient': recipient_email, 'attachments': [], 'attempts': 0, 'createdAt': time.time()
+            }
+            manifest['attachments'].append({'filename': filename, 'path': stored_name})
+            self._write_manifest(digest_id, manifest)
+        logging.info(f"Queued {filename} for {recipient_email} in digest {digest_id}")
+
+    def seal(self, digest_id):
+        # Hand a finished request's digest to the sender
+        with self._lock:
+            manifest = self._read_manifest(digest_id)
+            if manifest is None or manifest.get('state') != 'pending':
+                return False
+            manifest.update(state='ready', sealedAt=time.time())
+            self._write_manifest(digest_id, manifest)
+            self._sealed.add(digest_id)
+        logging.info(f"Sealed email digest {digest_id}")
+        self.start()
+        self._wake.set()
+        return True
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='outbox', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logging.exception(f"Outbox flush failed: {str(e)}")
+            self._wake.wait(self.poll_seconds)
+
+    def _stale(self, manifest):
+        touched = max(manifest.get('sealedAt', 0), manifest.get('claimedAt', 0), manifest.get('lastAttemptAt', 0))
+        return time.time() - touched > self.stale_seconds
+
+    def flush(self):
+        delivered = 0
+        # Failed digests stay ready and are retried on the next poll
+        for digest_id in self.store.digest_ids():
+            manifest = self._read_manifest(digest_id)
+            if manifest is None or manifest.get('state') != 'ready':
+                continue
+            if digest_id not in self._sealed:
+                if not self._stale(manifest):
+                    continue
+                # Left behind by another instance; claim it so others wait
+                logging.info(f"Claiming abandoned email digest {digest_id}")
+                manifest['claimedAt'] = time.time()
+                self._write_manifest(digest_id, manifest)
+                self._sealed.add(digest_id)
+            if self._deliver(digest_id, manifest):
+                delivered += 1
+        return delivered
+
+    def _deliver(self, digest_id, manifest):
+        try:
+            attachments = []
+            for attachment in manifest['attachments']:
+                data = self.store.get(f"{digest_id}/{attachment['path']}")
+                if data is None:
+                    raise FileNotFoundError(f"Missing attachment {attachment['path']}")
+                attachments.append((attachment['filename'], data))
+            msg = build_message(self.session.settings['user'], manifest['recipient'], attachments)
+            self.session.send(msg)
+        except Exception as e:
+            logging.error(f"Could not send email digest {digest_id}: {str(e)}")
+            self.session.close()
+            manifest['attempts'] = manifest.get('attempts', 0) + 1
+            manifest['lastAttemptAt'] = time.time()
+            if manifest['attempts'] >= self.max_attempts:
+                filenames = [attachment['filename'] for attachment in manifest['attachments']]
+                logging.error(
+                    f"Giving up on email digest {digest_id} to {manifest['recipient']} after "
+                    f"{manifest['attempts']} attempts; dropping {filenames}"
+                )
+                self.store.delete_prefix(digest_id)
+                self._sealed.discard(digest_id)
+            else:
+                self._write_manifest(digest_id, manifest)
+            return False
+
+        logging.info(f"Sent email digest {digest_id} to {manifest['recipient']} with {len(attachments)} attachment(s)")
+        self.store.delete_prefix(digest_id)
+        self._sealed.discard(digest_id)
+        return True
+
+
+def create_outbox(get_bucket):
+    backend_name = os.getenv('OUTBOX_BACKEND', 'bucket').lower()
+    if backend_name == 'local':
+        store = LocalOutboxStore(os.getenv('OUTBOX_DIR', '/tmp/outbox'))
+    else:
+        store = BucketOutboxStore(get_bucket, os.getenv('OUTBOX_PREFIX', 'outbox'))
+    logging.info(f"Using {backend_name} email outbox")
+
+    outbox = Outbox(
+        store,
+        SmtpSession(smtp_settings()),
+        max_attempts=int(os.getenv('OUTBOX_MAX_ATTEMPTS', '5')),
+        poll_seconds=float(os.getenv('OUTBOX_POLL_SECONDS', '30')),
+        stale_seconds=float(os.getenv('OUTBOX_STALE_SECONDS', '900')),
+    )
+    # Started on the first seal; the sender also sweeps abandoned digests
+    # from then on, without listing the bucket on every cold start
+    return outbox
@@ -0,0 +1,89 @@
+import threading
+from collections import namedtuple
+
+# Streaming hand-off from OCR to the summarizers. OCR puts each page into a
+# PageStream as soon as it is read; StreamedDocs looks like the list of Docs
+# the process scripts already take, except that indexing blocks until that
+# page has arrived. A summarizer that slices its batches lazily therefore
+# starts each batch as soon as its pages (and neighbour windows) are in,
+# while OCR is still working through the rest of the document.
+
+Doc = namedtuple("Doc", ["page_content", "metadata"])
+
+
+def page_order(num_pages, head=11, tail=11):
+    # OCR order for streaming: the first and last pages first, since the
+    # memory log needs them before any batch can start, then the rest in order
+    priority = list(range(min(head, num_pages))) + list(range(max(num_pages - tail, 0), num_pages))
+    seen = set()
+    ordered = []
+    for i in priority + list(range(num_pages)):
+        if i not in seen:
+            seen.add(i)
+            ordered.append(i)
+    return ordered
+
+
+class PageStream:
+    def __init__(self):
+        self.total = None
+        self.pages = {}
+        self.error = None
+        self._cond = threading.Condition()
+
+    def start(self, total):
+        with self._cond:
+            self.total = total
+            self._cond.notify_all()
+
+    def put(self, page_num, content):
+        # page_num is 1-based, like the OCR output
+        with self._cond:
+            self.pages[page_num] = content
+            self._cond.notify_all()
+
+    def fail(self, error):
+        with self._cond:
+            self.error = error
+            self._cond.notify_all()
+
+    def _wait(self, predicate):
+        with self._cond:
+            while not predicate():
+                if self.error is not None:
+                    raise RuntimeError(f"OCR failed while streaming: {self.error}")
+                self._cond.wait()
+
+    def wait_total(self):
+        self._wait(lambda: self.total is not None)
+        return self.total
+
+    def get(self, page_num):
+        self._wait(lambda: page_num in self.pages)
+        return self.pages[page_num]
+
+
+class StreamedDocs:
+    streaming = True
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def __len__(self):
+        return self.stream.wait_total()
+
+    def _doc(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return Doc(page_content=self.stream.get(index + 1), metadata={"seq_num": index + 1})
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._doc(i) for i in range(*index.indices(len(self)))]
+        return self._doc(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._doc(i)
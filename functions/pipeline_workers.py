@@ -0,0 +1,262 @@
+import os
+import json
+import logging
+import subprocess
+import threading
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+import checkpoints
+import deadline as deadlines
+import events
+import page_stream
+
+# Long-lived pipeline workers. In "warm" mode the OCR client and the process
+# scripts are loaded once per instance and called in-process, so each file no
+# longer pays for interpreter startup, heavy imports, EasyOCR model loading and
+# LLM client construction. The subprocess path is kept as a fallback.
+
+PROCESS_SCRIPTS = ['process-detailed.py', 'process-brief.py', 'process-comprehensive.py', 'timelines.py']
+
+# Scripts whose run()/process_document() accept a stage checkpoint
+CHECKPOINTED_SCRIPTS = ['process-detailed.py', 'process-brief.py']
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_modules = {}
+_modules_lock = threading.Lock()
+_doc_client = None
+_doc_client_lock = threading.Lock()
+
+
+def parse_scripts(selected_script):
+    # "process-brief.py,timelines.py" -> ['process-brief.py', 'timelines.py']
+    return [script.strip() for script in (selected_script or '').split(',') if script.strip()]
+
+
+def supports_scripts(selected_script):
+    scripts = parse_scripts(selected_script)
+    return bool(scripts) and all(script in PROCESS_SCRIPTS for script in scripts)
+
+
+def tag_output(selected_script, output_data):
+    # Mark which script produced each item so a merged PDF can label sections
+    for item in output_data:
+        item['script'] = selected_script
+    return output_data
+
+
+def pipeline_mode():
+    return os.getenv('PIPELINE_MODE', 'warm').lower()
+
+
+def streaming_enabled():
+    # Start summarizing while OCR is still reading later pages (warm mode only)
+    return os.getenv('PIPELINE_STREAMING', 'false').lower() == 'true' and pipeline_mode() == 'warm'
+
+
+def load_script(script_name):
+    with _modules_lock:
+        module = _modules.get(script_name)
+        if module is None:
+            module_name = os.path.splitext(script_name)[0].replace('-', '_')
+            script_path = os.path.join(SCRIPT_DIR, script_name)
+            logging.info(f"Loading pipeline module {module_name} from {script_path}")
+            spec = importlib.util.spec_from_file_location(module_name, script_path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            _modules[script_name] = module
+    return module
+
+
+def get_doc_client():
+    global _doc_client
+    with _doc_client_lock:
+        if _doc_client is None:
+            ocr = load_script('ocr.py')
+            endpoint, key = ocr.getcreds()
+            _doc_client = ocr.DocClient(endpoint, key)
+            logging.info("Created warm OCR DocClient")
+    return _doc_client
+
+
+def run_ocr_subprocess(file_path, output_path, deadline=deadlines.NO_DEADLINE, on_event=None):
+    ocr_script_path = os.path.join(SCRIPT_DIR, 'ocr.py')
+    logging.info(f"Running OCR script: {ocr_script_path} with args: {file_path}, {output_path}")
+    try:
+        returncode, stderr = events.run_subprocess(
+            ['python3', ocr_script_path, file_path, output_path],
+            env=dict(os.environ, **deadline.env()), timeout=deadline.timeout(), on_event=on_event
+        )
+    except subprocess.TimeoutExpired:
+        logging.error(f"OCR script timed out for {file_path}")
+        return False
+
+    if returncode != 0:
+        logging.error(f"OCR script error: {stderr}")
+        return False
+    return True
+
+
+def run_process_script_subprocess(selected_script, batch_directory, selected_model, custom_template, output_path, checkpoint_key=None, deadline=deadlines.NO_DEADLINE, on_event=None):
+    process_script_path = os.path.join(SCRIPT_DIR, selected_script)
+    logging.info(f"Running process script: {process_script_path} with args: {batch_directory}, {selected_model}, {custom_template}, {output_path}")
+    env = dict(os.environ, **deadline.env())
+    if checkpoint_key:
+        env['CHECKPOINT_KEY'] = checkpoint_key
+    try:
+        # The script sees the same deadline and wraps up on its own; the
+        # timeout only catches one that does not
+        returncode, stderr = events.run_subprocess(
+            ['python3', process_script_path, batch_directory, selected_model, custom_template, output_path],
+            env=env, timeout=deadline.timeout(), on_event=on_event
+        )
+    except subprocess.TimeoutExpired:
+        logging.error(f"Process script {selected_script} timed out")
+        return False
+
+    if returncode != 0:
+        logging.error(f"Process script error: {stderr}")
+        return False
+    return True
+
+
+def run_ocr(file_path, output_path, deadline=deadlines.NO_DEADLINE, on_event=None):
+    # Only a worker that cannot be set up falls back to the subprocess; a
+    # failure while reading the document is raised, not paid for twice
+    if pipeline_mode() == 'warm':
+        try:
+            ocr = load_script('ocr.py')
+            client = get_doc_client()
+        except (Exception, SystemExit) as e:
+            logging.warning(f"Could not load warm OCR, falling back to subprocess: {str(e)}")
+        else:
+            with events.listening(on_event):
+                ocr.run(client, file_path, output_path, deadline)
+            return True
+
+    return run_ocr_subprocess(file_path, output_path, deadline, on_event)
+
+
+def script_kwargs(selected_script, checkpoint_key, deadline):
+    kwargs = {'deadline': deadline}
+    if checkpoint_key and selected_script in CHECKPOINTED_SCRIPTS:
+        kwargs['checkpoint'] = checkpoints.open_checkpoint(checkpoint_key)
+    return kwargs
+
+
+def run_process_script(selected_script, batch_directory, selected_model, custom_template, output_path, checkpoint_key=None, deadline=deadlines.NO_DEADLINE, on_event=None):
+    if selected_script not in PROCESS_SCRIPTS:
+        raise ValueError(f"Unsupported process script: {selected_script}")
+
+    if pipeline_mode() == 'warm':
+        try:
+            module = load_script(selected_script)
+        except (Exception, SystemExit) as e:
+            logging.warning(f"Could not load warm {selected_script}, falling back to subprocess: {str(e)}")
+        else:
+            with events.listening(on_event):
+                module.run(batch_directory, selected_model, str(custom_template), output_path, **script_kwargs(selected_script, checkpoint_key, deadline))
+            return True
+
+    return run_process_script_subprocess(selected_script, batch_directory, selected_model, custom_template, output_path, checkpoint_key, deadline, on_event)
+
+
+def run_process_scripts(selected_script, batch_directory, selected_model, custom_template, output_path, checkpoint_key=None, deadline=deadlines.NO_DEADLINE, on_event=None):
+    # Several scripts share one OCR pass: each reads the same batch directory,
+    # writes its own output next to output_path, and the results are merged
+    # in request order.
+    scripts = parse_scripts(selected_script)
+    if len(scripts) == 1:
+        return run_process_script(scripts[0], batch_directory, selected_model, custom_template, output_path, checkpoint_key, deadline, on_event)
+
+    base, ext = os.path.splitext(output_path)
+    script_outputs = [f'{base}.{os.path.splitext(script)[0]}{ext}' for script in scripts]
+    with ThreadPoolExecutor(max_workers=len(scripts), thread_name_prefix='script') as executor:
+        succeeded = list(executor.map(
+            lambda args: run_process_script(args[0], batch_directory, selected_model, custom_template, args[1], checkpoint_key, deadline, on_event),
+            zip(scripts, script_outputs)
+        ))
+    if not all(succeeded):
+        return False
+
+    merged = []
+    for script, script_output in zip(scripts, script_outputs):
+        with open(script_output, 'r') as f:
+            merged.extend(tag_output(script, json.load(f)))
+    with open(output_path, 'w') as f:
+        json.dump(merged, f, indent=4)
+    return True
+
+
+class InMemoryUnavailable(RuntimeError):
+    # The in-memory path cannot run here at all; the caller can use the disk path
+    pass
+
+
+def process_in_memory(filename, data, document_name, selected_script, selected_model, custom_template, ocr_results=None, on_ocr_complete=None, checkpoint_key=None, deadline=deadlines.NO_DEADLINE, on_event=None):
+    # Bytes in, (OCR result, processed output) out, without touching disk.
+    # Only available in warm mode since the subprocess path needs files.
+    if pipeline_mode() != 'warm':
+        raise InMemoryUnavailable("In-memory pipeline requires PIPELINE_MODE=warm")
+    if not supports_scripts(selected_script):
+        raise InMemoryUnavailable(f"Unsupported process script: {selected_script}")
+    # Load everything up front so a setup failure is told apart from a
+    # failure while processing, which is not retried
+    try:
+        for script in parse_scripts(selected_script):
+            load_script(script)
+        if ocr_results is None:
+            load_script('ocr.py')
+            get_doc_client()
+    except (Exception, SystemExit) as e:
+        raise InMemoryUnavailable(f"Could not load warm pipeline: {str(e)}") from e
+
+    with events.listening(on_event):
+        return _process_in_memory(
+            filename, data, document_name, selected_script, custom_template, ocr_results, on_ocr_complete, checkpoint_key, deadline
+        )
+
+
+def _process_in_memory(filename, data, document_name, selected_script, custom_template, ocr_results, on_ocr_complete, checkpoint_key, deadline):
+    stream = None
+    ocr_future = None
+    if ocr_results is None and streaming_enabled():
+        # OCR runs in the background and the scripts read pages off the
+        # stream as they arrive instead of waiting for the whole document
+        stream = page_stream.PageStream()
+        ocr_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ocr-stream')
+        ocr_future = ocr_executor.submit(events.bind(stream_ocr), filename, data, stream, on_ocr_complete, deadline)
+        ocr_executor.shutdown(wait=False)
+    elif ocr_results is None:
+        ocr = load_script('ocr.py')
+        ocr_results = ocr.process_bytes(get_doc_client(), filename, data, deadline)
+        if on_ocr_complete:
+            on_ocr_complete(ocr_results)
+
+    def process(script):
+        module = load_script(script)
+        docs = page_stream.StreamedDocs(stream) if stream is not None else module.docs_from_data(ocr_results)
+        return [module.process_document(docs, str(custom_template), document_name, **script_kwargs(script, checkpoint_key, deadline))]
+
+    scripts = parse_scripts(selected_script)
+    try:
+        if len(scripts) == 1:
+            output_data = process(scripts[0])
+        else:
+            output_data = []
+            with ThreadPoolExecutor(max_workers=len(scripts), thread_name_prefix='script') as executor:
+                for script, script_output in zip(scripts, executor.map(events.bind(process), scripts)):
+                    output_data.extend(tag_output(script, script_output))
+    finally:
+        # An OCR failure is the more useful error than the scripts' "stream failed"
+        if ocr_future is not None:
+            ocr_results = ocr_future.result()
+    return ocr_results, output_data
+
+
+def stream_ocr(filename, data, stream, on_ocr_complete=None, deadline=deadlines.NO_DEADLINE):
+    ocr = load_script('ocr.py')
+    ocr_results = ocr.stream_bytes(get_doc_client(), filename, data, stream, deadline)
+    if on_ocr_complete:
+        on_ocr_complete(ocr_results)
+    return ocr_results
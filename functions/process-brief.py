@@ -1,11 +1,13 @@
 import os
 import logging
 import json
-from langchain_openai import ChatOpenAI
-from langchain_community.document_loaders import JSONLoader
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_anthropic import ChatAnthropic
+from governor import governor, govern_llm
+from llm_factory import chat_model
+import prompts
+import checkpoints
+import deadline as deadlines
+import events
 import os
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import sys
@@ -32,15 +34,15 @@ def get_api_key():
 api_key = get_api_key()
 
 
-llm_1 = ChatAnthropic(model_name="claude-3-haiku-20240307", api_key=api_key, temperature=0)
+llm_1 = govern_llm(chat_model("claude-3-haiku-20240307", api_key))
 
-llm_2 = ChatAnthropic(model_name="claude-3-haiku-20240307", api_key=api_key, temperature=0)
+llm_2 = govern_llm(chat_model("claude-3-haiku-20240307", api_key))
 
-llm_3 = ChatAnthropic(model_name="claude-3-haiku-20240307", api_key=api_key, temperature=0)
+llm_3 = govern_llm(chat_model("claude-3-haiku-20240307", api_key))
 
-llm_4 = ChatAnthropic(model_name="claude-3-haiku-20240307", api_key=api_key, temperature=0)
+llm_4 = govern_llm(chat_model("claude-3-haiku-20240307", api_key))
 
-llm = ChatAnthropic(model_name="claude-3-haiku-20240307", api_key=api_key, temperature=0)
+llm = govern_llm(chat_model("claude-3-haiku-20240307", api_key))
 
 
 def load_and_split(file_path):
@@ -51,11 +53,16 @@ def load_and_split(file_path):
         try:
             data = json.loads(file_content)
         except json.JSONDecodeError as e:
-            print(f"Error parsing JSON: {e}")
+            logger.error(f"Error parsing JSON: {e}")
             data = {}
 
-    print(f"Keys in parsed JSON data: {data.keys()}")
+    docs = docs_from_data(data)
+    if docs:
+        logger.info(f"Data loaded from document: {file_path}")
+        return docs
 
+
+def docs_from_data(data):
     if "messages" in data:
         if data["messages"]:
             docs = []
@@ -65,9 +72,6 @@ def load_and_split(file_path):
                     metadata={"seq_num": message["page_number"]},
                 )
                 docs.append(doc)
-            print(docs)
-
-            logger.info(f"Data loaded from document: {file_path}")
             return docs
 
 
@@ -131,12 +135,12 @@ Guidelines:
 
 
 def update_memory_log(memory_log, new_summary):
-    memory_log_prompt = ChatPromptTemplate.from_template(memory_log_template)
+    memory_log_prompt = prompts.from_template(memory_log_template)
     memory_log_chain = memory_log_prompt | llm | StrOutputParser()
     updated_memory_log = memory_log_chain.invoke(
         {"summary": new_summary, "memory_log": memory_log}
     )
-    memory_log_verification_prompt = ChatPromptTemplate.from_template(
+    memory_log_verification_prompt = prompts.from_template(
         memory_log_verification_template
     )
     memory_log_verification_chain = (
@@ -148,7 +152,7 @@ def update_memory_log(memory_log, new_summary):
     return final_memory_log
 
 
-def create_memory_log(docs, custom_template, pages_to_concatenate=2):
+def create_memory_log(docs, custom_template, pages_to_concatenate=2, deadline=deadlines.NO_DEADLINE):
     memory_log = ""
     num_pages = len(docs)
 
@@ -164,16 +168,21 @@ def create_memory_log(docs, custom_template, pages_to_concatenate=2):
 
     # Process the first pages based on the concatenation length
     for i in range(0, min(10, num_pages), pages_to_concatenate):
+        if deadline.low():
+            deadline.mark_skipped()
+            break
         combined_content = concatenate_pages(i, pages_to_concatenate)
         summary = process_memory_log_page(docs, i, combined_content, 0, memory_log, custom_template)[
             "page_content"
         ]
         memory_log = update_memory_log(memory_log, summary)
-        print(f"ORIGINAL MEMORY LOG {memory_log}")
 
     # Process the last pages (skipping the first ones if already processed)
     start_index = max(10, num_pages - 10)
     for i in range(start_index, num_pages, pages_to_concatenate):
+        if deadline.low():
+            deadline.mark_skipped()
+            break
         combined_content = concatenate_pages(i, pages_to_concatenate)
         summary = process_memory_log_page(docs, i, combined_content, 0, memory_log, custom_template)[
             "page_content"
@@ -185,7 +194,7 @@ def create_memory_log(docs, custom_template, pages_to_concatenate=2):
 
 
 def process_memory_log_page(docs, i, current_page, window_size, memory_log, custom_template):
-    prompt_response = ChatPromptTemplate.from_template(summary_template)
+    prompt_response = prompts.from_template(summary_template)
     response_chain = prompt_response | llm | StrOutputParser()
 
     previous_page_ending = (
@@ -311,7 +320,7 @@ Memory Log and Summaries:
 
 
 def process_page(docs, i, query, window_size, memory_log, pages_per_chunk, custom_template):
-    prompt_response = ChatPromptTemplate.from_template(summary_template)
+    prompt_response = prompts.from_template(summary_template)
     response_chain = prompt_response | llm | StrOutputParser()
 
     current_pages = []
@@ -341,7 +350,6 @@ def process_page(docs, i, query, window_size, memory_log, pages_per_chunk, custo
                 "next_page_beginning": next_page_beginning,
             }
         )
-        print(f"Processed Content: {processed_content}")
         response["page_content"] = processed_content
 
     return response
@@ -366,14 +374,25 @@ def process_batch(
 
 
 def generate_summaries(
-    docs, query, memory_log, custom_template, window_size=100, batch_size=4, pages_per_chunk=2
+    docs, query, memory_log, custom_template, window_size=100, batch_size=4, pages_per_chunk=2,
+    checkpoint=checkpoints.NO_CHECKPOINT, deadline=deadlines.NO_DEADLINE
 ):
-    batches = [docs[i : i + batch_size] for i in range(0, len(docs), batch_size)]
+    num_batches = (len(docs) + batch_size - 1) // batch_size
     combined_summaries = []
 
-    with ThreadPoolExecutor() as executor:
-        future_to_batch = {
-            executor.submit(
+    with ThreadPoolExecutor(max_workers=governor.pool_size('llm')) as executor:
+        results = []
+        future_to_batch = {}
+        for i in range(num_batches):
+            saved = checkpoint.load(f"batch_{i}")
+            if saved is not None:
+                results.append((i, tuple(saved)))
+                continue
+            # Sliced here rather than up front: with streamed docs this waits
+            # only for this batch's pages, so earlier batches are already running
+            batch = docs[i * batch_size : (i + 1) * batch_size]
+            future = executor.submit(
+                deadline.call,
                 process_batch,
                 batch,
                 i * batch_size,
@@ -382,18 +401,21 @@ def generate_summaries(
                 memory_log,
                 pages_per_chunk,
                 custom_template
-            ): i
-            for i, batch in enumerate(batches)
-        }
+            )
+            future_to_batch[future] = i
 
-        results = []
         for future in as_completed(future_to_batch):
             batch_index = future_to_batch[future]
             try:
                 result = future.result()
+                if result is None:
+                    continue
+                checkpoint.save(f"batch_{batch_index}", result)
                 results.append((batch_index, result))
+                events.emit(events.PAGES_DONE, stage='summaries', pages=min(batch_size, len(docs) - batch_index * batch_size))
             except Exception as exc:
-                print(f"Batch {batch_index} generated an exception: {exc}")
+                logger.error(f"Batch {batch_index} generated an exception: {exc}")
+                events.emit(events.ERROR, stage='summaries', batch=batch_index, message=str(exc))
 
         # Sort results by batch_index to ensure order
         results.sort(key=lambda x: x[0])
@@ -404,11 +426,11 @@ def generate_summaries(
 
 def combine_summaries(summaries, memory_log):
     combiner_llm = llm
-    combiner_prompt = ChatPromptTemplate.from_template(combine_template)
+    combiner_prompt = prompts.from_template(combine_template)
     combiner_chain = combiner_prompt | combiner_llm | StrOutputParser()
 
     verification_llm = llm
-    verification_prompt = ChatPromptTemplate.from_template(verification_template)
+    verification_prompt = prompts.from_template(verification_template)
     verification_chain = verification_prompt | verification_llm | StrOutputParser()
 
     combined_summaries = []
@@ -437,7 +459,6 @@ def combine_summaries(summaries, memory_log):
                     "new_page_summary": new_page_summary,
                 }
             )
-            print("VERIFIED COMBINED SUMMARY: {verified_combined_summary}")
 
             current_combined_summary = verified_combined_summary
 
@@ -579,7 +600,7 @@ i. Any pending actions or future proceedings
 
 def format_and_improve_summary(bulletpoint_summary, summaries, memory_log):
     # Format bulletpoint summary into coherent narrative
-    prompt_response = ChatPromptTemplate.from_template(coherence_template)
+    prompt_response = prompts.from_template(coherence_template)
     response_chain = prompt_response | llm | StrOutputParser()
     coherent_summary = response_chain.invoke(
         {"bulletpoint_summary": bulletpoint_summary}
@@ -587,7 +608,7 @@ def format_and_improve_summary(bulletpoint_summary, summaries, memory_log):
     coherent_memory_log = response_chain.invoke({"bulletpoint_summary": memory_log})
 
     # Improve coherent summary based on comparison with bulletpoint summary
-    prompt_response = ChatPromptTemplate.from_template(improvement_template)
+    prompt_response = prompts.from_template(improvement_template)
     response_chain = prompt_response | llm | StrOutputParser()
     improved_summary = response_chain.invoke(
         {
@@ -955,7 +976,7 @@ Please provide the improved final condensed summary below. If no improvements ar
 Improved Summary:
 """
 
-def combine_final_summaries(summaries, memory_log, num_workers=4):
+def combine_final_summaries(summaries, memory_log, num_workers=4, checkpoint=checkpoints.NO_CHECKPOINT):
     combiner_llm_1 = llm_1
     combiner_llm_2 = llm_2
     combiner_llm_3 = llm_3
@@ -967,13 +988,13 @@ def combine_final_summaries(summaries, memory_log, num_workers=4):
     condensed_summary_aggregator_llm = llm_4
     improved_summary_llm = llm_4
 
-    combine_prompt_template = ChatPromptTemplate.from_template(final_combine_template)
-    aggregation_prompt_template = ChatPromptTemplate.from_template(aggregation_template_final)
-    verification_prompt_template = ChatPromptTemplate.from_template(final_verification_template)
-    condensed_summary_prompt_template = ChatPromptTemplate.from_template(condensed_summary_template)
-    condensed_summary_aggregation_prompt_template = ChatPromptTemplate.from_template(condensed_summary_aggregation_template)
-    improve_condensed_summary_prompt_template = ChatPromptTemplate.from_template(improve_condensed_summary_template)
-    improved_summary_integration_prompt_template = ChatPromptTemplate.from_template(improved_summary_integration_prompt)
+    combine_prompt_template = prompts.from_template(final_combine_template)
+    aggregation_prompt_template = prompts.from_template(aggregation_template_final)
+    verification_prompt_template = prompts.from_template(final_verification_template)
+    condensed_summary_prompt_template = prompts.from_template(condensed_summary_template)
+    condensed_summary_aggregation_prompt_template = prompts.from_template(condensed_summary_aggregation_template)
+    improve_condensed_summary_prompt_template = prompts.from_template(improve_condensed_summary_template)
+    improved_summary_integration_prompt_template = prompts.from_template(improved_summary_integration_prompt)
 
     combine_chain_1 = combine_prompt_template | combiner_llm_1 | StrOutputParser()
     combine_chain_2 = combine_prompt_template | combiner_llm_2 | StrOutputParser()
@@ -1017,12 +1038,15 @@ def combine_final_summaries(summaries, memory_log, num_workers=4):
         
         return current_summary
 
+    def process_chunk_checkpointed(chunk_index, chunk, initial_summary):
+        return checkpoint.cached(f"chunk_{chunk_index}", lambda: process_chunk(chunk, initial_summary))
+
     chunk_size = max(1, len(summaries) // num_workers)
     chunks = [summaries[i:i+chunk_size] for i in range(0, len(summaries), chunk_size)]
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(num_workers, governor.pool_size('llm'))) as executor:
         initial_summaries = [summaries[0][0]["page_content"]] + [chunk[0][0]["page_content"] for chunk in chunks[1:]]
-        chunk_results = list(executor.map(process_chunk, chunks, initial_summaries))
+        chunk_results = list(executor.map(process_chunk_checkpointed, range(len(chunks)), chunks, initial_summaries))
 
     # Combine chunk results sequentially
     final_summary = chunk_results[0]
@@ -1095,6 +1119,77 @@ def save_summaries_to_json(summary, output_file, start_page, end_page):
     return {"files": output_data}
 
 
+def save_batch_summaries_to_json(summaries, output_file):
+    # Partial output: one entry per batch, without the final combination
+    output_data = []
+    for summary, start_page, end_page in sorted(summaries, key=lambda x: x[1]):
+        output_data.append(
+            {
+                "sentence": clean_summary(summary["page_content"]),
+                "filename": os.path.basename(output_file),
+                "start_page": start_page,
+                "end_page": end_page,
+            }
+        )
+    return {"files": output_data, "partial": True}
+
+
+def process_document(docs, custom_template, filename, checkpoint=None, deadline=None):
+    checkpoint = checkpoints.for_document(checkpoint, "process-brief.py", docs, custom_template)
+    deadline = (deadline or deadlines.NO_DEADLINE).scope()
+    with events.stage("memory_log"):
+        # A log cut short by the deadline is used for this run but not saved
+        memory_log = checkpoint.cached(
+            "memory_log", lambda: create_memory_log(docs, custom_template, deadline=deadline), complete=lambda: not deadline.partial
+        )
+    query = "Generate a timeline of events based on the police report."
+    with events.stage("summaries"):
+        combined_summaries = generate_summaries(
+            docs, query, memory_log, custom_template, checkpoint=checkpoint, deadline=deadline
+        )
+
+    # Out of time (or batches already skipped): return the batch summaries
+    # rather than starting the multi-model combination
+    if deadline.partial or deadline.low() or not combined_summaries:
+        logger.warning(f"Returning partial summary for {filename} ({deadline.remaining():.0f}s left)")
+        return save_batch_summaries_to_json(combined_summaries, filename)
+
+    with events.stage("combine"):
+        final_summary, memory_log = combine_final_summaries(
+            combined_summaries, memory_log, checkpoint=checkpoint
+        )
+
+    start_page = docs[0].metadata["seq_num"]
+    end_page = docs[-1].metadata["seq_num"]
+    return save_summaries_to_json(final_summary, filename, start_page, end_page)
+
+
+def run(input_directory, selected_model, custom_template, output_path, checkpoint=None, deadline=None):
+    output_data = []
+
+    for entry in os.listdir(input_directory):
+        entry_path = os.path.join(input_directory, entry)
+
+        if os.path.isfile(entry_path) and entry.endswith(".json"):
+            # Process individual JSON file
+            docs = load_and_split(entry_path)
+            output_data.append(process_document(docs, custom_template, entry, checkpoint, deadline))
+
+        elif os.path.isdir(entry_path):
+            # Process directory containing JSON files
+            for filename in os.listdir(entry_path):
+                if filename.endswith(".json"):
+                    input_file_path = os.path.join(entry_path, filename)
+                    docs = load_and_split(input_file_path)
+                    output_data.append(process_document(docs, custom_template, entry, checkpoint, deadline))
+
+    # Convert the output data to JSON string
+    with open(output_path, "w") as output_file:
+        json.dump(output_data, output_file, indent=4)
+
+    return output_data
+
+
 if __name__ == "__main__":
     if len(sys.argv) < 4:
         print(
@@ -1106,62 +1201,11 @@ if __name__ == "__main__":
     selected_model = sys.argv[2]
     custom_template = sys.argv[3]
     output_path = sys.argv[4]
-    output_data = []
 
     custom_template = str(custom_template)
 
-
     try:
-        for entry in os.listdir(input_directory):
-            entry_path = os.path.join(input_directory, entry)
-
-            if os.path.isfile(entry_path) and entry.endswith(".json"):
-                # Process individual JSON file
-                docs = load_and_split(entry_path)
-                memory_log = create_memory_log(docs, custom_template)
-                query = "Generate a timeline of events based on the police report."
-                combined_summaries = generate_summaries(docs, query, memory_log, custom_template)
-                final_summary, memory_log = combine_final_summaries(
-                    combined_summaries, memory_log
-                )
-                
-                start_page = docs[0].metadata["seq_num"]
-                end_page = docs[-1].metadata["seq_num"]
-
-                output_data.append(
-                    save_summaries_to_json(final_summary, entry, start_page, end_page)
-                )
-
-            elif os.path.isdir(entry_path):
-                # Process directory containing JSON files
-                for filename in os.listdir(entry_path):
-                    if filename.endswith(".json"):
-                        input_file_path = os.path.join(entry_path, filename)
-
-                        docs = load_and_split(
-                            input_file_path
-                        )  # Changed from entry_path to input_file_path
-                        memory_log = create_memory_log(docs, custom_template)
-                        query = (
-                            "Generate a timeline of events based on the police report."
-                        )
-                        combined_summaries = generate_summaries(docs, query, memory_log, custom_template)
-                        final_summary, memory_log = combine_final_summaries(
-                            combined_summaries, memory_log
-                        )
-
-                        start_page = docs[0].metadata["seq_num"]
-                        end_page = docs[-1].metadata["seq_num"]
-                        output_data.append(
-                            save_summaries_to_json(
-                                final_summary, entry, start_page, end_page
-                            )
-                        )
-
-        # Convert the output data to JSON string
-        with open(output_path, "w") as output_file:
-            json.dump(output_data, output_file, indent=4)
-
+        run(input_directory, selected_model, custom_template, output_path, checkpoints.checkpoint_from_env(), deadlines.from_env())
     except Exception as e:
         logger.error(f"Error processing JSON: {str(e)}")
         print(json.dumps({"success": False, "message": "Failed to process JSON"}))
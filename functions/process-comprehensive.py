@@ -1,10 +1,12 @@
 import os
 import logging
 import json
-from langchain_openai import ChatOpenAI
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_anthropic import ChatAnthropic
+from governor import governor, govern_llm
+from llm_factory import chat_model
+import prompts
+import deadline as deadlines
+import events
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import sys
 from collections import namedtuple
@@ -23,7 +25,7 @@ def get_api_key():
 
 api_key = get_api_key()
 
-llm = ChatAnthropic(model_name="claude-3-haiku-20240307", api_key=api_key, temperature=0)
+llm = govern_llm(chat_model("claude-3-haiku-20240307", api_key))
 
 
 def load_and_split(file_path):
@@ -34,11 +36,16 @@ def load_and_split(file_path):
         try:
             data = json.loads(file_content)
         except json.JSONDecodeError as e:
-            print(f"Error parsing JSON: {e}")
+            logger.error(f"Error parsing JSON: {e}")
             data = {}
 
-    print(f"Keys in parsed JSON data: {data.keys()}")
+    docs = docs_from_data(data)
+    if docs:
+        logger.info(f"Data loaded from document: {file_path}")
+        return docs
 
+
+def docs_from_data(data):
     if "messages" in data:
         if data["messages"]:
             docs = []
@@ -48,9 +55,6 @@ def load_and_split(file_path):
                     metadata={"seq_num": message["page_number"]},
                 )
                 docs.append(doc)
-            print(docs)
-
-            logger.info(f"Data loaded from document: {file_path}")
             return docs
 
 
@@ -127,10 +131,10 @@ improvement_template = """
     """
 
 def process_page(docs, custom_template, i):
-    prompt_response = ChatPromptTemplate.from_template(summary_template)
+    prompt_response = prompts.from_template(summary_template)
     response_chain = prompt_response | llm | StrOutputParser()
 
-    improvement_prompt = ChatPromptTemplate.from_template(improvement_template)
+    improvement_prompt = prompts.from_template(improvement_template)
     improvement_chain = improvement_prompt | llm | StrOutputParser()
 
     current_page = docs[i].page_content.replace("\n", " ")
@@ -151,24 +155,26 @@ def process_page(docs, custom_template, i):
         }
     )
 
-    print(f"Processed Content: {processed_content}")
 
     return {"page_content": improved_summary, "page_number": page_number}
 
 
-def generate_summaries(docs, custom_template):
+def generate_summaries(docs, custom_template, deadline=deadlines.NO_DEADLINE):
     summaries = []
 
-    with ThreadPoolExecutor() as executor:
-        future_to_page = {executor.submit(process_page, docs, custom_template, i): i for i in range(len(docs))}
+    with ThreadPoolExecutor(max_workers=governor.pool_size('llm')) as executor:
+        future_to_page = {executor.submit(deadline.call, process_page, docs, custom_template, i): i for i in range(len(docs))}
         
         for future in as_completed(future_to_page):
             page_index = future_to_page[future]
             try:
                 result = future.result()
-                summaries.append(result)
+                if result is not None:
+                    summaries.append(result)
+                    events.emit(events.PAGES_DONE, stage='summaries', pages=1)
             except Exception as exc:
-                print(f'Page {page_index} generated an exception: {exc}')
+                logger.error(f'Page {page_index} generated an exception: {exc}')
+                events.emit(events.ERROR, stage='summaries', page=page_index + 1, message=str(exc))
         
     summaries.sort(key=lambda x: x["page_number"])
     return summaries
@@ -203,6 +209,42 @@ def save_summaries_to_json(summaries, output_file):
 
     return {"files": output_data}
 
+def process_document(docs, custom_template, filename, deadline=None):
+    deadline = (deadline or deadlines.NO_DEADLINE).scope()
+    with events.stage("summaries"):
+        combined_summaries = generate_summaries(docs, custom_template, deadline)
+    output = save_summaries_to_json(combined_summaries, filename)
+    if deadline.partial:
+        output["partial"] = True
+    return output
+
+
+def run(input_directory, selected_model, custom_template, output_path, deadline=None):
+    output_data = []
+
+    for entry in os.listdir(input_directory):
+        entry_path = os.path.join(input_directory, entry)
+
+        if os.path.isfile(entry_path) and entry.endswith(".json"):
+            # Process individual JSON file
+            docs = load_and_split(entry_path)
+            output_data.append(process_document(docs, custom_template, entry, deadline))
+
+        elif os.path.isdir(entry_path):
+            # Process directory containing JSON files
+            for filename in os.listdir(entry_path):
+                if filename.endswith(".json"):
+                    input_file_path = os.path.join(entry_path, filename)
+                    docs = load_and_split(input_file_path)
+                    output_data.append(process_document(docs, custom_template, filename, deadline))
+
+    # Convert the output data to JSON string
+    with open(output_path, "w") as output_file:
+        json.dump(output_data, output_file, indent=4)
+
+    return output_data
+
+
 if __name__ == "__main__":
     if len(sys.argv) < 4:
         print(
@@ -214,40 +256,11 @@ if __name__ == "__main__":
     selected_model = sys.argv[2]
     custom_template = sys.argv[3]
     output_path = sys.argv[4]
-    output_data = []
 
     custom_template = str(custom_template)
 
-
     try:
-        for entry in os.listdir(input_directory):
-            entry_path = os.path.join(input_directory, entry)
-
-            if os.path.isfile(entry_path) and entry.endswith(".json"):
-                # Process individual JSON file
-                docs = load_and_split(entry_path)
-                query = "Generate a timeline of events based on the police report."
-                combined_summaries = generate_summaries(docs, custom_template)
-                output_data.append(save_summaries_to_json(combined_summaries, entry))
-
-            elif os.path.isdir(entry_path):
-                # Process directory containing JSON files
-                for filename in os.listdir(entry_path):
-                    if filename.endswith(".json"):
-                        input_file_path = os.path.join(entry_path, filename)
-
-                        docs = load_and_split(
-                            input_file_path
-                        )  # Changed from entry_path to input_file_path
-                        combined_summaries = generate_summaries(docs, custom_template)
-                        output_data.append(
-                            save_summaries_to_json(combined_summaries, filename)
-                        )
-
-        # Convert the output data to JSON string
-        with open(output_path, "w") as output_file:
-            json.dump(output_data, output_file, indent=4)
-
+        run(input_directory, selected_model, custom_template, output_path, deadlines.from_env())
     except Exception as e:
         logger.error(f"Error processing JSON: {str(e)}")
         print(json.dumps({"success": False, "message": "Failed to process JSON"}))
@@ -1,11 +1,13 @@
 import os
 import logging
 import json
-from langchain_openai import ChatOpenAI
-from langchain_community.document_loaders import JSONLoader
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_anthropic import ChatAnthropic
+from governor import governor, govern_llm
+from llm_factory import chat_model
+import prompts
+import checkpoints
+import deadline as deadlines
+import events
 import os
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import sys
@@ -28,7 +30,7 @@ def get_api_key():
     return api_key
 
 api_key = get_api_key()
-llm = ChatAnthropic(model_name="claude-3-haiku-20240307", api_key=api_key, temperature=0)
+llm = govern_llm(chat_model("claude-3-haiku-20240307", api_key))
 
 
 def load_and_split(file_path):
@@ -39,11 +41,16 @@ def load_and_split(file_path):
         try:
             data = json.loads(file_content)
         except json.JSONDecodeError as e:
-            print(f"Error parsing JSON: {e}")
+            logger.error(f"Error parsing JSON: {e}")
             data = {}
 
-    print(f"Keys in parsed JSON data: {data.keys()}")
+    docs = docs_from_data(data)
+    if docs:
+        logger.info(f"Data loaded from document: {file_path}")
+        return docs
 
+
+def docs_from_data(data):
     if "messages" in data:
         if data["messages"]:
             docs = []
@@ -53,9 +60,6 @@ def load_and_split(file_path):
                     metadata={"seq_num": message["page_number"]},
                 )
                 docs.append(doc)
-            print(docs)
-
-            logger.info(f"Data loaded from document: {file_path}")
             return docs
 
 
@@ -119,12 +123,12 @@ Guidelines:
 
 
 def update_memory_log(memory_log, new_summary):
-    memory_log_prompt = ChatPromptTemplate.from_template(memory_log_template)
+    memory_log_prompt = prompts.from_template(memory_log_template)
     memory_log_chain = memory_log_prompt | llm | StrOutputParser()
     updated_memory_log = memory_log_chain.invoke(
         {"summary": new_summary, "memory_log": memory_log}
     )
-    memory_log_verification_prompt = ChatPromptTemplate.from_template(
+    memory_log_verification_prompt = prompts.from_template(
         memory_log_verification_template
     )
     memory_log_verification_chain = (
@@ -136,7 +140,7 @@ def update_memory_log(memory_log, new_summary):
     return final_memory_log
 
 
-def create_memory_log(docs, custom_template, pages_to_concatenate=2):
+def create_memory_log(docs, custom_template, pages_to_concatenate=2, deadline=deadlines.NO_DEADLINE):
     memory_log = ""
     num_pages = len(docs)
 
@@ -152,16 +156,21 @@ def create_memory_log(docs, custom_template, pages_to_concatenate=2):
 
     # Process the first pages based on the concatenation length
     for i in range(0, min(10, num_pages), pages_to_concatenate):
+        if deadline.low():
+            deadline.mark_skipped()
+            break
         combined_content = concatenate_pages(i, pages_to_concatenate)
         summary = process_memory_log_page(docs, i, combined_content, 0, memory_log, custom_template)[
             "page_content"
         ]
         memory_log = update_memory_log(memory_log, summary)
-        print(f"ORIGINAL MEMORY LOG {memory_log}")
 
     # Process the last pages (skipping the first ones if already processed)
     start_index = max(10, num_pages - 10)
     for i in range(start_index, num_pages, pages_to_concatenate):
+        if deadline.low():
+            deadline.mark_skipped()
+            break
         combined_content = concatenate_pages(i, pages_to_concatenate)
         summary = process_memory_log_page(docs, i, combined_content, 0, memory_log, custom_template)[
             "page_content"
@@ -173,7 +182,7 @@ def create_memory_log(docs, custom_template, pages_to_concatenate=2):
 
 
 def process_memory_log_page(docs, i, current_page, window_size, memory_log, custom_template):
-    prompt_response = ChatPromptTemplate.from_template(summary_template)
+    prompt_response = prompts.from_template(summary_template)
     response_chain = prompt_response | llm | StrOutputParser()
 
     previous_page_ending = (
@@ -231,7 +240,7 @@ As a Legal Clerk, your task is to generate a comprehensive, bulletpoint summary
 """
 
 def process_page(docs, i, query, window_size, memory_log, pages_per_chunk, custom_template):
-    prompt_response = ChatPromptTemplate.from_template(summary_template)
+    prompt_response = prompts.from_template(summary_template)
     response_chain = prompt_response | llm | StrOutputParser()
 
     current_pages = []
@@ -261,7 +270,6 @@ def process_page(docs, i, query, window_size, memory_log, pages_per_chunk, custo
                 "next_page_beginning": next_page_beginning,
             }
         )
-        print(f"Processed Content: {processed_content}")
         response["page_content"] = processed_content
 
     return response
@@ -286,14 +294,25 @@ def process_batch(
 
 
 def generate_summaries(
-    docs, query, memory_log, custom_template, window_size=100, batch_size=12, pages_per_chunk=2
+    docs, query, memory_log, custom_template, window_size=100, batch_size=12, pages_per_chunk=2,
+    checkpoint=checkpoints.NO_CHECKPOINT, deadline=deadlines.NO_DEADLINE
 ):
-    batches = [docs[i : i + batch_size] for i in range(0, len(docs), batch_size)]
+    num_batches = (len(docs) + batch_size - 1) // batch_size
     combined_summaries = []
 
-    with ThreadPoolExecutor() as executor:
-        future_to_batch = {
-            executor.submit(
+    with ThreadPoolExecutor(max_workers=governor.pool_size('llm')) as executor:
+        results = []
+        future_to_batch = {}
+        for i in range(num_batches):
+            saved = checkpoint.load(f"batch_{i}")
+            if saved is not None:
+                results.append((i, tuple(saved)))
+                continue
+            # Sliced here rather than up front: with streamed docs this waits
+            # only for this batch's pages, so earlier batches are already running
+            batch = docs[i * batch_size : (i + 1) * batch_size]
+            future = executor.submit(
+                deadline.call,
                 process_batch,
                 batch,
                 i * batch_size,
@@ -302,18 +321,21 @@ def generate_summaries(
                 memory_log,
                 pages_per_chunk,
                 custom_template
-            ): i
-            for i, batch in enumerate(batches)
-        }
+            )
+            future_to_batch[future] = i
 
-        results = []
         for future in as_completed(future_to_batch):
             batch_index = future_to_batch[future]
             try:
                 result = future.result()
+                if result is None:
+                    continue
+                checkpoint.save(f"batch_{batch_index}", result)
                 results.append((batch_index, result))
+                events.emit(events.PAGES_DONE, stage='summaries', pages=min(batch_size, len(docs) - batch_index * batch_size))
             except Exception as exc:
-                print(f"Batch {batch_index} generated an exception: {exc}")
+                logger.error(f"Batch {batch_index} generated an exception: {exc}")
+                events.emit(events.ERROR, stage='summaries', batch=batch_index, message=str(exc))
 
         # Sort results by batch_index to ensure order
         results.sort(key=lambda x: x[0])
@@ -507,11 +529,11 @@ i. Any pending actions or future proceedings
 
 def combine_summaries(summaries, memory_log):
     combiner_llm = llm
-    combiner_prompt = ChatPromptTemplate.from_template(combine_template)
+    combiner_prompt = prompts.from_template(combine_template)
     combiner_chain = combiner_prompt | combiner_llm | StrOutputParser()
 
     verification_llm = llm
-    verification_prompt = ChatPromptTemplate.from_template(verification_template)
+    verification_prompt = prompts.from_template(verification_template)
     verification_chain = verification_prompt | verification_llm | StrOutputParser()
 
     combined_summaries = []
@@ -540,7 +562,6 @@ def combine_summaries(summaries, memory_log):
                     "new_page_summary": new_page_summary,
                 }
             )
-            print("VERIFIED COMBINED SUMMARY: {verified_combined_summary}")
 
             current_combined_summary = verified_combined_summary
 
@@ -564,7 +585,7 @@ def combine_summaries(summaries, memory_log):
 
 def format_and_improve_summary(bulletpoint_summary, summaries, memory_log):
     # Format bulletpoint summary into coherent narrative
-    prompt_response = ChatPromptTemplate.from_template(coherence_template)
+    prompt_response = prompts.from_template(coherence_template)
     response_chain = prompt_response | llm | StrOutputParser()
     coherent_summary = response_chain.invoke(
         {"bulletpoint_summary": bulletpoint_summary}
@@ -572,7 +593,7 @@ def format_and_improve_summary(bulletpoint_summary, summaries, memory_log):
     coherent_memory_log = response_chain.invoke({"bulletpoint_summary": memory_log})
 
     # Improve coherent summary based on comparison with bulletpoint summary
-    prompt_response = ChatPromptTemplate.from_template(improvement_template)
+    prompt_response = prompts.from_template(improvement_template)
     response_chain = prompt_response | llm | StrOutputParser()
     improved_summary = response_chain.invoke(
         {
@@ -616,6 +637,51 @@ def save_summaries_to_json(summaries, output_file):
 
     return {"files": output_data}
 
+def process_document(docs, custom_template, filename, checkpoint=None, deadline=None):
+    checkpoint = checkpoints.for_document(checkpoint, "process-detailed.py", docs, custom_template)
+    deadline = (deadline or deadlines.NO_DEADLINE).scope()
+    with events.stage("memory_log"):
+        # A log cut short by the deadline is used for this run but not saved
+        memory_log = checkpoint.cached(
+            "memory_log", lambda: create_memory_log(docs, custom_template, deadline=deadline), complete=lambda: not deadline.partial
+        )
+    query = "Generate a timeline of events based on the police report."
+    with events.stage("summaries"):
+        combined_summaries = generate_summaries(
+            docs, query, memory_log, custom_template, checkpoint=checkpoint, deadline=deadline
+        )
+    output = save_summaries_to_json(combined_summaries, filename)
+    if deadline.partial:
+        output["partial"] = True
+    return output
+
+
+def run(input_directory, selected_model, custom_template, output_path, checkpoint=None, deadline=None):
+    output_data = []
+
+    for entry in os.listdir(input_directory):
+        entry_path = os.path.join(input_directory, entry)
+
+        if os.path.isfile(entry_path) and entry.endswith(".json"):
+            # Process individual JSON file
+            docs = load_and_split(entry_path)
+            output_data.append(process_document(docs, custom_template, entry, checkpoint, deadline))
+
+        elif os.path.isdir(entry_path):
+            # Process directory containing JSON files
+            for filename in os.listdir(entry_path):
+                if filename.endswith(".json"):
+                    input_file_path = os.path.join(entry_path, filename)
+                    docs = load_and_split(input_file_path)
+                    output_data.append(process_document(docs, custom_template, filename, checkpoint, deadline))
+
+    # Convert the output data to JSON string
+    with open(output_path, "w") as output_file:
+        json.dump(output_data, output_file, indent=4)
+
+    return output_data
+
+
 if __name__ == "__main__":
     if len(sys.argv) < 4:
         print(
@@ -627,45 +693,11 @@ if __name__ == "__main__":
     selected_model = sys.argv[2]
     custom_template = sys.argv[3]
     output_path = sys.argv[4]
-    output_data = []
 
     custom_template = str(custom_template)
 
-
     try:
-        for entry in os.listdir(input_directory):
-            entry_path = os.path.join(input_directory, entry)
-
-            if os.path.isfile(entry_path) and entry.endswith(".json"):
-                # Process individual JSON file
-                docs = load_and_split(entry_path)
-                memory_log = create_memory_log(docs, custom_template)
-                query = "Generate a timeline of events based on the police report."
-                combined_summaries = generate_summaries(docs, query, memory_log, custom_template)
-                output_data.append(save_summaries_to_json(combined_summaries, entry))
-
-            elif os.path.isdir(entry_path):
-                # Process directory containing JSON files
-                for filename in os.listdir(entry_path):
-                    if filename.endswith(".json"):
-                        input_file_path = os.path.join(entry_path, filename)
-
-                        docs = load_and_split(
-                            input_file_path
-                        )  # Changed from entry_path to input_file_path
-                        memory_log = create_memory_log(docs, custom_template)
-                        query = (
-                            "Generate a timeline of events based on the police report."
-                        )
-                        combined_summaries = generate_summaries(docs, query, memory_log, custom_template)
-                        output_data.append(
-                            save_summaries_to_json(combined_summaries, filename)
-                        )
-
-        # Convert the output data to JSON string
-        with open(output_path, "w") as output_file:
-            json.dump(output_data, output_file, indent=4)
-
+        run(input_directory, selected_model, custom_template, output_path, checkpoints.checkpoint_from_env(), deadlines.from_env())
     except Exception as e:
         logger.error(f"Error processing JSON: {str(e)}")
         print(json.dumps({"success": False, "message": "Failed to process JSON"}))
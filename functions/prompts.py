@@ -0,0 +1,23 @@
+from functools import lru_cache
+from langchain_core.prompts import ChatPromptTemplate
+
+# Prompt templates are parsed once per process instead of on every call.
+# The process scripts build their chains inside per-page functions, so
+# ChatPromptTemplate.from_template used to re-parse the same module-level
+# template string for every page; the parsed prompt is immutable in use
+# (`prompt | llm` builds a new sequence), so sharing it is safe.
+
+
+@lru_cache(maxsize=None)
+def from_template(template):
+    return ChatPromptTemplate.from_template(template)
+
+
+def warm(module):
+    # Parse every module-level template string up front
+    count = 0
+    for name, value in vars(module).items():
+        if ('template' in name or name.endswith('_prompt')) and isinstance(value, str):
+            from_template(value)
+            count += 1
+    return count
@@ -0,0 +1,81 @@
+import os
+import gzip
+import json
+import logging
+
+# Firestore `uploads` records. Processed output used to be stored inline as
+# `processedData`, which pushes long timelines toward the 1 MiB document
+# limit and makes every listing query pull megabytes. Payloads larger than
+# PROCESSED_INLINE_MAX_BYTES now go to the bucket gzip-compressed; the record
+# keeps the blob path and a small summary projection instead; clients read
+# the entries through the results API, which resolves the path server-side.
+# All of a request's records are written in one batched commit.
+
+INLINE_MAX_BYTES = int(os.getenv('PROCESSED_INLINE_MAX_BYTES', str(64 * 1024)))
+PREVIEW_CHARS = 280
+
+# Firestore allows at most 500 writes per batch
+BATCH_LIMIT = 500
+
+RECORD_FIELDS = [
+    'filename', 'pdfFileUrl', 'jsonFileUrl', 'processedFileUrl', 'pdfSummaryUrl',
+    'processedData', 'processedDataRef', 'processedDataBytes', 'processedDataSummary',
+    'partial',
+]
+
+
+def summary_projection(processed_results):
+    # Enough for a listing view without fetching the payload
+    entries = [entry for item in processed_results for entry in item.get('files', [])]
+    pages = [
+        page for entry in entries
+        for page in (entry.get('start_page'), entry.get('end_page'), *(entry.get('page_numbers') or []))
+        if isinstance(page, int)
+    ]
+    preview = entries[0].get('sentence', '')[:PREVIEW_CHARS] if entries else ''
+    return {
+        'items': len(processed_results),
+        'entries': len(entries),
+        'firstPage': min(pages) if pages else None,
+        'lastPage': max(pages) if pages else None,
+        'preview': preview,
+    }
+
+
+def processed_fields(bucket, blob_path, processed_data):
+    # Inline small payloads as before; move large ones out of line
+    size = len(processed_data.encode('utf-8'))
+    if size <= INLINE_MAX_BYTES:
+        return {'processedData': processed_data}
+
+    compressed = gzip.compress(processed_data.encode('utf-8'))
+    blob = bucket.blob(blob_path)
+    # Stored with Content-Encoding: gzip so GCS serves it decompressed to
+    # clients that do not ask for gzip
+    blob.content_encoding = 'gzip'
+    blob.upload_from_string(compressed, content_type='application/json')
+    logging.info(f"Stored processed data out of line: {blob_path} ({size} -> {len(compressed)} bytes)")
+
+    return {
+        'processedDataRef': blob_path,
+        'processedDataBytes': size,
+        'processedDataSummary': summary_projection(json.loads(processed_data)),
+    }
+
+
+def record_from_result(unique_id, result):
+    from firebase_admin import firestore
+
+    record = {field: result[field] for field in RECORD_FIELDS if field in result}
+    record['id'] = unique_id
+    record['uploadedAt'] = firestore.SERVER_TIMESTAMP
+    return record
+
+
+def commit_records(firestore_client, records, collection='uploads'):
+    for start in range(0, len(records), BATCH_LIMIT):
+        batch = firestore_client.batch()
+        for record in records[start:start + BATCH_LIMIT]:
+            batch.set(firestore_client.collection(collection).document(), record)
+        batch.commit()
+    logging.info(f"Committed {len(records)} upload record(s)")
@@ -0,0 +1,226 @@
+import os
+import hashlib
+import logging
+import time
+import threading
+import storage_budget
+
+# Content-addressed cache for pipeline artifacts. OCR output is keyed by the
+# upload's SHA-256 alone; processed output and the rendered summary PDF are
+# keyed by (content hash, script, model, normalized template hash). Every key
+# also includes RESULT_CACHE_VERSION and a hash of the script source, so
+# prompt edits invalidate old entries without a manual flush.
+
+CACHE_VERSION = os.getenv('RESULT_CACHE_VERSION', '1')
+
+# Eviction lists the whole cache, so it is not done on every put: each
+# backend keeps a running total from its last scan plus what it has written
+# since, and only rescans once that passes max_bytes or the scan is older
+# than RESULT_CACHE_RESCAN_SECONDS (other instances write to a shared bucket)
+RESCAN_SECONDS = float(os.getenv('RESULT_CACHE_RESCAN_SECONDS', '600'))
+
+# Eviction frees down to this fraction of max_bytes, leaving headroom for a
+# run of puts before the next scan
+LOW_WATER = 0.9
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_source_hashes = {}
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def normalize_template(custom_template):
+    return ' '.join((custom_template or '').split())
+
+
+def source_hash(script_name):
+    if script_name not in _source_hashes:
+        script_path = os.path.join(SCRIPT_DIR, script_name)
+        _source_hashes[script_name] = hash_file(script_path) if os.path.exists(script_path) else ''
+    return _source_hashes[script_name]
+
+
+def ocr_key(content_hash):
+    return hash_text('|'.join(['ocr', CACHE_VERSION, source_hash('ocr.py'), content_hash]))
+
+
+def result_key(content_hash, selected_script, selected_model, custom_template):
+    template_hash = hash_text(normalize_template(custom_template))
+    # selected_script may list several comma-separated scripts
+    script_hashes = ','.join(source_hash(script.strip()) for script in (selected_script or '').split(','))
+    return hash_text('|'.join([
+        'result', CACHE_VERSION, script_hashes, source_hash('create_pdf_and_email.py'),
+        content_hash, selected_script or '', selected_model or '', template_hash
+    ]))
+
+
+class SizeIndex:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total = None
+        self.scanned_at = 0.0
+        self._lock = threading.Lock()
+
+    def added(self, size):
+        # True when it is time to scan and evict
+        with self._lock:
+            if self.total is not None:
+                self.total += size
+            return self.total is None or self.total > self.max_bytes or time.monotonic() - self.scanned_at > RESCAN_SECONDS
+
+    def scanned(self, total):
+        with self._lock:
+            self.total = total
+            self.scanned_at = time.monotonic()
+
+
+class LocalCacheBackend:
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.index = SizeIndex(max_bytes)
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        # The cache fills up to its cap and stays there
+        storage_budget.budget.charge('result_cache', max_bytes)
+
+    def _path(self, key, name):
+        return os.path.join(self.root, key[:2], key, name)
+
+    def get(self, key, name):
+        path = self._path(key, name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return data
+
+    def put(self, key, name, data):
+        path = self._path(key, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.tmp.{threading.get_ident()}'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        if self.index.added(len(data)):
+            self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for dirpath, _, filenames in os.walk(self.root):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+
+            # Least recently used first
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes * LOW_WATER:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    logging.info(f"Evicted cache entry: {path}")
+                except FileNotFoundError:
+                    pass
+            self.index.scanned(total)
+
+
+class BucketCacheBackend:
+    def __init__(self, get_bucket, prefix, max_bytes):
+        self.get_bucket = get_bucket
+        self.prefix = prefix.rstrip('/') + '/'
+        self.max_bytes = max_bytes
+        self.index = SizeIndex(max_bytes)
+        self._lock = threading.Lock()
+
+    def _blob(self, key, name):
+        return self.get_bucket().blob(f'{self.prefix}{key}/{name}')
+
+    def get(self, key, name):
+        blob = self._blob(key, name)
+        if not blob.exists():
+            return None
+        return blob.download_as_bytes()
+
+    def put(self, key, name, data):
+        self._blob(key, name).upload_from_string(data)
+        if self.index.added(len(data)):
+            self._evict()
+
+    def _evict(self):
+        with self._lock:
+            blobs = list(self.get_bucket().list_blobs(prefix=self.prefix))
+            total = sum(blob.size or 0 for blob in blobs)
+            # Oldest uploads first; GCS does not track access time
+            for blob in sorted(blobs, key=lambda b: b.updated):
+                if total <= self.max_bytes * LOW_WATER:
+                    break
+                size = blob.size or 0
+                blob.delete()
+                total -= size
+                logging.info(f"Evicted cache entry: {blob.name}")
+            self.index.scanned(total)
+
+
+class ResultCache:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def fetch(self, key, entries):
+        # entries: list of (name, Artifact); all or nothing
+        try:
+            found = []
+            for name, artifact in entries:
+                data = self.backend.get(key, name)
+                if data is None:
+                    return False
+                found.append((artifact, data))
+        except Exception as e:
+            logging.warning(f"Result cache read failed for {key}: {str(e)}")
+            return False
+
+        for artifact, data in found:
+            artifact.write_bytes(data)
+        return True
+
+    def store(self, key, entries):
+        try:
+            for name, artifact in entries:
+                self.backend.put(key, name, artifact.read_bytes())
+        except Exception as e:
+            logging.warning(f"Result cache write failed for {key}: {str(e)}")
+
+
+def create_result_cache(get_bucket):
+    backend_name = os.getenv('RESULT_CACHE', 'local').lower()
+    max_bytes = int(os.getenv('RESULT_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+    if backend_name == 'off':
+        return None
+    if backend_name == 'bucket':
+        backend = BucketCacheBackend(get_bucket, os.getenv('RESULT_CACHE_PREFIX', 'result_cache'), max_bytes)
+    else:
+        backend = LocalCacheBackend(os.getenv('RESULT_CACHE_DIR', '/tmp/result_cache'), max_bytes)
+
+    logging.info(f"Using {backend_name} result cache")
+    return ResultCache(backend)
@@ -0,0 +1,144 @@
+import os
+import gzip
+import json
+import logging
+from flask import Response, jsonify
+import records
+
+# Results API. The upload response (and a finished job's stored results)
+# used to carry every file's full processedData, which for long timelines is
+# megabytes that the frontend never reads from there. Responses now carry a
+# manifest per file instead: filename, artifact URLs, page range and entry
+# counts. The entries themselves are served from
+#
+#   GET /results/<uniqueId>                      manifest for every file
+#   GET /results/<uniqueId>/<file>?cursor=&limit= one page of a file's entries
+#
+# where <file> is the filename or its index in the manifest. Pages are cut by
+# an opaque cursor and gzip-compressed when the client accepts it.
+
+PAGE_LIMIT = int(os.getenv('RESULTS_PAGE_LIMIT', '100'))
+MAX_PAGE_LIMIT = 1000
+
+MANIFEST_FIELDS = [
+    'filename', 'pdfFileUrl', 'jsonFileUrl', 'processedFileUrl', 'pdfSummaryUrl',
+    'processedDataRef', 'processedDataBytes', 'partial', 'stageTimings',
+]
+
+# Smaller responses are not worth compressing
+GZIP_MIN_BYTES = 1024
+
+
+def manifest_entry(result):
+    entry = {field: result[field] for field in MANIFEST_FIELDS if field in result}
+    summary = result.get('processedDataSummary')
+    if summary is None and result.get('processedData'):
+        summary = records.summary_projection(json.loads(result['processedData']))
+    if summary is not None:
+        entry['summary'] = summary
+    return entry
+
+
+def parse_results_path(path):
+    # "/results/<id>" -> (id, None), "/results/<id>/<file>" -> (id, file)
+    parts = [part for part in path.split('/') if part]
+    if 'results' not in parts:
+        return None
+    parts = parts[parts.index('results') + 1:]
+    if not parts:
+        return None
+    return parts[0], (parts[1] if len(parts) > 1 else None)
+
+
+def load_records(firestore_client, unique_id):
+    snapshots = firestore_client.collection('uploads').where('id', '==', unique_id).stream()
+    return sorted((snapshot.to_dict() for snapshot in snapshots), key=lambda record: record.get('filename') or '')
+
+
+def find_record(file_records, file_key):
+    for record in file_records:
+        if record.get('filename') == file_key:
+            return record
+    if file_key.isdigit() and int(file_key) < len(file_records):
+        return file_records[int(file_key)]
+    return None
+
+
+def load_entries(bucket, record):
+    # Every script's entries in output order, tagged with their item
+    if record.get('processedData') is not None:
+        processed_data = record['processedData']
+    else:
+        data = bucket.blob(record['processedDataRef']).download_as_bytes()
+        # Stored gzip-encoded; depending on the client it may arrive either way
+        if data[:2] == b'\x1f\x8b':
+            data = gzip.decompress(data)
+        processed_data = data.decode('utf-8')
+
+    entries = []
+    for item_index, item in enumerate(json.loads(processed_data)):
+        for entry in item.get('files', []):
+            entry = dict(entry, item=item_index)
+            if item.get('script'):
+                entry['script'] = item['script']
+            entries.append(entry)
+    return entries
+
+
+def paginate(entries, cursor, limit):
+    # The cursor is an offset, kept opaque so it can change later
+    start = int(cursor) if cursor else 0
+    page = entries[start:start + limit]
+    end = start + len(page)
+    return {
+        'entries': page,
+        'total': len(entries),
+        'nextCursor': str(end) if end < len(entries) else None,
+    }
+
+
+def compressed_json(request, payload, headers, status=200):
+    body = json.dumps(payload).encode('utf-8')
+    headers = dict(headers, **{'Content-Type': 'application/json', 'Vary': 'Accept-Encoding'})
+    if len(body) >= GZIP_MIN_BYTES and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        body = gzip.compress(body)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(body, status=status, headers=headers)
+
+
+def handle_results_request(request, headers, get_firestore_client, get_bucket):
+    unique_id, file_key = parse_results_path(request.path)
+    if request.method != 'GET':
+        return jsonify({"error": "Unsupported results route"}), 405, headers
+
+    file_records = load_records(get_firestore_client(), unique_id)
+    if not file_records:
+        return jsonify({"error": "Results not found"}), 404, headers
+
+    if file_key is None:
+        return compressed_json(request, {
+            'uniqueId': unique_id,
+            'files': [manifest_entry(record) for record in file_records],
+        }, headers)
+
+    record = find_record(file_records, file_key)
+    if record is None:
+        return jsonify({"error": f"No result for {file_key}"}), 404, headers
+
+    try:
+        cursor = request.args.get('cursor')
+        limit = min(int(request.args.get('limit', PAGE_LIMIT)), MAX_PAGE_LIMIT)
+        if limit < 1 or (cursor and int(cursor) < 0):
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "Invalid cursor or limit"}), 400, headers
+
+    try:
+        entries = load_entries(get_bucket(), record)
+    except Exception as e:
+        logging.error(f"Could not load results for {unique_id}/{file_key}: {str(e)}")
+        return jsonify({"error": "Could not load results"}), 500, headers
+
+    page = paginate(entries, cursor, limit)
+    page.update({'uniqueId': unique_id, 'filename': record.get('filename')})
+    return compressed_json(request, page, headers)
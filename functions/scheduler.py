@@ -0,0 +1,168 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from estimator import estimate_pages
+
+# Fair-share scheduling of files across users. Every file of every request
+# used to go straight into its own unbounded pool, so one user uploading ten
+# large PDFs starved everyone else's single-page jobs. Files are now queued
+# per user (user_email, or client_id when given) and a bounded set of workers
+# takes them round-robin across users. With SCHEDULER_WEIGHTS a user gets that
+# many files per turn instead of one (weighted round-robin):
+#
+#   SCHEDULER_WEIGHTS="batch@example.com:1,ops@example.com:3"
+
+ANONYMOUS = 'anonymous'
+
+# Idle users are kept for /metrics until there are more than this many
+MAX_TRACKED_USERS = 1000
+
+
+def order_files(files, policy=None, pages=estimate_pages):
+    # Order a request's files before they are queued. "sjf" runs the
+    # smallest documents first (by page count from the PDF header), which
+    # cuts mean completion time for mixed batches; "interleave" alternates
+    # small and large so big files still start early; "fifo" keeps upload order.
+    policy = (policy or os.getenv('FILE_ORDER_POLICY', 'sjf')).lower()
+    if policy == 'fifo' or len(files) < 2:
+        return list(files)
+
+    by_size = sorted(files, key=pages)
+    if policy == 'interleave':
+        ordered = []
+        while by_size:
+            ordered.append(by_size.pop(0))
+            if by_size:
+                ordered.append(by_size.pop())
+        return ordered
+    if policy != 'sjf':
+        logging.warning(f"Unknown FILE_ORDER_POLICY {policy}, using sjf")
+    return by_size
+
+
+def parse_weights(value):
+    weights = {}
+    for item in (value or '').split(','):
+        user, _, weight = item.strip().rpartition(':')
+        if not user:
+            continue
+        try:
+            weights[user] = max(int(weight), 1)
+        except ValueError:
+            logging.warning(f"Ignoring invalid scheduler weight: {item}")
+    return weights
+
+
+class UserQueue:
+    def __init__(self, user):
+        self.user = user
+        self.tasks = deque()
+        self.running = 0
+        self.dispatched = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def metrics(self, now):
+        return {
+            'queued': len(self.tasks),
+            'running': self.running,
+            'dispatched': self.dispatched,
+            'avg_wait_seconds': round(self.total_wait / self.dispatched, 3) if self.dispatched else 0.0,
+            'max_wait_seconds': round(self.max_wait, 3),
+            'oldest_queued_seconds': round(now - self.tasks[0][0], 3) if self.tasks else 0.0,
+        }
+
+
+class FairScheduler:
+    def __init__(self, max_workers, weights=None):
+        self.max_workers = max_workers
+        self.weights = weights or {}
+        self.queues = {}
+        # Users with queued work, in round-robin order; the head is served
+        # until its credits for this turn run out
+        self.ring = deque()
+        self.credits = 0
+        self._cond = threading.Condition()
+        self._workers = []
+
+    def _start_workers(self):
+        # Called with the lock held; workers start on first use
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(target=self._work, name=f'fair-{len(self._workers)}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, user, fn, *args, **kwargs):
+        user = user or ANONYMOUS
+        future = Future()
+        with self._cond:
+            self._start_workers()
+            queue = self.queues.get(user)
+            if queue is None:
+                if len(self.queues) >= MAX_TRACKED_USERS:
+                    self._forget_idle()
+                queue = self.queues[user] = UserQueue(user)
+            if not queue.tasks:
+                self.ring.append(user)
+            queue.tasks.append((time.time(), future, fn, args, kwargs))
+            self._cond.notify()
+        return future
+
+    def _forget_idle(self):
+        for user in [user for user, queue in self.queues.items() if not queue.tasks and not queue.running]:
+            del self.queues[user]
+
+    def _next(self):
+        # Called with the lock held and a non-empty ring
+        user = self.ring[0]
+        queue = self.queues[user]
+        if self.credits <= 0:
+            self.credits = self.weights.get(user, 1)
+        task = queue.tasks.popleft()
+        self.credits -= 1
+        if not queue.tasks or self.credits <= 0:
+            self.ring.popleft()
+            self.credits = 0
+            if queue.tasks:
+                self.ring.append(user)
+
+        waited = time.time() - task[0]
+        queue.running += 1
+        queue.dispatched += 1
+        queue.total_wait += waited
+        queue.max_wait = max(queue.max_wait, waited)
+        return queue, task
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self.ring:
+                    self._cond.wait()
+                queue, (_, future, fn, args, kwargs) = self._next()
+
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+
+            with self._cond:
+                queue.running -= 1
+
+    def metrics(self):
+        now = time.time()
+        with self._cond:
+            return {
+                'workers': self.max_workers,
+                'users': {user: queue.metrics(now) for user, queue in self.queues.items()},
+            }
+
+
+def create_scheduler():
+    return FairScheduler(
+        max_workers=int(os.getenv('SCHEDULER_WORKERS', '4')),
+        weights=parse_weights(os.getenv('SCHEDULER_WEIGHTS'))
+    )
@@ -0,0 +1,54 @@
+import logging
+import threading
+from concurrent.futures import Future
+
+# In-flight deduplication: concurrent calls with the same key share one
+# execution. The first caller runs the function; later callers block on the
+# leader's future and receive the same result (or exception).
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._followers = {}
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def followers(self, key):
+        # Callers currently attached to the in-flight run for key
+        with self._lock:
+            return self._followers.get(key, 0)
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+            else:
+                self._followers[key] = self._followers.get(key, 0) + 1
+
+        if not leader:
+            logging.info(f"Attaching to in-flight run for {key}")
+            try:
+                return future.result(), True
+            finally:
+                with self._lock:
+                    self._followers[key] -= 1
+                    if not self._followers[key]:
+                        del self._followers[key]
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
@@ -0,0 +1,92 @@
+import time
+import logging
+import threading
+from concurrent.futures import Future
+
+# Small dependency-driven executor. Each stage is submitted to the shared
+# executor as soon as all of its dependencies have finished, and receives
+# their results as positional arguments. Events are stages completed from
+# outside the graph (e.g. "OCR finished" inside process_file). Every stage
+# records when it started and finished relative to the graph's creation.
+
+
+class StageGraph:
+    def __init__(self, executor):
+        self.executor = executor
+        self.started_at = time.monotonic()
+        self.futures = {}
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def _elapsed(self):
+        return round(time.monotonic() - self.started_at, 3)
+
+    def event(self, name):
+        future = Future()
+        self.futures[name] = future
+        return future
+
+    def complete(self, name, value=None):
+        future = self.futures[name]
+        if future.done():
+            return
+        with self._lock:
+            self.timings[name] = {'start': 0.0, 'end': self._elapsed()}
+        future.set_result(value)
+
+    def fail(self, name, exc):
+        future = self.futures[name]
+        if not future.done():
+            future.set_exception(exc)
+
+    def add(self, name, fn, deps=()):
+        future = Future()
+        self.futures[name] = future
+        dep_futures = [self.futures[dep] for dep in deps]
+        remaining = [len(dep_futures)]
+
+        def start():
+            for dep, dep_future in zip(deps, dep_futures):
+                if dep_future.exception() is not None:
+                    logging.warning(f"Skipping stage {name}: dependency {dep} failed")
+                    future.set_exception(dep_future.exception())
+                    return
+            args = [dep_future.result() for dep_future in dep_futures]
+            self.executor.submit(self._run, name, fn, args, future)
+
+        def on_dep_done(_):
+            with self._lock:
+                remaining[0] -= 1
+                ready = remaining[0] == 0
+            if ready:
+                start()
+
+        if not dep_futures:
+            start()
+        for dep_future in dep_futures:
+            dep_future.add_done_callback(on_dep_done)
+        return future
+
+    def _run(self, name, fn, args, future):
+        start = self._elapsed()
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            logging.error(f"Stage {name} failed: {str(e)}")
+            future.set_exception(e)
+            return
+        finally:
+            with self._lock:
+                self.timings[name] = {'start': start, 'end': self._elapsed()}
+        future.set_result(result)
+
+    def result(self, name, timeout=None):
+        return self.futures[name].result(timeout=timeout)
+
+    def wait(self, timeout=None):
+        for future in list(self.futures.values()):
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
+        return self.timings
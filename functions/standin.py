@@ -0,0 +1,453 @@
+import os
+import re
+import json
+import time
+import copy
+import random
+import hashlib
+import logging
+import threading
+import socketserver
+from uuid import uuid4
+from types import SimpleNamespace
+from datetime import datetime, timezone
+
+# Local stand-ins for every external service, so main.py and the process
+# scripts run on one box with no network (for load tests and development).
+# STANDIN selects which services are replaced, "all" or a comma-separated
+# subset of:
+#
+#   bucket     filesystem-backed Storage bucket under STANDIN_ROOT/bucket,
+#              signed URLs point at STANDIN_URL_BASE (file:// by default)
+#   firestore  in-memory Firestore (collections, documents, merge, where, batch)
+#   smtp       local SMTP sink writing .eml files to STANDIN_ROOT/mail
+#   ocr        Azure Read stand-in, STANDIN_OCR_LATENCY seconds per page and
+#              STANDIN_OCR_WORDS words of generated text
+#   llm        chat model stand-in, STANDIN_LLM_LATENCY seconds per call and
+#              STANDIN_LLM_WORDS words per answer; answers asking for JSON
+#              (timelines' Pydantic parsers) get an instance of the schema
+#
+# The process scripts still read API_KEY at import, so set it to any value.
+# This module only uses the standard library; nothing is replaced unless
+# STANDIN is set.
+
+SERVICES = ['bucket', 'firestore', 'smtp', 'ocr', 'llm']
+
+
+def enabled(service):
+    value = os.getenv('STANDIN', '').lower()
+    selected = SERVICES if value in ('all', 'true') else [item.strip() for item in value.split(',')]
+    return service in selected
+
+
+def root():
+    return os.getenv('STANDIN_ROOT', '/tmp/standin')
+
+
+# Storage
+
+class LocalBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.content_type = None
+        self.content_encoding = None
+
+    @property
+    def path(self):
+        return os.path.join(self.bucket.root, self.name)
+
+    @property
+    def size(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else None
+
+    @property
+    def updated(self):
+        return datetime.fromtimestamp(os.path.getmtime(self.path), timezone.utc) if os.path.exists(self.path) else None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def upload_from_string(self, data, content_type=None):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'wb') as f:
+            f.write(data.encode('utf-8') if isinstance(data, str) else data)
+        self.content_type = content_type
+
+    def upload_from_filename(self, filename, content_type=None):
+        with open(filename, 'rb') as f:
+            self.upload_from_string(f.read(), content_type)
+
+    def download_as_bytes(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def download_to_filename(self, filename):
+        with open(filename, 'wb') as f:
+            f.write(self.download_as_bytes())
+
+    def delete(self):
+        os.remove(self.path)
+
+    def generate_signed_url(self, expiration=None, **kwargs):
+        base = os.getenv('STANDIN_URL_BASE')
+        if base:
+            return f"{base.rstrip('/')}/{self.name}"
+        return f"file://{self.path}"
+
+
+class LocalBucket:
+    def __init__(self, directory, name='standin-bucket'):
+        self.name = name
+        self.root = os.path.join(directory, name)
+        self.client = SimpleNamespace(bucket=lambda bucket_name: LocalBucket(directory, bucket_name))
+        os.makedirs(self.root, exist_ok=True)
+
+    def blob(self, name):
+        return LocalBlob(self, name)
+
+    def get_blob(self, name):
+        blob = LocalBlob(self, name)
+        return blob if blob.exists() else None
+
+    def list_blobs(self, prefix=''):
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                name = os.path.relpath(os.path.join(directory, filename), self.root)
+                if name.startswith(prefix):
+                    yield LocalBlob(self, name)
+
+
+def bucket():
+    return LocalBucket(os.path.join(root(), 'bucket'), os.getenv('FIREBASE_STORAGE_BUCKET') or 'standin-bucket')
+
+
+# Firestore
+
+def _server_timestamp():
+    try:
+        from google.cloud.firestore_v1 import SERVER_TIMESTAMP
+        return SERVER_TIMESTAMP
+    except ImportError:
+        return None
+
+
+def _resolve(value, sentinel):
+    if sentinel is not None and value is sentinel:
+        return datetime.now(timezone.utc)
+    if isinstance(value, dict):
+        return {key: _resolve(item, sentinel) for key, item in value.items()}
+    return copy.deepcopy(value)
+
+
+def _merge(target, fields):
+    for key, value in fields.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+
+
+class Snapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+
+class DocumentRef:
+    def __init__(self, store, collection, doc_id):
+        self.store = store
+        self.collection = collection
+        self.id = doc_id
+
+    def set(self, fields, merge=False):
+        fields = _resolve(fields, self.store.sentinel)
+        with self.store.lock:
+            docs = self.store.collections.setdefault(self.collection, {})
+            if merge and self.id in docs:
+                _merge(docs[self.id], fields)
+            else:
+                docs[self.id] = fields
+
+    def update(self, fields):
+        self.set(fields, merge=True)
+
+    def get(self):
+        with self.store.lock:
+            return Snapshot(self.id, copy.deepcopy(self.store.collections.get(self.collection, {}).get(self.id)))
+
+    def delete(self):
+        with self.store.lock:
+            self.store.collections.get(self.collection, {}).pop(self.id, None)
+
+
+OPERATORS = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a is not None and a < b,
+    '<=': lambda a, b: a is not None and a <= b,
+    '>': lambda a, b: a is not None and a > b,
+    '>=': lambda a, b: a is not None and a >= b,
+    'in': lambda a, b: a in b,
+    'array_contains': lambda a, b: isinstance(a, list) and b in a,
+}
+
+
+class Query:
+    def __init__(self, store, collection, filters=()):
+        self.store = store
+        self.collection = collection
+        self.filters = list(filters)
+
+    def where(self, field, op, value):
+        return Query(self.store, self.collection, self.filters + [(field, OPERATORS[op], value)])
+
+    def stream(self):
+        with self.store.lock:
+            docs = list(self.store.collections.get(self.collection, {}).items())
+        for doc_id, data in docs:
+            if all(test(data.get(field), value) for field, test, value in self.filters):
+                yield Snapshot(doc_id, copy.deepcopy(data))
+
+    def get(self):
+        return list(self.stream())
+
+
+class CollectionRef(Query):
+    def document(self, doc_id=None):
+        return DocumentRef(self.store, self.collection, doc_id or uuid4().hex)
+
+    def add(self, fields):
+        doc = self.document()
+        doc.set(fields)
+        return None, doc
+
+
+class WriteBatch:
+    def __init__(self):
+        self.writes = []
+
+    def set(self, doc, fields, merge=False):
+        self.writes.append((doc, fields, merge))
+
+    def commit(self):
+        for doc, fields, merge in self.writes:
+            doc.set(fields, merge=merge)
+        self.writes = []
+
+
+class MemoryFirestore:
+    def __init__(self):
+        self.collections = {}
+        self.lock = threading.RLock()
+        self.sentinel = _server_timestamp()
+
+    def collection(self, name):
+        return CollectionRef(self, name)
+
+    def batch(self):
+        return WriteBatch()
+
+
+# SMTP
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    # Just enough SMTP for smtplib: no TLS, no auth, every message accepted
+    def reply(self, line):
+        self.wfile.write((line + '\r\n').encode('ascii'))
+
+    def handle(self):
+        self.reply('220 standin SMTP sink')
+        envelope = {'from': None, 'to': []}
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', errors='replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                self.reply('250-standin')
+                self.reply('250 8BITMIME')
+            elif verb in ('HELO', 'NOOP', 'RSET'):
+                if verb == 'RSET':
+                    envelope = {'from': None, 'to': []}
+                self.reply('250 OK')
+            elif verb == 'MAIL':
+                envelope['from'] = command[10:].strip()
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                envelope['to'].append(command[8:].strip())
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b'.\r\n', b'.\n'):
+                        break
+                    lines.append(data[1:] if data.startswith(b'..') else data)
+                self.server.sink.deliver(envelope, b''.join(lines))
+                envelope = {'from': None, 'to': []}
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SmtpSink:
+    def __init__(self, directory, port=0):
+        self.directory = directory
+        self.delivered = 0
+        os.makedirs(directory, exist_ok=True)
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', port), _SmtpHandler)
+        self.server.daemon_threads = True
+        self.server.sink = self
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, name='standin-smtp', daemon=True).start()
+        logging.info(f"Stand-in SMTP sink on 127.0.0.1:{self.port}, writing to {directory}")
+
+    def deliver(self, envelope, message):
+        path = os.path.join(self.directory, f"{time.time():.6f}_{uuid4().hex[:8]}.eml")
+        with open(path, 'wb') as f:
+            f.write(message)
+        self.delivered += 1
+        logging.info(f"Stand-in SMTP delivered mail to {envelope['to']}: {path}")
+
+
+_smtp_sink = None
+_smtp_lock = threading.Lock()
+
+
+def smtp_sink():
+    global _smtp_sink
+    with _smtp_lock:
+        if _smtp_sink is None:
+            _smtp_sink = SmtpSink(os.path.join(root(), 'mail'), int(os.getenv('STANDIN_SMTP_PORT', '0')))
+    return _smtp_sink
+
+
+def smtp_settings():
+    return {'host': '127.0.0.1', 'port': smtp_sink().port, 'starttls': False, 'user': None, 'password': None, 'debug': False}
+
+
+# Text generation shared by the OCR and LLM stand-ins
+
+WORDS = (
+    "officer report incident vehicle witness statement suspect victim scene evidence interview "
+    "arrived observed stated requested dispatched located recovered transported reviewed "
+    "the a and of to at on with was were from after before during"
+).split()
+
+
+def generate_text(seed, words):
+    rng = random.Random(seed)
+    day = rng.randint(1, 28)
+    text = [f"On 2023-{rng.randint(1, 12):02d}-{day:02d} at {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}"]
+    text += [rng.choice(WORDS) for _ in range(max(words - 1, 0))]
+    return ' '.join(text)
+
+
+def _seed(data):
+    return int(hashlib.sha256(data).hexdigest()[:16], 16)
+
+
+# Azure Read
+
+class FakeReadClient:
+    def __init__(self, latency=None, words=None):
+        self.latency = float(os.getenv('STANDIN_OCR_LATENCY', '0.5')) if latency is None else latency
+        self.words = int(os.getenv('STANDIN_OCR_WORDS', '300')) if words is None else words
+        self.operations = {}
+        self._lock = threading.Lock()
+
+    def read_in_stream(self, stream, raw=True):
+        operation_id = uuid4().hex
+        with self._lock:
+            self.operations[operation_id] = (time.time() + self.latency, _seed(stream.read()))
+        return SimpleNamespace(headers={'Operation-Location': f'https://standin/vision/v3.2/read/analyzeResults/{operation_id}'})
+
+    def get_read_result(self, operation_id):
+        with self._lock:
+            ready_at, seed = self.operations[operation_id]
+        # Wait out the latency here so the caller's 1s poll does not round it up
+        time.sleep(max(ready_at - time.time(), 0))
+        with self._lock:
+            self.operations.pop(operation_id, None)
+
+        words = generate_text(seed, self.words).split()
+        lines = [
+            SimpleNamespace(bounding_box=[0, y, 0, y, 0, y, 0, y], words=[SimpleNamespace(text=word) for word in words[i:i + 12]])
+            for y, i in enumerate(range(0, len(words), 12))
+        ]
+        read_result = SimpleNamespace(page=1, lines=lines)
+        return SimpleNamespace(status='succeeded', analyze_result=SimpleNamespace(read_results=[read_result]))
+
+    def list_models(self):
+        return []
+
+    def close(self):
+        pass
+
+
+# Chat model
+
+def _schema_instance(schema, definitions, name=''):
+    if '$ref' in schema:
+        return _schema_instance(definitions[schema['$ref'].split('/')[-1]], definitions, name)
+    if 'allOf' in schema:
+        return _schema_instance(schema['allOf'][0], definitions, name)
+    if 'anyOf' in schema:
+        return _schema_instance(schema['anyOf'][0], definitions, name)
+    kind = schema.get('type')
+    if kind == 'object' or 'properties' in schema:
+        return {key: _schema_instance(value, definitions, key) for key, value in schema.get('properties', {}).items()}
+    if kind == 'array':
+        return [_schema_instance(schema.get('items', {}), definitions, name)]
+    if kind == 'integer':
+        return 1
+    if kind == 'number':
+        return 1.0
+    if kind == 'boolean':
+        return True
+    if 'date' in name.lower():
+        return '2023-01-01'
+    if 'page' in name.lower():
+        return '1'
+    return f"Stand-in {name or 'value'}"
+
+
+def structured_answer(prompt):
+    # PydanticOutputParser puts the JSON schema in the prompt; answer with a
+    # minimal instance of it so the parser downstream succeeds
+    match = re.search(r'```\s*(\{.*\})\s*```', prompt, re.DOTALL)
+    if not match or 'properties' not in match.group(1):
+        return None
+    try:
+        schema = json.loads(match.group(1))
+    except json.JSONDecodeError:
+        return None
+    definitions = dict(schema.get('definitions', {}), **schema.get('$defs', {}))
+    return json.dumps(_schema_instance(schema, definitions))
+
+
+class FakeChatModel:
+    def __init__(self, latency=None, words=None):
+        self.latency = float(os.getenv('STANDIN_LLM_LATENCY', '1.0')) if latency is None else latency
+        self.words = int(os.getenv('STANDIN_LLM_WORDS', '120')) if words is None else words
+
+    def invoke(self, value):
+        from langchain_core.messages import AIMessage
+
+        prompt = value.to_string() if hasattr(value, 'to_string') else str(value)
+        time.sleep(self.latency)
+        answer = structured_answer(prompt) or generate_text(_seed(prompt.encode('utf-8')), self.words)
+        return AIMessage(content=answer)
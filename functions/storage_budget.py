@@ -0,0 +1,191 @@
+import os
+import time
+import logging
+import threading
+
+# Temp-storage budget. Every file in flight keeps its original upload, OCR
+# JSON, processed JSON and summary PDF in a temp directory (or in memory),
+# and /tmp on Cloud Functions is RAM, so a handful of large files at once can
+# take the instance down. Before a file gets its temp directory it reserves
+# an estimate (STORAGE_BYTES_PER_PAGE per page) against this instance's
+# STORAGE_BUDGET_BYTES and waits while the budget is spent. As artifacts are
+# written the reservation grows to their actual size if the estimate was
+# short, and each artifact is discarded (and its bytes returned) as soon as
+# its uploads and readers are done rather than when the file finishes.
+#
+# Everything else that lives in the same /tmp is charged as standing usage
+# under a name: the job spool and the local outbox by the bytes they hold,
+# the local result cache and checkpoints by the cap they evict down to.
+# Standing charges never wait (the bytes already exist); they only leave
+# less room for new files.
+
+BYTES_PER_PAGE = int(os.getenv('STORAGE_BYTES_PER_PAGE', str(512 * 1024)))
+
+# Longest a file waits for room before going ahead over budget
+WAIT_SECONDS = float(os.getenv('STORAGE_WAIT_SECONDS', '300'))
+
+
+def default_budget_bytes():
+    # Half of physical memory, since that is what /tmp is made of
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // 2
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+
+class Lease:
+    def __init__(self, budget, reserved):
+        self.budget = budget
+        self.reserved = reserved
+        self.sizes = {}
+        self.released = False
+
+    @property
+    def used(self):
+        return sum(self.sizes.values())
+
+    def track(self, artifact):
+        # Charge an artifact at its current size; calling again after it
+        # changes charges the difference
+        size = artifact.size()
+        with self.budget._lock:
+            if self.released:
+                return
+            self.sizes[artifact.path] = size
+            self._settle()
+
+    def discard(self, artifact):
+        # The artifact is uploaded and read; free it now, and with it the
+        # part of the reservation that was set aside for it
+        freed = self.sizes.get(artifact.path, artifact.size())
+        artifact.discard()
+        with self.budget._lock:
+            if self.released:
+                return
+            self.sizes.pop(artifact.path, None)
+            held = self.reserved
+            self.reserved = max(held - freed, 0)
+            self.budget.in_use -= held - self.reserved
+            self._settle()
+            self.budget._room.notify_all()
+
+    def _settle(self):
+        # Holds whichever is larger, what is left of the estimate or what is
+        # actually on disk; called with the budget lock held
+        held = max(self.reserved, self.used)
+        self.budget.in_use += held - self.reserved
+        self.reserved = held
+        self.budget.peak = max(self.budget.peak, self.budget.in_use)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def release(self):
+        with self.budget._lock:
+            if self.released:
+                return
+            self.released = True
+            self.budget.in_use -= self.reserved
+            self.budget.active -= 1
+            self.reserved = 0
+            self.budget._room.notify_all()
+
+
+class StorageBudget:
+    def __init__(self, max_bytes):
+        # max_bytes <= 0 keeps the accounting but never waits
+        self.max_bytes = max_bytes
+        self.in_use = 0
+        self.peak = 0
+        self.active = 0
+        self.waiting = 0
+        self.waited = 0
+        self.overdrawn = 0
+        self.standing = {}
+        self._lock = threading.Lock()
+        self._room = threading.Condition(self._lock)
+
+    def _fits(self, nbytes):
+        # A file bigger than what is left still runs when no other file is in
+        # flight; standing usage alone never holds work back forever
+        return self.max_bytes <= 0 or not self.active or self.in_use + nbytes <= self.max_bytes
+
+    def acquire(self, nbytes, timeout=None):
+        timeout = WAIT_SECONDS if timeout is None else min(timeout, WAIT_SECONDS)
+        give_up = time.monotonic() + timeout
+        with self._lock:
+            if not self._fits(nbytes):
+                self.waiting += 1
+                self.waited += 1
+                logging.info(f"Waiting for {nbytes} bytes of temp storage ({self.in_use}/{self.max_bytes} in use)")
+                try:
+                    while not self._fits(nbytes):
+                        remaining = give_up - time.monotonic()
+                        if remaining <= 0:
+                            logging.warning(f"Temp storage still over budget after {timeout:.0f}s, going ahead with {nbytes} bytes")
+                            self.overdrawn += 1
+                            break
+                        self._room.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.in_use += nbytes
+            self.peak = max(self.peak, self.in_use)
+            self.active += 1
+            return Lease(self, nbytes)
+
+    def charge(self, name, nbytes):
+        with self._lock:
+            self.standing[name] = self.standing.get(name, 0) + nbytes
+            self.in_use += nbytes
+            self.peak = max(self.peak, self.in_use)
+
+    def credit(self, name, nbytes):
+        with self._lock:
+            nbytes = min(nbytes, self.standing.get(name, 0))
+            self.standing[name] = self.standing.get(name, 0) - nbytes
+            self.in_use -= nbytes
+            self._room.notify_all()
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'bytesInUse': self.in_use,
+                'standingBytes': dict(self.standing),
+                'maxBytes': self.max_bytes,
+                'peakBytes': self.peak,
+                'active': self.active,
+                'waiting': self.waiting,
+                'waited': self.waited,
+                'overdrawn': self.overdrawn,
+            }
+
+
+def create_storage_budget():
+    value = os.getenv('STORAGE_BUDGET_BYTES')
+    max_bytes = int(value) if value is not None else default_budget_bytes()
+    if max_bytes > 0:
+        logging.info(f"Temp storage budget: {max_bytes} bytes, {BYTES_PER_PAGE} bytes per page estimate")
+    else:
+        logging.info("Temp storage budget disabled")
+    return StorageBudget(max_bytes)
+
+
+def estimate_bytes(pages):
+    return max(pages, 1) * BYTES_PER_PAGE
+
+
+def directory_bytes(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
+
+
+budget = create_storage_budget()
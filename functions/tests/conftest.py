@@ -0,0 +1,35 @@
+import io
+import os
+import sys
+import pytest
+
+FUNCTIONS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The function's modules are flat files next to main.py
+sys.path.insert(0, FUNCTIONS_DIR)
+
+
+@pytest.fixture
+def standin_env(tmp_path, monkeypatch):
+    # Every external service replaced by its local stand-in under tmp_path
+    import firebase_clients
+
+    monkeypatch.setenv('STANDIN', 'all')
+    monkeypatch.setenv('STANDIN_ROOT', str(tmp_path / 'standin'))
+    monkeypatch.setattr(firebase_clients, '_firestore_client', None)
+    monkeypatch.setattr(firebase_clients, '_bucket', None)
+    return tmp_path
+
+
+def load_main(monkeypatch):
+    # main.py rewraps stdout/stderr at import; give it throwaway streams to
+    # wrap so pytest's own are not closed with the wrappers, and put pytest's
+    # back right after so nothing imported later holds on to the throwaways
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = io.TextIOWrapper(io.BytesIO()), io.TextIOWrapper(io.BytesIO())
+    monkeypatch.delitem(sys.modules, 'main', raising=False)
+    try:
+        import main
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+    return main
@@ -0,0 +1,66 @@
+import pytest
+
+flask = pytest.importorskip('flask')
+
+import admission
+import jobs
+
+PARAMS = {'script': 'process-brief.py', 'model': 'claude', 'custom_template': 'template'}
+
+
+class Upload:
+    def __init__(self, pages):
+        self.filename = 'a.pdf'
+        self.estimated_pages = pages
+
+
+def test_admits_until_the_page_budget_is_used():
+    controller = admission.AdmissionController(max_pages=10, pages_per_second=1.0)
+    first = controller.try_admit(6)
+    assert controller.try_admit(4) is not None
+    assert controller.try_admit(1) is None
+    controller.release(first)
+    controller.release(first)
+    assert controller.pages_in_flight == 4
+    assert controller.metrics()['rejected'] == 1
+
+
+def test_oversized_request_runs_on_an_idle_instance():
+    controller = admission.AdmissionController(max_pages=10, pages_per_second=1.0)
+    ticket = controller.try_admit(50)
+    assert ticket is not None
+    assert controller.try_admit(1) is None
+    controller.release(ticket)
+
+
+def test_rejection_is_a_429_with_retry_after():
+    controller = admission.AdmissionController(max_pages=10, pages_per_second=2.0)
+    ticket, rejected = admission.admit(controller, [Upload(8)], {})
+    assert rejected is None
+
+    with flask.Flask(__name__).app_context():
+        _, rejected = admission.admit(controller, [Upload(6)], {'Access-Control-Allow-Origin': '*'})
+    response, status, headers = rejected
+    # 4 of the 8 pages in flight must drain at 2 pages/s
+    assert status == 429
+    assert headers['Retry-After'] == '2'
+    assert response.get_json()['retryAfter'] == 2
+    admission.release(controller, ticket)
+    assert controller.pages_in_flight == 0
+
+
+class BrokenQueue:
+    def submit(self, *args, **kwargs):
+        raise OSError('No space left on device')
+
+
+def test_job_ticket_is_released_when_spooling_fails():
+    controller = admission.AdmissionController(max_pages=10, pages_per_second=1.0)
+    with flask.Flask(__name__).test_request_context('/jobs', method='POST'):
+        with pytest.raises(OSError):
+            jobs.handle_job_request(
+                flask.request, {}, jobs.LocalJobStore(), BrokenQueue(), PARAMS, [Upload(5)], None,
+                admission_controller=controller
+            )
+    assert controller.pages_in_flight == 0
+    assert controller.active == 0
@@ -0,0 +1,121 @@
+import io
+import os
+import time
+import hashlib
+import pytest
+import checkpoints
+import standin
+import storage_budget
+
+
+@pytest.fixture
+def local_backend(tmp_path):
+    backend = checkpoints.LocalCheckpointBackend(str(tmp_path / 'checkpoints'), 1000)
+    yield backend
+    storage_budget.budget.credit('checkpoints', backend.max_bytes)
+
+
+@pytest.fixture
+def bucket_backend(tmp_path):
+    bucket = standin.LocalBucket(str(tmp_path / 'gcs'))
+    return checkpoints.BucketCheckpointBackend(lambda: bucket, 'checkpoints')
+
+
+def age(path, seconds):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+@pytest.mark.parametrize('backend_name', ['local_backend', 'bucket_backend'])
+def test_save_load_and_clear(backend_name, request):
+    checkpoint = checkpoints.Checkpoint(request.getfixturevalue(backend_name), 'job/abc')
+    assert checkpoint.load('ocr') is None
+    checkpoint.save('ocr', {'pages': 3})
+    checkpoint.child('process-brief.py', 'digest').save('batch_0', ['summary'])
+    assert checkpoint.load('ocr') == {'pages': 3}
+    assert checkpoint.child('process-brief.py', 'digest').load('batch_0') == ['summary']
+
+    checkpoint.clear()
+    assert checkpoint.load('ocr') is None
+    assert checkpoint.child('process-brief.py', 'digest').load('batch_0') is None
+
+
+def test_stale_versions_are_ignored(local_backend, monkeypatch):
+    checkpoint = checkpoints.Checkpoint(local_backend, 'job')
+    checkpoint.save('ocr', {'pages': 3})
+    monkeypatch.setattr(checkpoints, 'CHECKPOINT_VERSION', '2')
+    assert checkpoint.load('ocr') is None
+
+
+def test_cut_short_stages_are_not_saved(local_backend):
+    checkpoint = checkpoints.Checkpoint(local_backend, 'job')
+    assert checkpoint.cached('memory_log', lambda: 'partial', complete=lambda: False) == 'partial'
+    assert checkpoint.load('memory_log') is None
+    assert checkpoint.cached('memory_log', lambda: 'full') == 'full'
+    assert checkpoint.cached('memory_log', lambda: 'recomputed') == 'full'
+
+
+def test_job_ids_are_kept_to_a_safe_alphabet():
+    assert checkpoints.file_checkpoint_key('../../etc', 'hash', 'result') == '______etc/hash'
+    assert checkpoints.file_checkpoint_key(None, 'hash', 'result') == 'result'
+
+
+def test_local_backend_evicts_oldest_at_the_cap(local_backend):
+    local_backend.put('old/ocr.json', b'x' * 600)
+    age(os.path.join(local_backend.root, 'old/ocr.json'), 60)
+    local_backend.put('new/ocr.json', b'x' * 600)
+    assert local_backend.get('old/ocr.json') is None
+    assert local_backend.get('new/ocr.json') is not None
+
+
+def test_local_sweep_removes_expired_checkpoints(local_backend):
+    local_backend.put('abandoned/ocr.json', b'{}')
+    local_backend.put('recent/ocr.json', b'{}')
+    age(os.path.join(local_backend.root, 'abandoned/ocr.json'), 3600)
+    assert local_backend.sweep(600) == 1
+    assert not os.path.exists(os.path.join(local_backend.root, 'abandoned'))
+    assert local_backend.get('recent/ocr.json') == b'{}'
+
+
+def test_bucket_sweep_removes_expired_checkpoints(bucket_backend):
+    bucket_backend.put('abandoned/ocr.json', b'{}')
+    bucket_backend.put('recent/ocr.json', b'{}')
+    age(bucket_backend.bucket.blob('checkpoints/abandoned/ocr.json').path, 3600)
+    assert bucket_backend.sweep(600) == 1
+    assert bucket_backend.get('abandoned/ocr.json') is None
+    assert bucket_backend.get('recent/ocr.json') == b'{}'
+
+
+def test_sweep_runs_at_most_once_per_interval(local_backend, monkeypatch):
+    swept = []
+    monkeypatch.setattr(checkpoints, '_swept_at', None)
+    monkeypatch.setattr(checkpoints, 'sweep_expired', swept.append)
+    monkeypatch.setattr(checkpoints, '_backend', local_backend)
+    checkpoints.open_checkpoint('a')
+    checkpoints.open_checkpoint('b')
+    deadline = time.monotonic() + 5
+    while not swept and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert swept == [local_backend]
+
+
+def test_failed_file_clears_its_checkpoints(standin_env, local_backend, monkeypatch):
+    pytest.importorskip('flask')
+    pytest.importorskip('functions_framework')
+    from conftest import load_main
+    from werkzeug.datastructures import FileStorage
+
+    main = load_main(monkeypatch)
+    monkeypatch.setattr(checkpoints, '_backend', local_backend)
+    monkeypatch.setattr(main, 'result_cache_store', None)
+    monkeypatch.setattr(main, 'run_pipeline', lambda *args, **kwargs: None)
+    monkeypatch.setenv('PIPELINE_STREAMING', 'false')
+    monkeypatch.setenv('IN_MEMORY_PIPELINE', 'false')
+
+    data = b'%PDF-1.4'
+    key = checkpoints.file_checkpoint_key('job', hashlib.sha256(data).hexdigest(), None)
+    checkpoints.Checkpoint(local_backend, key).save('ocr', {'pages': []})
+
+    upload = FileStorage(io.BytesIO(data), filename='a.pdf')
+    assert main.handle_file(upload, 'process-brief.py', 'claude', 'template', 'false', None, 'req', job_id='job') is None
+    assert checkpoints.Checkpoint(local_backend, key).load('ocr') is None
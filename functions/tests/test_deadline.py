@@ -0,0 +1,50 @@
+import time
+import pytest
+import deadline as deadlines
+
+
+def test_work_is_skipped_once_time_is_low():
+    deadline = deadlines.Deadline(time.time() + 30, reserve_seconds=60)
+    document = deadline.scope()
+    assert document.call(lambda x: x * 2, 2) is None
+    assert document.partial
+    # Scopes share the expiry but not the skip count
+    assert not deadline.partial
+    assert deadlines.Deadline(time.time() + 120, reserve_seconds=60).call(lambda: 'ran') == 'ran'
+
+
+def test_no_deadline_never_runs_out():
+    assert not deadlines.NO_DEADLINE.low()
+    assert deadlines.NO_DEADLINE.timeout() is None
+    assert deadlines.NO_DEADLINE.env() == {}
+
+
+def test_subprocess_timeout_keeps_the_tail(monkeypatch):
+    monkeypatch.setattr(deadlines, 'TAIL_SECONDS', 15)
+    assert 80 < deadlines.Deadline(time.time() + 100).timeout() <= 85
+    assert deadlines.Deadline(time.time() + 5).timeout() == 1
+
+
+def test_deadline_reaches_subprocesses_through_the_environment(monkeypatch):
+    deadline = deadlines.from_seconds(100)
+    for name, value in deadline.env().items():
+        monkeypatch.setenv(name, value)
+    assert deadlines.from_env().expires_at == pytest.approx(deadline.expires_at)
+
+
+@pytest.mark.parametrize('requested, background, expected', [
+    (None, False, 540),
+    ('60', False, 60),
+    ('6000', False, 540),
+    ('soon', False, 540),
+    (None, True, None),
+    ('6000', True, 6000),
+])
+def test_request_and_job_deadlines(requested, background, expected, monkeypatch):
+    monkeypatch.delenv('REQUEST_DEADLINE_SECONDS', raising=False)
+    monkeypatch.delenv('JOB_DEADLINE_SECONDS', raising=False)
+    deadline = deadlines.from_request_params({'deadline_seconds': requested}, background)
+    if expected is None:
+        assert deadline is deadlines.NO_DEADLINE
+    else:
+        assert deadline.remaining() == pytest.approx(expected, abs=1)
@@ -0,0 +1,81 @@
+import io
+import pytest
+import estimator
+from types import SimpleNamespace
+
+
+class Upload:
+    # The parts of an upload estimate_pages looks at
+    def __init__(self, filename, data=b'', content_length=None, blob=None):
+        self.filename = filename
+        self.stream = io.BytesIO(data)
+        self.content_length = content_length
+        self.blob = blob
+
+
+def test_pages_are_counted_from_the_pdf():
+    fitz = pytest.importorskip('fitz')
+    doc = fitz.open()
+    for _ in range(3):
+        doc.new_page()
+    pdf = Upload('three.pdf', doc.tobytes())
+    assert estimator.estimate_pages(pdf) == 3
+    assert pdf.estimated_pages == 3
+    assert pdf.stream.tell() == 0
+
+
+def test_pages_are_estimated_from_the_size_otherwise():
+    assert estimator.estimate_pages(Upload('scan.PNG')) == 1
+    assert estimator.estimate_pages(Upload('broken.pdf', b'not a pdf', content_length=250 * 1024)) == 3
+    remote = Upload('remote.pdf', blob=SimpleNamespace(size=10 * estimator.BYTES_PER_PAGE_ESTIMATE))
+    assert estimator.estimate_pages(remote) == 10
+
+
+@pytest.fixture
+def counters(monkeypatch):
+    counters = estimator.events.EventCounters()
+    monkeypatch.setattr(estimator.events, 'counters', counters)
+    return counters
+
+
+def test_per_page_scripts_make_calls_per_page(counters):
+    quote = estimator.estimate([('a.pdf', 10)], ['process-comprehensive.py', 'timelines.py'])
+    scripts = quote['files'][0]['scripts']
+    assert scripts['process-comprehensive.py']['llm_calls'] == 20
+    # One call per page plus one per estimated distinct date
+    assert scripts['timelines.py']['llm_calls'] == 10 + 5
+    assert quote['llm_calls'] == 35
+    assert quote['usd'] > 0
+
+
+def test_longer_documents_cost_more(counters):
+    short, long = (estimator.estimate([(None, pages)], ['process-brief.py'])['files'][0] for pages in (5, 50))
+    assert long['llm_calls'] > short['llm_calls']
+    assert long['seconds'] > short['seconds']
+    assert long['usd'] > short['usd']
+
+
+def test_files_share_the_workers(counters):
+    quote = estimator.estimate([('a.pdf', 10), ('b.pdf', 10)], ['process-detailed.py'], workers=1)
+    assert quote['seconds'] == pytest.approx(sum(file['seconds'] for file in quote['files']), abs=0.1)
+    quote = estimator.estimate([('a.pdf', 10), ('b.pdf', 10)], ['process-detailed.py'], workers=4)
+    assert quote['seconds'] == max(file['seconds'] for file in quote['files'])
+
+
+def test_calibrates_from_recorded_events(counters):
+    assert not estimator.calibration()['calibrated']
+    assert estimator.calibration()['llm_seconds_per_call'] == estimator.LLM_SECONDS_PER_CALL
+
+    for _ in range(estimator.MIN_SAMPLES):
+        counters.record({'event': estimator.events.LLM_CALL, 'seconds': 2.0})
+    counters.record({'event': estimator.events.PAGES_DONE, 'stage': 'ocr', 'pages': estimator.MIN_SAMPLES})
+    counters.record({'event': estimator.events.STAGE_FINISH, 'stage': 'ocr', 'seconds': estimator.MIN_SAMPLES * 0.5})
+    rates = estimator.calibration()
+    assert rates['calibrated']
+    assert rates['llm_seconds_per_call'] == pytest.approx(2.0)
+    assert rates['ocr_seconds_per_page'] == pytest.approx(0.5)
+
+
+def test_unknown_script_is_refused():
+    with pytest.raises(ValueError):
+        estimator.script_stages('process-unknown.py', 10, 4)
@@ -0,0 +1,67 @@
+import os
+import sys
+import pytest
+import events
+from concurrent.futures import ThreadPoolExecutor
+from conftest import FUNCTIONS_DIR
+
+
+def test_listener_gets_events_from_bound_pool_threads():
+    received = []
+    with ThreadPoolExecutor(max_workers=2) as executor, events.listening(received.append):
+        executor.submit(events.bind(events.emit), events.PAGES_DONE, stage='ocr', pages=1).result()
+        # Unbound work does not see the handler
+        executor.submit(events.emit, events.PAGES_DONE, stage='ocr', pages=1).result()
+    events.emit(events.PAGES_DONE, stage='ocr', pages=1)
+    assert [(event['event'], event['pages']) for event in received] == [(events.PAGES_DONE, 1)]
+
+
+def test_failing_listener_does_not_break_the_emitter():
+    def broken(event):
+        raise RuntimeError('listener bug')
+
+    with events.listening(broken):
+        events.emit(events.LLM_CALL, seconds=0.5)
+
+
+def test_stage_reports_start_finish_and_errors():
+    received = []
+    with events.listening(received.append):
+        with events.stage('memory_log'):
+            pass
+        with pytest.raises(ValueError):
+            with events.stage('summaries'):
+                raise ValueError('bad page')
+    assert [(event['event'], event['stage']) for event in received] == [
+        (events.STAGE_START, 'memory_log'), (events.STAGE_FINISH, 'memory_log'),
+        (events.STAGE_START, 'summaries'), (events.ERROR, 'summaries'),
+    ]
+    assert received[3]['message'] == 'bad page'
+
+
+def test_counters():
+    counters = events.EventCounters()
+    counters.record({'event': events.PAGES_DONE, 'stage': 'ocr', 'pages': 3})
+    counters.record({'event': events.LLM_CALL, 'seconds': 1.5})
+    counters.record({'event': events.STAGE_FINISH, 'stage': 'ocr', 'seconds': 2.0})
+    metrics = counters.metrics()
+    assert metrics['pages_done'] == {'ocr': 3}
+    assert (metrics['llm_calls'], metrics['llm_seconds']) == (1, 1.5)
+    assert metrics['stage_seconds'] == {'ocr': 2.0}
+
+
+def test_subprocess_events_arrive_over_the_pipe():
+    script = (
+        "import sys, events\n"
+        "events.emit(events.PAGES_DONE, stage='ocr', pages=2)\n"
+        "print('not an event')\n"
+        "sys.stderr.write('e' * 20000)\n"
+        "sys.exit(3)\n"
+    )
+    received = []
+    returncode, stderr = events.run_subprocess(
+        [sys.executable, '-c', script], env=dict(os.environ, PYTHONPATH=FUNCTIONS_DIR), on_event=received.append
+    )
+    assert returncode == 3
+    assert len(stderr) == events.STDERR_TAIL_BYTES
+    assert [(event['event'], event['pages']) for event in received] == [(events.PAGES_DONE, 2)]
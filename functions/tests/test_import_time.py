@@ -0,0 +1,29 @@
+import os
+import sys
+import subprocess
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('firebase_admin')
+pytest.importorskip('functions_framework')
+
+import check_import_time
+
+# Deferred to first use; importing any of them at startup is a cold-start regression
+DEFERRED = ['firebase_admin', 'google.cloud.firestore', 'google.cloud.storage', 'langchain_core', 'fitz', 'reportlab']
+
+
+def test_main_imports_within_budget():
+    budget = float(os.getenv('IMPORT_BUDGET_SECONDS', '1.0'))
+    seconds = min(check_import_time.measure('main') for _ in range(3))
+    slowest = '\n'.join(f"{cumulative:>10}  {name}" for cumulative, name in check_import_time.slowest_imports('main'))
+    assert seconds <= budget, f"import main took {seconds:.3f}s (budget {budget:.3f}s); slowest imports:\n{slowest}"
+
+
+def test_main_defers_heavy_imports():
+    result = subprocess.run(
+        [sys.executable, '-c', f"import sys, main; print([m for m in {DEFERRED!r} if m in sys.modules])"],
+        cwd=check_import_time.SCRIPT_DIR, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == '[]'
@@ -0,0 +1,64 @@
+import pytest
+import ingest
+import standin
+
+
+@pytest.fixture
+def bucket(tmp_path):
+    bucket = standin.LocalBucket(str(tmp_path / 'gcs'), 'app-bucket')
+    bucket.blob('incoming/user/report.pdf').upload_from_string(b'%PDF-1.4')
+    bucket.blob('processed_output/other.json').upload_from_string(b'[]')
+    return bucket
+
+
+def test_object_under_the_prefix_is_ingested(bucket, tmp_path):
+    upload = ingest.ObjectUpload('gs://app-bucket/incoming/user/report.pdf', bucket)
+    assert upload.filename == 'report.pdf'
+    assert upload.blob.size == 8
+    upload.save(str(tmp_path / 'copy.pdf'))
+    assert (tmp_path / 'copy.pdf').read_bytes() == b'%PDF-1.4'
+
+
+@pytest.mark.parametrize('object_path', [
+    'gs://app-bucket/processed_output/other.json',
+    'gs://app-bucket/incoming/../processed_output/other.json',
+    'gs://app-bucket/incoming/./user/report.pdf',
+    'gs://app-bucket//incoming/user/report.pdf',
+    'gs://app-bucket/incoming//report.pdf',
+    'gs://app-bucket/',
+    'gs://other-bucket/incoming/user/report.pdf',
+])
+def test_objects_outside_the_prefix_are_refused(bucket, object_path):
+    with pytest.raises(ValueError):
+        ingest.ObjectUpload(object_path, bucket)
+
+
+def test_missing_object_is_refused(bucket):
+    with pytest.raises(ValueError, match='not found'):
+        ingest.ObjectUpload('gs://app-bucket/incoming/user/missing.pdf', bucket)
+
+
+def test_oversized_object_is_refused(bucket, monkeypatch):
+    monkeypatch.setattr(ingest, 'INGEST_MAX_BYTES', 4)
+    with pytest.raises(ValueError, match='too large'):
+        ingest.ObjectUpload('gs://app-bucket/incoming/user/report.pdf', bucket)
+
+
+def test_local_paths_stay_under_the_local_root(bucket, tmp_path, monkeypatch):
+    root = tmp_path / 'local'
+    root.mkdir()
+    (root / 'a.pdf').write_bytes(b'%PDF-1.4')
+    (tmp_path / 'secret.pdf').write_bytes(b'secret')
+
+    with pytest.raises(ValueError, match='disabled'):
+        ingest.ObjectUpload(str(root / 'a.pdf'), bucket)
+
+    monkeypatch.setenv('INGEST_LOCAL_ROOT', str(root))
+    assert ingest.ObjectUpload(str(root / 'a.pdf'), bucket).read() == b'%PDF-1.4'
+    for path in (str(tmp_path / 'secret.pdf'), str(root / '..' / 'secret.pdf'), '/etc/passwd'):
+        with pytest.raises(ValueError, match='outside'):
+            ingest.ObjectUpload(path, bucket)
+
+    monkeypatch.setattr(ingest, 'INGEST_MAX_BYTES', 4)
+    with pytest.raises(ValueError, match='too large'):
+        ingest.ObjectUpload(str(root / 'a.pdf'), bucket)
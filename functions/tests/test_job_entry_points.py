@@ -0,0 +1,65 @@
+import io
+import os
+import importlib.util
+import pytest
+
+flask = pytest.importorskip('flask')
+firebase_admin = pytest.importorskip('firebase_admin')
+pytest.importorskip('functions_framework')
+
+from conftest import FUNCTIONS_DIR, load_main
+import jobs
+import standin
+
+PARAMS = {
+    'script': 'process-brief.py',
+    'model': 'claude',
+    'custom_template': 'template',
+    'send_email': 'false',
+    'user_email': 'user@example.com',
+    'client_id': None,
+    'job_id': None,
+    'deadline_seconds': None,
+}
+
+
+def load_main_pdf(monkeypatch):
+    # main-pdf.py builds its Firebase clients at import; hand it the stand-ins
+    from firebase_admin import firestore, storage
+
+    monkeypatch.setattr(firebase_admin, '_apps', {'[DEFAULT]': object()})
+    monkeypatch.setattr(firestore, 'client', standin.MemoryFirestore)
+    monkeypatch.setattr(storage, 'bucket', standin.bucket)
+    spec = importlib.util.spec_from_file_location('main_pdf', os.path.join(FUNCTIONS_DIR, 'main-pdf.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.mark.parametrize('load', [load_main, load_main_pdf], ids=['uploadEmail', 'uploadFunction'])
+def test_job_runs_through_each_entry_point(load, standin_env, monkeypatch):
+    module = load(monkeypatch)
+    handled = []
+
+    def handle_file(file, *args):
+        handled.append(file.filename)
+        return {'filename': file.filename, 'processedData': '[]'}
+
+    monkeypatch.setattr(module, 'handle_file', handle_file)
+    store = jobs.LocalJobStore()
+    queue = jobs.JobQueue(store, max_workers=1)
+
+    app = flask.Flask(__name__)
+    data = {'files': (io.BytesIO(b'%PDF-1.4'), 'a.pdf')}
+    with app.test_request_context('/jobs', method='POST', data=data, content_type='multipart/form-data'):
+        request = flask.request
+        response, status, _ = jobs.handle_job_request(
+            request, {}, store, queue, PARAMS, request.files.getlist('files'), module.process_uploads
+        )
+    queue.executor.shutdown(wait=True)
+
+    assert status == 202
+    job = store.get(response.get_json()['jobId'])
+    assert job['status'] == jobs.JOB_DONE, job.get('error')
+    assert handled == ['a.pdf']
+    assert [result['filename'] for result in job['results']] == ['a.pdf']
@@ -0,0 +1,97 @@
+import io
+import os
+import pytest
+
+flask = pytest.importorskip('flask')
+
+import jobs
+import storage_budget
+from werkzeug.datastructures import FileStorage
+
+PARAMS = {'script': 'process-brief.py', 'model': 'claude', 'custom_template': 'template'}
+
+
+def upload(name='a.pdf', data=b'%PDF-1.4'):
+    return FileStorage(io.BytesIO(data), filename=name)
+
+
+def run_job(store, files, run):
+    queue = jobs.JobQueue(store, max_workers=1)
+    queue.submit('job', files, run, script='process-brief.py')
+    queue.executor.shutdown(wait=True)
+    return store.get('job')
+
+
+def test_parse_job_path():
+    assert jobs.parse_job_path('/uploadEmail') is None
+    assert jobs.parse_job_path('/jobs') == (None, None)
+    assert jobs.parse_job_path('/uploadEmail/jobs/abc/result') == ('abc', 'result')
+
+
+def test_local_store_merges_nested_fields():
+    store = jobs.LocalJobStore()
+    store.create('job', {'files': {'a.pdf': {'stage': 'ocr'}}})
+    store.update('job', {'files': {'b.pdf': {'stage': 'ocr'}}})
+    store.update('job', {'files': {'a.pdf': {'stage': 'summarizing'}}})
+    assert store.get('job')['files'] == {'a.pdf': {'stage': 'summarizing'}, 'b.pdf': {'stage': 'ocr'}}
+
+
+def test_job_sees_spooled_copies_and_reports_progress():
+    store = jobs.LocalJobStore()
+    seen = {}
+
+    def run(files, progress):
+        seen['data'] = files[0].read()
+        seen['path'] = files[0].path
+        progress('a.pdf', 'ocr', {'pagesDone': 2})
+        return [{'filename': 'a.pdf'}]
+
+    job = run_job(store, [upload()], run)
+    assert job['status'] == jobs.JOB_DONE
+    assert job['results'] == [{'filename': 'a.pdf'}]
+    assert job['filenames'] == ['a.pdf']
+    assert job['files']['a.pdf']['pagesDone'] == 2
+    assert seen['data'] == b'%PDF-1.4'
+    # The spool is removed once the job finishes
+    assert not os.path.exists(seen['path'])
+
+
+def test_failed_job_records_the_error_and_frees_the_spool():
+    store = jobs.LocalJobStore()
+    before = storage_budget.budget.standing.get('spool', 0)
+
+    def run(files, progress):
+        raise RuntimeError('ocr unavailable')
+
+    job = run_job(store, [upload()], run)
+    assert job['status'] == jobs.JOB_FAILED
+    assert job['error'] == 'ocr unavailable'
+    assert storage_budget.budget.standing.get('spool', 0) == before
+
+
+def request_context(path, method='GET', **kwargs):
+    return flask.Flask(__name__).test_request_context(path, method=method, **kwargs)
+
+
+def test_status_and_result_routes():
+    store = jobs.LocalJobStore()
+    store.create('running', {'jobId': 'running', 'status': jobs.JOB_RUNNING, 'stage': 'ocr'})
+    store.create('done', {'jobId': 'done', 'status': jobs.JOB_DONE, 'results': [{'filename': 'a.pdf'}]})
+
+    def get(path):
+        with request_context(path):
+            response, status, _ = jobs.handle_job_request(flask.request, {}, store, None, PARAMS, [], None)
+            return status, response.get_json()
+
+    assert get('/jobs/missing')[0] == 404
+    assert get('/jobs/running') == (200, jobs.job_status(store.get('running')))
+    assert get('/jobs/running/result')[0] == 202
+    assert get('/jobs/done/result') == (200, {'uniqueId': 'done', 'results': [{'filename': 'a.pdf'}]})
+
+
+def test_submit_without_parameters_is_rejected():
+    with request_context('/jobs', method='POST'):
+        response, status, _ = jobs.handle_job_request(
+            flask.request, {}, jobs.LocalJobStore(), None, dict(PARAMS, model=None), [upload()], None
+        )
+    assert status == 400
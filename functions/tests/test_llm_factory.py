@@ -0,0 +1,13 @@
+import standin
+import llm_factory
+
+
+def test_stand_in_model_when_selected(monkeypatch):
+    monkeypatch.setenv('STANDIN', 'llm')
+    model = llm_factory.chat_model('claude-3-haiku-20240307', 'unused')
+    assert isinstance(model, standin.FakeChatModel)
+
+
+def test_governor_does_not_replace_models():
+    import governor
+    assert not hasattr(governor, 'standin')
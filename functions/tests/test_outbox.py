@@ -0,0 +1,98 @@
+import os
+import pytest
+import outbox
+import standin
+
+
+class RecordingSession:
+    settings = {'user': 'sender@example.com'}
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.sent = []
+
+    def send(self, msg):
+        if self.failures:
+            self.failures -= 1
+            raise OSError('connection refused')
+        self.sent.append(msg)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def store(tmp_path):
+    return outbox.LocalOutboxStore(str(tmp_path / 'outbox'))
+
+
+def make_outbox(store, session, **kwargs):
+    # The tests drive flush() themselves instead of the sender thread
+    box = outbox.Outbox(store, session, **kwargs)
+    box.start = lambda: None
+    return box
+
+
+def attachment_names(msg):
+    return [part.get_filename() for part in msg.get_payload()[1:]]
+
+
+def test_one_email_per_sealed_digest(store):
+    session = RecordingSession()
+    box = make_outbox(store, session)
+    box.add('req', 'user@example.com', 'a_summary.pdf', b'a')
+    box.add('req', 'user@example.com', 'b_summary.pdf', b'b')
+    assert box.flush() == 0
+
+    assert box.seal('req')
+    assert box.flush() == 1
+    assert len(session.sent) == 1
+    assert len(attachment_names(session.sent[0])) == 2
+    assert store.digest_ids() == []
+
+
+def test_seal_only_once(store):
+    box = make_outbox(store, RecordingSession())
+    box.add('req', 'user@example.com', 'a.pdf', b'a')
+    assert box.seal('req')
+    assert not box.seal('req')
+    assert not box.seal('missing')
+
+
+def test_failed_digest_is_retried_then_given_up(store):
+    session = RecordingSession(failures=10)
+    box = make_outbox(store, session, max_attempts=2)
+    box.add('req', 'user@example.com', 'a.pdf', b'a')
+    box.seal('req')
+
+    assert box.flush() == 0
+    assert box._read_manifest('req')['attempts'] == 1
+    # The last attempt drops the digest instead of leaving it in the bucket
+    assert box.flush() == 0
+    assert store.digest_ids() == []
+    assert not os.path.exists(os.path.join(store.root, 'req'))
+    assert session.sent == []
+
+
+def test_abandoned_digest_is_claimed_once_stale(store):
+    # Sealed by an instance that was recycled before sending
+    abandoned = make_outbox(store, RecordingSession())
+    abandoned.add('req', 'user@example.com', 'a.pdf', b'a')
+    abandoned.seal('req')
+
+    session = RecordingSession()
+    assert make_outbox(store, session, stale_seconds=60).flush() == 0
+    assert make_outbox(store, session, stale_seconds=-1).flush() == 1
+    assert len(session.sent) == 1
+
+
+def test_bucket_store(tmp_path):
+    bucket = standin.LocalBucket(str(tmp_path / 'gcs'))
+    store = outbox.BucketOutboxStore(lambda: bucket, 'outbox')
+    session = RecordingSession()
+    box = make_outbox(store, session)
+    box.add('req', 'user@example.com', 'a.pdf', b'a')
+    assert store.digest_ids() == ['req']
+    box.seal('req')
+    assert box.flush() == 1
+    assert list(bucket.list_blobs(prefix='outbox/')) == []
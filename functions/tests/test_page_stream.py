@@ -0,0 +1,52 @@
+import threading
+import pytest
+import page_stream
+
+
+def test_page_order_reads_head_and_tail_first():
+    assert page_stream.page_order(5, head=2, tail=1) == [0, 1, 4, 2, 3]
+    assert page_stream.page_order(3) == [0, 1, 2]
+
+
+def test_streamed_docs_block_until_pages_arrive():
+    stream = page_stream.PageStream()
+    docs = page_stream.StreamedDocs(stream)
+    seen = []
+    reader = threading.Thread(target=lambda: seen.extend(doc.page_content for doc in docs[0:2]))
+    reader.start()
+
+    stream.start(3)
+    stream.put(2, 'second')
+    reader.join(0.1)
+    assert reader.is_alive()
+    stream.put(1, 'first')
+    reader.join(5)
+    assert seen == ['first', 'second']
+    assert len(docs) == 3
+    stream.put(3, 'third')
+    assert docs[-1].metadata == {'seq_num': 3}
+
+
+def test_failure_wakes_readers():
+    stream = page_stream.PageStream()
+    docs = page_stream.StreamedDocs(stream)
+    errors = []
+
+    def read():
+        try:
+            docs[0]
+        except RuntimeError as e:
+            errors.append(e)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    stream.fail('azure down')
+    reader.join(5)
+    assert errors and 'azure down' in str(errors[0])
+
+
+def test_index_out_of_range():
+    stream = page_stream.PageStream()
+    stream.start(1)
+    with pytest.raises(IndexError):
+        page_stream.StreamedDocs(stream)[1]
@@ -0,0 +1,29 @@
+import os
+import pytest
+import events
+import pipeline_workers
+
+
+@pytest.fixture
+def launched(tmp_path, monkeypatch):
+    # Started from somewhere other than functions/, as a worker may be
+    args = []
+
+    def run_subprocess(argv, **kwargs):
+        args.append(argv)
+        return 0, ''
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(events, 'run_subprocess', run_subprocess)
+    return args
+
+
+def test_ocr_fallback_runs_the_script_next_to_the_module(launched):
+    assert pipeline_workers.run_ocr_subprocess('in.pdf', 'out.json')
+    assert launched[0][1] == os.path.join(pipeline_workers.SCRIPT_DIR, 'ocr.py')
+
+
+def test_process_fallback_runs_the_script_next_to_the_module(launched):
+    assert pipeline_workers.run_process_script_subprocess('process-brief.py', 'batch', 'model', 'template', 'out.json')
+    assert launched[0][1] == os.path.join(pipeline_workers.SCRIPT_DIR, 'process-brief.py')
+    assert os.path.exists(launched[0][1])
@@ -0,0 +1,64 @@
+import gzip
+import json
+import pytest
+import records
+import standin
+
+PROCESSED = [
+    {'files': [{'sentence': 'Patient seen on admission.', 'start_page': 2, 'end_page': 4}]},
+    {'files': [{'sentence': 'Discharged.', 'page_numbers': [9, 7]}]},
+]
+
+
+def test_summary_projection():
+    assert records.summary_projection(PROCESSED) == {
+        'items': 2, 'entries': 2, 'firstPage': 2, 'lastPage': 9, 'preview': 'Patient seen on admission.',
+    }
+    assert records.summary_projection([])['preview'] == ''
+
+
+def test_small_payloads_stay_inline(tmp_path):
+    bucket = standin.LocalBucket(str(tmp_path))
+    processed_data = json.dumps(PROCESSED)
+    assert records.processed_fields(bucket, 'processed_data/a.json.gz', processed_data) == {'processedData': processed_data}
+    assert list(bucket.list_blobs()) == []
+
+
+def test_large_payloads_go_to_the_bucket_compressed(tmp_path, monkeypatch):
+    monkeypatch.setattr(records, 'INLINE_MAX_BYTES', 16)
+    bucket = standin.LocalBucket(str(tmp_path))
+    processed_data = json.dumps(PROCESSED)
+
+    fields = records.processed_fields(bucket, 'processed_data/a.json.gz', processed_data)
+    assert 'processedData' not in fields
+    assert fields['processedDataRef'] == 'processed_data/a.json.gz'
+    assert fields['processedDataBytes'] == len(processed_data)
+    assert fields['processedDataSummary']['entries'] == 2
+    blob = bucket.blob('processed_data/a.json.gz')
+    assert gzip.decompress(blob.download_as_bytes()).decode('utf-8') == processed_data
+
+
+def test_records_keep_only_record_fields():
+    pytest.importorskip('firebase_admin')
+    record = records.record_from_result('req', {'filename': 'a.pdf', 'processedData': '[]', 'stageTimings': {}})
+    assert record['id'] == 'req'
+    assert record['filename'] == 'a.pdf'
+    assert 'stageTimings' not in record
+    assert 'uploadedAt' in record
+
+
+class CountingFirestore(standin.MemoryFirestore):
+    def __init__(self):
+        super().__init__()
+        self.batches = 0
+
+    def batch(self):
+        self.batches += 1
+        return super().batch()
+
+
+def test_commit_records_in_batches_of_at_most_500():
+    firestore = CountingFirestore()
+    records.commit_records(firestore, [{'id': 'req', 'n': n} for n in range(1200)])
+    assert firestore.batches == 3
+    assert len(list(firestore.collection('uploads').where('id', '==', 'req').stream())) == 1200
@@ -0,0 +1,77 @@
+import os
+import time
+import pytest
+import result_cache
+import standin
+import storage_budget
+from artifacts import Artifact
+
+
+@pytest.fixture
+def local_backend(tmp_path):
+    backend = result_cache.LocalCacheBackend(str(tmp_path / 'cache'), 1000)
+    yield backend
+    storage_budget.budget.credit('result_cache', backend.max_bytes)
+
+
+def test_result_key_tracks_inputs():
+    key = result_cache.result_key('abc', 'process-brief.py', 'claude', 'Summarize  the\nfile')
+    assert key == result_cache.result_key('abc', 'process-brief.py', 'claude', 'Summarize the file')
+    assert key != result_cache.result_key('abd', 'process-brief.py', 'claude', 'Summarize the file')
+    assert key != result_cache.result_key('abc', 'process-detailed.py', 'claude', 'Summarize the file')
+    assert key != result_cache.result_key('abc', 'process-brief.py', 'gpt', 'Summarize the file')
+    assert result_cache.ocr_key('abc') != result_cache.ocr_key('abd')
+
+
+def test_fetch_is_all_or_nothing(local_backend, tmp_path):
+    cache = result_cache.ResultCache(local_backend)
+    processed = Artifact(str(tmp_path / 'processed.json'))
+    summary = Artifact(str(tmp_path / 'summary.pdf'))
+    processed.write_bytes(b'[]')
+    summary.write_bytes(b'%PDF')
+
+    cache.store('key', [('processed.json', processed)])
+    out = [Artifact(str(tmp_path / 'out.json'), in_memory=True), Artifact(str(tmp_path / 'out.pdf'), in_memory=True)]
+    assert not cache.fetch('key', [('processed.json', out[0]), ('summary.pdf', out[1])])
+    assert not out[0].exists()
+
+    cache.store('key', [('summary.pdf', summary)])
+    assert cache.fetch('key', [('processed.json', out[0]), ('summary.pdf', out[1])])
+    assert (out[0].read_bytes(), out[1].read_bytes()) == (b'[]', b'%PDF')
+
+
+def test_local_backend_evicts_least_recently_used(local_backend):
+    local_backend.put('old', 'a', b'x' * 400)
+    local_backend.put('used', 'a', b'x' * 400)
+    past = time.time() - 60
+    for key in ('old', 'used'):
+        os.utime(local_backend._path(key, 'a'), (past, past))
+    assert local_backend.get('used', 'a') is not None
+
+    local_backend.put('new', 'a', b'x' * 400)
+    assert local_backend.get('old', 'a') is None
+    assert local_backend.get('used', 'a') is not None
+    assert local_backend.get('new', 'a') is not None
+    assert local_backend.index.total == 800
+
+
+def test_size_index_only_rescans_when_needed():
+    index = result_cache.SizeIndex(1000)
+    assert index.added(100)
+    index.scanned(100)
+    assert not index.added(500)
+    assert index.added(500)
+
+
+def test_bucket_backend(tmp_path):
+    bucket = standin.LocalBucket(str(tmp_path))
+    backend = result_cache.BucketCacheBackend(lambda: bucket, 'result_cache', 1000)
+    backend.put('first', 'a', b'x' * 600)
+    assert backend.get('first', 'a') == b'x' * 600
+    assert backend.get('first', 'missing') is None
+
+    past = time.time() - 60
+    os.utime(bucket.blob('result_cache/first/a').path, (past, past))
+    backend.put('second', 'a', b'x' * 600)
+    assert backend.get('first', 'a') is None
+    assert backend.get('second', 'a') == b'x' * 600
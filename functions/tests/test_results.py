@@ -0,0 +1,86 @@
+import gzip
+import json
+import pytest
+
+flask = pytest.importorskip('flask')
+
+import records
+import results
+import standin
+
+PROCESSED = [
+    {'script': 'process-brief.py', 'files': [{'sentence': f'entry {n}', 'start_page': n} for n in range(5)]},
+    {'files': [{'sentence': 'last', 'start_page': 9}]},
+]
+
+
+@pytest.fixture
+def services(tmp_path, monkeypatch):
+    firestore = standin.MemoryFirestore()
+    bucket = standin.LocalBucket(str(tmp_path))
+    processed_data = json.dumps(PROCESSED)
+    inline = dict(filename='a.pdf', pdfFileUrl='url-a', **records.processed_fields(bucket, 'processed_data/a.json.gz', processed_data))
+    monkeypatch.setattr(records, 'INLINE_MAX_BYTES', 0)
+    stored = dict(filename='b.pdf', pdfFileUrl='url-b', **records.processed_fields(bucket, 'processed_data/b.json.gz', processed_data))
+    records.commit_records(firestore, [dict(inline, id='req'), dict(stored, id='req'), dict(inline, id='other')])
+    return firestore, bucket
+
+
+def get(services, path, **kwargs):
+    firestore, bucket = services
+    with flask.Flask(__name__).test_request_context(path, **kwargs):
+        response = results.handle_results_request(flask.request, {}, lambda: firestore, lambda: bucket)
+    if isinstance(response, tuple):
+        return response[1], response[0].get_json()
+    data = response.get_data()
+    if response.headers.get('Content-Encoding') == 'gzip':
+        data = gzip.decompress(data)
+    return response.status_code, json.loads(data)
+
+
+def test_parse_results_path():
+    assert results.parse_results_path('/uploadEmail/results/req') == ('req', None)
+    assert results.parse_results_path('/results/req/a.pdf') == ('req', 'a.pdf')
+    assert results.parse_results_path('/results') is None
+
+
+def test_manifest_has_no_payloads(services):
+    status, body = get(services, '/results/req')
+    assert status == 200
+    assert [entry['filename'] for entry in body['files']] == ['a.pdf', 'b.pdf']
+    assert all('processedData' not in entry for entry in body['files'])
+    assert body['files'][0]['summary']['entries'] == 6
+    assert body['files'][1]['processedDataRef'] == 'processed_data/b.json.gz'
+
+
+@pytest.mark.parametrize('file_key', ['a.pdf', 'b.pdf', '1'])
+def test_entries_are_paged_for_inline_and_stored_payloads(services, file_key):
+    status, first = get(services, f'/results/req/{file_key}?limit=4')
+    assert status == 200
+    assert [entry['sentence'] for entry in first['entries']] == ['entry 0', 'entry 1', 'entry 2', 'entry 3']
+    assert first['entries'][0]['script'] == 'process-brief.py'
+    assert first['total'] == 6
+
+    _, second = get(services, f"/results/req/{file_key}?limit=4&cursor={first['nextCursor']}")
+    assert [(entry['sentence'], entry['item']) for entry in second['entries']] == [('entry 4', 0), ('last', 1)]
+    assert second['nextCursor'] is None
+
+
+def test_large_pages_are_gzipped_when_accepted(services, monkeypatch):
+    monkeypatch.setattr(results, 'GZIP_MIN_BYTES', 100)
+    firestore, bucket = services
+    with flask.Flask(__name__).test_request_context('/results/req/a.pdf', headers={'Accept-Encoding': 'gzip'}):
+        response = results.handle_results_request(flask.request, {}, lambda: firestore, lambda: bucket)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert len(json.loads(gzip.decompress(response.get_data()))['entries']) == 6
+
+
+@pytest.mark.parametrize('path, status', [
+    ('/results/missing', 404),
+    ('/results/req/c.pdf', 404),
+    ('/results/req/a.pdf?limit=0', 400),
+    ('/results/req/a.pdf?cursor=-1', 400),
+    ('/results/req/a.pdf?limit=many', 400),
+])
+def test_bad_requests(services, path, status):
+    assert get(services, path)[0] == status
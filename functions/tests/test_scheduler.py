@@ -0,0 +1,67 @@
+import threading
+import pytest
+import scheduler
+
+
+def run_in_order(fair, submissions):
+    # One worker held on a gate task, so everything queued behind it is
+    # dispatched strictly in the scheduler's order once the gate opens
+    gate = threading.Event()
+    order = []
+    first = fair.submit('gate', gate.wait)
+    futures = [fair.submit(user, order.append, name) for user, name in submissions]
+    gate.set()
+    first.result(timeout=5)
+    for future in futures:
+        future.result(timeout=5)
+    return order
+
+
+def test_round_robin_across_users():
+    fair = scheduler.FairScheduler(max_workers=1)
+    order = run_in_order(fair, [('a', 'a1'), ('a', 'a2'), ('a', 'a3'), ('b', 'b1'), ('c', 'c1')])
+    assert order == ['a1', 'b1', 'c1', 'a2', 'a3']
+
+
+def test_weights_give_more_turns():
+    fair = scheduler.FairScheduler(max_workers=1, weights={'a': 2})
+    order = run_in_order(fair, [('a', 'a1'), ('a', 'a2'), ('a', 'a3'), ('b', 'b1'), ('b', 'b2')])
+    assert order == ['a1', 'a2', 'b1', 'a3', 'b2']
+
+
+def test_exceptions_reach_the_future():
+    fair = scheduler.FairScheduler(max_workers=2)
+    future = fair.submit('a', lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        future.result(timeout=5)
+
+
+def test_order_files_policies():
+    files = ['big', 'small', 'medium']
+    pages = {'big': 80, 'small': 1, 'medium': 10}.get
+    assert scheduler.order_files(files, 'sjf', pages) == ['small', 'medium', 'big']
+    assert scheduler.order_files(files, 'interleave', pages) == ['small', 'big', 'medium']
+    assert scheduler.order_files(files, 'fifo', pages) == files
+    assert scheduler.order_files(files, 'unknown', pages) == ['small', 'medium', 'big']
+
+
+def test_order_files_counts_pages_by_default():
+    class Upload:
+        def __init__(self, filename, pages):
+            self.filename = filename
+            self.estimated_pages = pages
+
+    files = [Upload('big.pdf', 40), Upload('small.pdf', 2)]
+    assert [file.filename for file in scheduler.order_files(files, 'sjf')] == ['small.pdf', 'big.pdf']
+
+
+def test_parse_weights():
+    assert scheduler.parse_weights('a@x.com:3, b@x.com:0, bad') == {'a@x.com': 3, 'b@x.com': 1}
+
+
+def test_metrics_count_dispatches_per_user():
+    fair = scheduler.FairScheduler(max_workers=1)
+    run_in_order(fair, [('a', 'a1'), ('b', 'b1')])
+    users = fair.metrics()['users']
+    assert (users['a']['dispatched'], users['b']['dispatched']) == (1, 1)
+    assert users['a']['queued'] == 0
@@ -0,0 +1,75 @@
+import time
+import threading
+import pytest
+from singleflight import SingleFlight
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting"
+        time.sleep(0.01)
+
+
+def run_with_followers(flight, work, followers=3):
+    # Starts a leader that blocks in work() until released, attaches
+    # `followers` callers to it, then lets the leader finish
+    started = threading.Event()
+    release = threading.Event()
+    outcomes = []
+
+    def blocked():
+        started.set()
+        assert release.wait(5)
+        return work()
+
+    def call(fn):
+        try:
+            outcomes.append(flight.do('key', fn))
+        except Exception as e:
+            outcomes.append(e)
+
+    leader = threading.Thread(target=call, args=(blocked,))
+    leader.start()
+    assert started.wait(5)
+    threads = [threading.Thread(target=call, args=(work,)) for _ in range(followers)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: flight.followers('key') == followers)
+    release.set()
+    for thread in [leader] + threads:
+        thread.join(5)
+    return outcomes
+
+
+def test_followers_share_the_leaders_result():
+    flight = SingleFlight()
+    calls = []
+
+    def work():
+        calls.append(1)
+        return 'done'
+
+    outcomes = run_with_followers(flight, work)
+    assert len(calls) == 1
+    assert sorted(outcomes) == [('done', False)] + [('done', True)] * 3
+    assert flight.in_flight() == 0
+    assert flight.followers('key') == 0
+
+
+def test_leader_failure_reaches_followers_and_is_not_cached():
+    flight = SingleFlight()
+
+    def work():
+        raise ValueError('boom')
+
+    outcomes = run_with_followers(flight, work)
+    assert len(outcomes) == 4
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+    assert flight.do('key', lambda: 'retry') == ('retry', False)
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight()
+    assert flight.do('a', lambda: 1) == (1, False)
+    assert flight.do('b', lambda: 2) == (2, False)
@@ -0,0 +1,43 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from stage_graph import StageGraph
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        yield executor
+
+
+def test_stages_get_their_dependencies_results(executor):
+    graph = StageGraph(executor)
+    graph.event('ocr')
+    graph.add('upload', lambda: 'url')
+    graph.add('render', lambda ocr: ocr + '.pdf', ['ocr'])
+    graph.add('store', lambda url, pdf: (url, pdf), ['upload', 'render'])
+    graph.complete('ocr', 'summary')
+
+    timings = graph.wait(timeout=5)
+    assert graph.result('store') == ('url', 'summary.pdf')
+    assert set(timings) == {'ocr', 'upload', 'render', 'store'}
+    assert timings['render']['start'] <= timings['store']['start']
+
+
+def test_failed_dependency_skips_dependents(executor):
+    graph = StageGraph(executor)
+    graph.event('processed')
+    graph.add('upload', lambda _: 'never', ['processed'])
+    graph.fail('processed', RuntimeError('processing failed'))
+
+    graph.wait(timeout=5)
+    with pytest.raises(RuntimeError):
+        graph.result('upload')
+    assert 'upload' not in graph.timings
+
+
+def test_stage_added_after_its_dependency_finished(executor):
+    graph = StageGraph(executor)
+    graph.event('ocr')
+    graph.complete('ocr', 1)
+    graph.add('late', lambda value: value + 1, ['ocr'])
+    assert graph.result('late', timeout=5) == 2
@@ -0,0 +1,73 @@
+import threading
+import storage_budget
+from artifacts import Artifact
+
+
+def write(tmp_path, name, size):
+    artifact = Artifact(str(tmp_path / name))
+    artifact.write_bytes(b'x' * size)
+    return artifact
+
+
+def test_track_grows_past_the_estimate(tmp_path):
+    budget = storage_budget.StorageBudget(1000)
+    lease = budget.acquire(300)
+    lease.track(write(tmp_path, 'a', 200))
+    assert budget.in_use == 300
+    lease.track(write(tmp_path, 'b', 400))
+    assert budget.in_use == 600
+    lease.release()
+    assert budget.in_use == 0
+
+
+def test_discard_frees_bytes_and_deletes(tmp_path):
+    budget = storage_budget.StorageBudget(1000)
+    lease = budget.acquire(800)
+    source = write(tmp_path, 'source', 300)
+    lease.track(source)
+    lease.discard(source)
+    assert budget.in_use == 500
+    assert not source.exists()
+    lease.release()
+    assert budget.in_use == 0
+
+
+def test_waits_until_room_is_freed(tmp_path):
+    budget = storage_budget.StorageBudget(1000)
+    lease = budget.acquire(900)
+    source = write(tmp_path, 'source', 900)
+    lease.track(source)
+
+    acquired = threading.Event()
+    waiter = threading.Thread(target=lambda: (budget.acquire(500, timeout=5), acquired.set()))
+    waiter.start()
+    assert not acquired.wait(0.2)
+    lease.discard(source)
+    assert acquired.wait(5)
+    waiter.join()
+    assert budget.metrics()['waited'] == 1
+
+
+def test_oversized_file_runs_when_nothing_else_is_in_flight():
+    budget = storage_budget.StorageBudget(1000)
+    budget.charge('result_cache', 900)
+    lease = budget.acquire(5000, timeout=0)
+    assert budget.metrics()['overdrawn'] == 0
+    lease.release()
+    assert budget.in_use == 900
+
+
+def test_gives_up_waiting_after_the_timeout():
+    budget = storage_budget.StorageBudget(1000)
+    held = budget.acquire(1000)
+    budget.acquire(500, timeout=0.05)
+    assert budget.metrics()['overdrawn'] == 1
+    held.release()
+
+
+def test_standing_charges():
+    budget = storage_budget.StorageBudget(1000)
+    budget.charge('spool', 300)
+    budget.credit('spool', 500)
+    assert budget.standing == {'spool': 0}
+    assert budget.in_use == 0
@@ -0,0 +1,71 @@
+import time
+import threading
+import pytest
+import warmup
+
+
+def test_all_steps_ok_is_ready():
+    warmer = warmup.Warmup([('firebase', lambda: None), ('scripts', lambda: '4 scripts')])
+    assert warmer.status()['state'] == warmup.COLD
+    status = warmer.run()
+    assert status['state'] == warmup.READY
+    assert status['ready']
+    assert status['steps']['scripts']['detail'] == '4 scripts'
+
+
+def test_a_failed_step_leaves_the_instance_degraded_but_ready():
+    def broken():
+        raise RuntimeError('no credentials')
+
+    status = warmup.Warmup([('firebase', broken), ('scripts', lambda: None)]).run()
+    assert status['state'] == warmup.DEGRADED
+    assert status['ready']
+    assert (status['steps']['firebase']['ok'], status['steps']['firebase']['error']) == (False, 'no credentials')
+    assert status['steps']['scripts']['ok']
+
+
+def test_steps_run_once_for_concurrent_callers():
+    calls = []
+    release = threading.Event()
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+
+    warmer = warmup.Warmup([('slow', slow)])
+    warmer.start()
+    waiter = threading.Thread(target=warmer.run)
+    waiter.start()
+    release.set()
+    waiter.join(5)
+    warmer.start()
+    assert warmer.run()['state'] == warmup.READY
+    assert calls == [1]
+
+
+def test_routes(standin_env, monkeypatch):
+    flask = pytest.importorskip('flask')
+    pytest.importorskip('functions_framework')
+    from conftest import load_main
+
+    main = load_main(monkeypatch)
+    release = threading.Event()
+    monkeypatch.setattr(main.warmup, 'warmer', warmup.Warmup([('slow', lambda: release.wait(5))]))
+
+    def get(path):
+        with flask.Flask(__name__).test_request_context(path):
+            response, status, _ = main.uploadEmail(flask.request)
+            return status, response.get_json()
+
+    # /ready starts the warm-up and answers 503 until it finishes
+    status, body = get('/ready')
+    assert status == 503 and not body['ready']
+    release.set()
+    deadline = time.monotonic() + 5
+    while get('/ready')[0] != 200:
+        assert time.monotonic() < deadline, "warm-up did not finish"
+        time.sleep(0.01)
+
+    status, body = get('/warmup')
+    assert status == 200
+    assert body['state'] == warmup.READY
@@ -1,9 +1,11 @@
 import os
 import logging
 import json
-from langchain_core.prompts import ChatPromptTemplate
-from nltk.corpus import stopwords
-from langchain_anthropic import ChatAnthropic
+from governor import governor, govern_llm
+from llm_factory import chat_model
+import prompts
+import deadline as deadlines
+import events
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
@@ -34,7 +36,7 @@ def get_api_key():
     return api_key
 
 api_key = get_api_key()
-llm = ChatAnthropic(model_name="claude-3-haiku-20240307", api_key=api_key, temperature=0)
+llm = govern_llm(chat_model("claude-3-haiku-20240307", api_key))
 
 def load_and_split(file_path):
     logger.info(f"Processing document: {file_path}")
@@ -44,11 +46,16 @@ def load_and_split(file_path):
         try:
             data = json.loads(file_content)
         except json.JSONDecodeError as e:
-            print(f"Error parsing JSON: {e}")
+            logger.error(f"Error parsing JSON: {e}")
             data = {}
 
-    print(f"Keys in parsed JSON data: {data.keys()}")
+    docs = docs_from_data(data)
+    if docs:
+        logger.info(f"Data loaded from document: {file_path}")
+        return docs
 
+
+def docs_from_data(data):
     if "messages" in data:
         if data["messages"]:
             docs = []
@@ -58,9 +65,6 @@ def load_and_split(file_path):
                     metadata={"seq_num": message["page_number"]},
                 )
                 docs.append(doc)
-            print(docs)
-
-            logger.info(f"Data loaded from document: {file_path}")
             return docs
 
 
@@ -135,7 +139,7 @@ Return:
 
 
 def process_page(docs, i):
-    prompt_response = ChatPromptTemplate.from_template(summary_template)
+    prompt_response = prompts.from_template(summary_template)
     response_chain = prompt_response | llm | event_summary_parser
 
     current_page = docs[i].page_content.replace("\n", " ").strip()
@@ -154,18 +158,21 @@ def process_page(docs, i):
         return {"page_number": page_number, "summary": None}
 
 
-def generate_summaries(docs):
+def generate_summaries(docs, deadline=deadlines.NO_DEADLINE):
     combined_summaries = []
-    with ThreadPoolExecutor() as executor:
-        futures = {executor.submit(process_page, docs, i): i for i in range(len(docs))}
+    with ThreadPoolExecutor(max_workers=governor.pool_size('llm')) as executor:
+        futures = {executor.submit(deadline.call, process_page, docs, i): i for i in range(len(docs))}
         
         for future in as_completed(futures):
             try:
                 result = future.result()
+                if result is not None:
+                    events.emit(events.PAGES_DONE, stage='summaries', pages=1)
                 if result is not None and result["summary"] is not None:
                     combined_summaries.append(result)
             except Exception as exc:
                 logger.error(f'Generated an exception: {exc}')
+                events.emit(events.ERROR, stage='summaries', page=futures[future] + 1, message=str(exc))
         
         combined_summaries.sort(key=lambda x: x["page_number"])
     return combined_summaries
@@ -247,7 +254,7 @@ def save_timeline_to_json(timeline_data, filename):
 
     return {"files": output_data}
 
-def process_sorted_timeline(summaries, filename):
+def process_sorted_timeline(summaries, filename, deadline=deadlines.NO_DEADLINE):
     logging.info(f"Processing sorted timeline for file: {filename}")
     events_by_date = {}
     output_data = []
@@ -267,6 +274,10 @@ def process_sorted_timeline(summaries, filename):
     logging.info(f"Sorted dates: {sorted_dates}")
 
     for date in sorted_dates:
+        if deadline.low():
+            # Leave the remaining dates out rather than run past the deadline
+            deadline.mark_skipped()
+            break
         logging.info(f"Processing events for date: {date}")
         current_event_text = ""
         for event in events_by_date[date]:
@@ -296,12 +307,49 @@ def process_sorted_timeline(summaries, filename):
                 logging.warning(f"Ignored error: {str(e)}")
             else:
                 logging.error(f"An unexpected error occurred: {str(e)}")
-                sys.exit(1)
+                raise
 
     logging.info(f"Processed sorted timeline for file: {filename}")
     return save_timeline_to_json(output_data, filename)
 
 
+def process_document(docs, custom_template, filename, deadline=None):
+    deadline = (deadline or deadlines.NO_DEADLINE).scope()
+    with events.stage("summaries"):
+        combined_summaries = generate_summaries(docs, deadline)
+    with events.stage("timeline"):
+        output = process_sorted_timeline(combined_summaries, filename, deadline)
+    if deadline.partial:
+        output["partial"] = True
+    return output
+
+
+def run(input_directory, selected_model, custom_template, output_path, deadline=None):
+    output_data = []
+
+    for entry in os.listdir(input_directory):
+        entry_path = os.path.join(input_directory, entry)
+
+        if os.path.isfile(entry_path) and entry.endswith(".json"):
+            logging.info(f"Processing file: {entry_path}")
+            docs = load_and_split(entry_path)
+            output_data.append(process_document(docs, custom_template, os.path.basename(entry_path), deadline))
+
+        elif os.path.isdir(entry_path):
+            for filename in os.listdir(entry_path):
+                if filename.endswith(".json"):
+                    input_file_path = os.path.join(entry_path, filename)
+                    logging.info(f"Processing file in directory: {input_file_path}")
+                    docs = load_and_split(input_file_path)
+                    output_data.append(process_document(docs, custom_template, os.path.basename(input_file_path), deadline))
+
+    with open(output_path, "w") as output_file:
+        json.dump(output_data, output_file, indent=4)
+    logging.info(f"Successfully wrote output to {output_path}")
+
+    return output_data
+
+
 if __name__ == "__main__":
     if len(sys.argv) < 5:
         print("Please provide the input directory, selected model, custom template, and output path as command-line arguments.")
@@ -311,7 +359,6 @@ if __name__ == "__main__":
     selected_model = sys.argv[2]
     custom_template = sys.argv[3]
     output_path = sys.argv[4]
-    output_data = []
 
     logging.info(f"Input directory: {input_directory}")
     logging.info(f"Selected model: {selected_model}")
@@ -319,30 +366,7 @@ if __name__ == "__main__":
     logging.info(f"Output path: {output_path}")
 
     try:
-        for entry in os.listdir(input_directory):
-            entry_path = os.path.join(input_directory, entry)
-
-            if os.path.isfile(entry_path) and entry.endswith(".json"):
-                logging.info(f"Processing file: {entry_path}")
-                docs = load_and_split(entry_path)
-                combined_summaries = generate_summaries(docs)
-                json_output = process_sorted_timeline(combined_summaries, os.path.basename(entry_path))
-                output_data.append(json_output)
-
-            elif os.path.isdir(entry_path):
-                for filename in os.listdir(entry_path):
-                    if filename.endswith(".json"):
-                        input_file_path = os.path.join(entry_path, filename)
-                        logging.info(f"Processing file in directory: {input_file_path}")
-                        docs = load_and_split(input_file_path)
-                        combined_summaries = generate_summaries(docs)
-                        json_output = process_sorted_timeline(combined_summaries, os.path.basename(input_file_path))
-                        output_data.append(json_output)
-
-        with open(output_path, "w") as output_file:
-            json.dump(output_data, output_file, indent=4)
-        logging.info(f"Successfully wrote output to {output_path}")
-
+        run(input_directory, selected_model, custom_template, output_path, deadlines.from_env())
     except Exception as e:
         logging.error(f"An unexpected error occurred: {str(e)}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
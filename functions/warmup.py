@@ -0,0 +1,109 @@
+import os
+import time
+import logging
+import threading
+import pipeline_workers
+from firebase_clients import get_firestore_client, get_bucket
+from governor import governed_models
+
+# Instance warm-up. The first request after a scale-up used to pay for
+# Firebase credential parsing, loading the process scripts (LangChain and the
+# Anthropic clients), parsing every prompt template, EasyOCR model loading,
+# and the TLS handshakes to Anthropic and Azure. warm() does all of that up
+# front, via GET /warmup or at startup with WARMUP_ON_START=true, and
+# GET /ready reports the result (503 until warm, starting the warm-up if
+# nothing has) so an autoscaler or load balancer only sends traffic to ready
+# instances. Steps fail independently;
+# a failed step leaves the instance "degraded" rather than not ready, since
+# the request path would set the same thing up lazily anyway.
+
+COLD = 'cold'
+WARMING = 'warming'
+READY = 'ready'
+DEGRADED = 'degraded'
+
+
+def warm_firebase():
+    get_firestore_client()
+    get_bucket()
+
+
+def warm_scripts():
+    import prompts
+
+    templates = 0
+    for script in pipeline_workers.PROCESS_SCRIPTS:
+        templates += prompts.warm(pipeline_workers.load_script(script))
+    return f"{len(pipeline_workers.PROCESS_SCRIPTS)} scripts, {templates} templates"
+
+
+def warm_ocr():
+    client = pipeline_workers.get_doc_client()
+    if os.getenv('WARMUP_EASYOCR', 'true').lower() == 'true':
+        client.easyocr_reader
+    # A metadata call opens the Azure connection the OCR requests will reuse
+    client.client.list_models()
+
+
+def warm_llm_connections():
+    # A model listing costs no tokens but does the TLS handshake on each
+    # client's connection pool
+    clients = {id(client): client for client in (getattr(model, '_client', None) for model in governed_models) if client is not None}
+    for client in clients.values():
+        client.models.list(limit=1)
+    return f"{len(clients)} clients"
+
+
+STEPS = [
+    ('firebase', warm_firebase),
+    ('scripts', warm_scripts),
+    ('ocr', warm_ocr),
+    ('llm', warm_llm_connections),
+]
+
+
+class Warmup:
+    def __init__(self, steps):
+        self.steps = steps
+        self.state = COLD
+        self.results = {}
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def run(self):
+        # Concurrent callers wait for the one warm-up in progress
+        with self._lock:
+            if self.state in (READY, DEGRADED):
+                return self.status()
+            self.state = WARMING
+            for name, step in self.steps:
+                started = time.time()
+                try:
+                    detail = step()
+                    self.results[name] = {'ok': True, 'seconds': round(time.time() - started, 3), 'detail': detail}
+                except Exception as e:
+                    logging.warning(f"Warm-up step {name} failed: {str(e)}")
+                    self.results[name] = {'ok': False, 'seconds': round(time.time() - started, 3), 'error': str(e)}
+            self.state = READY if all(result['ok'] for result in self.results.values()) else DEGRADED
+            self.finished_at = time.time()
+            logging.info(f"Warm-up finished: {self.state} {self.results}")
+        return self.status()
+
+    def start(self):
+        if self.state == COLD:
+            threading.Thread(target=self.run, name='warmup', daemon=True).start()
+
+    @property
+    def ready(self):
+        return self.state in (READY, DEGRADED)
+
+    def status(self):
+        return {'state': self.state, 'ready': self.ready, 'steps': dict(self.results), 'finishedAt': self.finished_at}
+
+
+warmer = Warmup(STEPS)
+
+
+def warm_on_start():
+    if os.getenv('WARMUP_ON_START', 'false').lower() == 'true':
+        warmer.start()
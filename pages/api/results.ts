@@ -0,0 +1,41 @@
+import type { NextApiRequest, NextApiResponse } from 'next';
+import axios from 'axios';
+
+const CLOUD_FUNCTION_URL = process.env.NEXT_PRIVATE_CLOUD_FUNCTION_API_KEY;
+
+// Proxies the Cloud Function's results API, which reads processed data from
+// the bucket server-side, one page of entries per request
+const handler = async (req: NextApiRequest, res: NextApiResponse) => {
+  if (!CLOUD_FUNCTION_URL) {
+    console.error('CLOUD_FUNCTION_URL is not set');
+    return res.status(500).json({ error: 'Server configuration error' });
+  }
+
+  if (req.method !== 'GET') {
+    res.setHeader('Allow', ['GET']);
+    return res.status(405).end(`Method ${req.method} Not Allowed`);
+  }
+
+  const { uniqueId, file, cursor, limit } = req.query;
+  if (typeof uniqueId !== 'string' || !uniqueId) {
+    return res.status(400).json({ error: 'Missing uniqueId' });
+  }
+
+  let url = `${CLOUD_FUNCTION_URL.replace(/\/$/, '')}/results/${encodeURIComponent(uniqueId)}`;
+  if (typeof file === 'string' && file) {
+    url += `/${encodeURIComponent(file)}`;
+  }
+
+  try {
+    const response = await axios.get(url, {
+      params: { cursor: cursor || undefined, limit: limit || undefined },
+      validateStatus: () => true,
+    });
+    return res.status(response.status).json(response.data);
+  } catch (error) {
+    console.error('Error fetching results:', error);
+    return res.status(500).json({ error: 'Results request to Cloud Function failed' });
+  }
+};
+
+export default handler;